@@ -0,0 +1,66 @@
+"""A benchmark that measures serialization speed of large documents.
+
+How the benchmark works
+-----------------------
+
+A synthetic document with a mix of nested elements, attributes, text,
+comments and scripts is parsed once. Then the whole tree is serialized with:
+
+1) ``LexborHTMLParser.html``
+2) ``LexborHTMLParser.html_bytes``
+3) ``LexborNode.inner_html`` of the ``<body>`` element
+4) ``LexborHTMLParser.write_html`` into ``os.devnull``
+
+Run with ``python examples/serialize_benchmark.py [number of rows]``.
+"""
+
+import os
+import sys
+import time
+
+from selectolax.lexbor import LexborHTMLParser
+
+ROW = (
+    '<div class="row" id="row-{i}" data-index="{i}">'
+    '<a href="/item/{i}?ref=list&amp;page=2">Item {i}</a>'
+    "<p>Lorem ipsum dolor sit amet, <b>consectetur</b> adipiscing elit &lt;{i}&gt;.</p>"
+    "<!-- row {i} -->"
+    '<script>window.items.push({{"id": {i}}});</script>'
+    "</div>\n"
+)
+
+
+def make_document(rows):
+    body = "".join(ROW.format(i=i) for i in range(rows))
+    return (
+        "<!DOCTYPE html><html><head><title>Benchmark</title></head>"
+        f"<body>{body}</body></html>"
+    )
+
+
+def write_to_devnull(tree):
+    with open(os.devnull, "wb") as f:
+        tree.write_html(f)
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    repeats = 10
+    tree = LexborHTMLParser(make_document(rows))
+    print(f"document size: {len(tree.html_bytes) / 1024 / 1024:.1f} MB")
+
+    benchmarks = [
+        ("html", lambda: tree.html),
+        ("html_bytes", lambda: tree.html_bytes),
+        ("body.inner_html", lambda: tree.body.inner_html),
+        ("write_html", lambda: write_to_devnull(tree)),
+    ]
+    for name, func in benchmarks:
+        start = time.perf_counter()
+        for _ in range(repeats):
+            func()
+        print(f"{name!r}: {(time.perf_counter() - start) / repeats:.4f} s per call")
+
+
+if __name__ == "__main__":
+    main()
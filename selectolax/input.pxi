@@ -0,0 +1,14 @@
+from cpython.memoryview cimport PyMemoryView_GET_BUFFER
+
+
+cdef inline char* input_data(object html_input):
+    """Return a pointer to the data of the object returned by ``preprocess_input``."""
+    if isinstance(html_input, bytes):
+        return <char *> html_input
+    return <char *> PyMemoryView_GET_BUFFER(html_input).buf
+
+
+cdef inline void release_input(object html_input):
+    """Release the buffer of the object returned by ``preprocess_input``, if any."""
+    if isinstance(html_input, memoryview):
+        html_input.release()
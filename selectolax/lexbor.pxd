@@ -48,7 +48,6 @@ cdef extern from "lexbor/core/lexbor.h" nogil:
 cdef extern from "lexbor/html/html.h" nogil:
     ctypedef unsigned int lxb_html_document_opt_t
 
-    ctypedef struct lxb_html_tokenizer_t
     ctypedef struct lxb_html_form_element_t
     ctypedef struct lxb_html_head_element_t
     ctypedef struct lxb_html_body_element_t
@@ -59,6 +58,28 @@ cdef extern from "lexbor/html/html.h" nogil:
     ctypedef void lxb_dom_interface_t
     ctypedef uintptr_t lxb_tag_id_t
     ctypedef uintptr_t lxb_ns_id_t
+    ctypedef uintptr_t lxb_dom_attr_id_t
+
+    ctypedef int lxb_html_token_type_t
+
+    ctypedef enum lxb_html_token_type:
+        LXB_HTML_TOKEN_TYPE_OPEN         = 0x0000
+        LXB_HTML_TOKEN_TYPE_CLOSE        = 0x0001
+        LXB_HTML_TOKEN_TYPE_CLOSE_SELF   = 0x0002
+        LXB_HTML_TOKEN_TYPE_FORCE_QUIRKS = 0x0004
+        LXB_HTML_TOKEN_TYPE_DONE         = 0x0008
+
+    ctypedef struct lxb_html_token_t:
+        lxb_tag_id_t tag_id
+        lxb_html_token_type_t type
+
+    ctypedef struct lxb_html_tokenizer_t:
+        lxb_html_token_t *(*callback_token_done)(lxb_html_tokenizer_t *tkz, lxb_html_token_t *token, void *ctx) noexcept nogil
+        void *callback_token_ctx
+        lxb_status_t status
+
+    ctypedef lxb_html_token_t *(*lxb_html_tokenizer_token_f)(lxb_html_tokenizer_t *tkz,
+                                                             lxb_html_token_t *token, void *ctx)
     ctypedef lxb_dom_interface_t *(*lxb_dom_interface_destroy_f)(lxb_dom_interface_t *intrfc)
     ctypedef lxb_dom_interface_t *(*lxb_dom_interface_create_f)(lxb_dom_document_t *document, lxb_tag_id_t tag_id,
                                                                 lxb_ns_id_t ns)
@@ -88,6 +109,34 @@ cdef extern from "lexbor/html/html.h" nogil:
 
         lxb_dom_node_type_t    type
 
+    ctypedef lxb_status_t (*lxb_dom_node_cb_insertion_f)(lxb_dom_node_t *inserted_node)
+    ctypedef lxb_status_t (*lxb_dom_node_cb_removing_f)(lxb_dom_node_t *removed_node,
+                                                       lxb_dom_node_t *old_parent)
+    ctypedef lxb_status_t (*lxb_dom_node_cb_moving_f)(lxb_dom_node_t *moved_node,
+                                                     lxb_dom_node_t *old_parent)
+    ctypedef lxb_status_t (*lxb_dom_node_cb_destroy_f)(lxb_dom_node_t *node)
+    ctypedef lxb_status_t (*lxb_dom_node_cb_children_changed_f)(lxb_dom_node_t *parent)
+    ctypedef lxb_status_t (*lxb_dom_node_cb_post_connection_f)(lxb_dom_node_t *connected_node)
+    ctypedef lxb_status_t (*lxb_dom_element_attr_change_f)(lxb_dom_element_t *element,
+                                                          lxb_dom_attr_id_t local_name,
+                                                          const lxb_char_t *old_value, size_t old_len,
+                                                          const lxb_char_t *value, size_t value_len,
+                                                          lxb_ns_id_t ns)
+
+    ctypedef struct lxb_dom_document_mutation_cb_t:
+        lxb_dom_node_cb_insertion_f        inserted
+        lxb_dom_node_cb_removing_f         removed
+        lxb_dom_node_cb_moving_f           moved
+        lxb_dom_node_cb_destroy_f          destroy
+        lxb_dom_node_cb_children_changed_f children_changed
+        lxb_dom_node_cb_post_connection_f  connected
+
+    ctypedef struct lxb_dom_document_attr_mutation_cb_t:
+        lxb_dom_element_attr_change_f change
+        lxb_dom_element_attr_change_f append
+        lxb_dom_element_attr_change_f remove
+        lxb_dom_element_attr_change_f replace
+
     ctypedef struct lxb_dom_document_t:
         lxb_dom_node_t              node
 
@@ -100,6 +149,9 @@ cdef extern from "lexbor/html/html.h" nogil:
         lxb_dom_interface_create_f  create_interface
         lxb_dom_interface_destroy_f destroy_interface
 
+        const lxb_dom_document_mutation_cb_t      *mutation
+        const lxb_dom_document_attr_mutation_cb_t *attr_mutation
+
         lexbor_mraw_t *mraw
         lexbor_mraw_t *text
         lexbor_hash_t *tags
@@ -240,6 +292,9 @@ cdef extern from "lexbor/html/html.h" nogil:
                                                           const lxb_char_t *local_name, size_t lname_len,
                                                           void *reserved_for_opt)
     lxb_status_t lxb_html_document_parse(lxb_html_document_t *document, const lxb_char_t *html, size_t size)
+    lxb_status_t lxb_html_document_parse_chunk_begin(lxb_html_document_t *document)
+    lxb_status_t lxb_html_document_parse_chunk(lxb_html_document_t *document, const lxb_char_t *html, size_t size)
+    lxb_status_t lxb_html_document_parse_chunk_end(lxb_html_document_t *document)
     lxb_dom_node_t * lxb_html_parse_fragment_by_tag_id(lxb_html_parser_t *parser,
                                                        lxb_html_document_t *document,
                                                        lxb_tag_id_t tag_id,
@@ -254,6 +309,9 @@ cdef extern from "lexbor/html/html.h" nogil:
     lxb_html_head_element_t * lxb_html_document_head_element_noi(lxb_html_document_t *document)
     lxb_dom_element_t * lxb_dom_document_element(lxb_dom_document_t *document)
 
+    ctypedef lxb_status_t (*lxb_html_serialize_cb_f)(const lxb_char_t *data, size_t len, void *ctx)
+
+    lxb_status_t lxb_html_serialize_tree_cb(lxb_dom_node_t *node, lxb_html_serialize_cb_f cb, void *ctx)
     lxb_status_t lxb_html_serialize_tree_str(lxb_dom_node_t *node, lexbor_str_t *str)
     lxb_status_t lxb_html_serialize_deep_str(lxb_dom_node_t *node, lexbor_str_t *str)
     lxb_status_t lxb_html_serialize_pretty_tree_str(lxb_dom_node_t *node,
@@ -267,6 +325,56 @@ cdef extern from "lexbor/html/html.h" nogil:
     lxb_html_element_t* lxb_html_element_inner_html_set(lxb_html_element_t *element,
                                                         const lxb_char_t *html, size_t size)
 
+cdef extern from "lexbor/encoding/encoding.h" nogil:
+    ctypedef enum lxb_encoding_t:
+        LXB_ENCODING_DEFAULT  = 0x00
+        LXB_ENCODING_UTF_16BE = 0x19
+        LXB_ENCODING_UTF_16LE = 0x1a
+        LXB_ENCODING_UTF_8    = 0x1b
+
+    ctypedef struct lxb_encoding_decode_t:
+        lxb_codepoint_t *buffer_out
+        size_t buffer_used
+
+    ctypedef struct lxb_encoding_encode_t:
+        pass
+
+    cdef enum:
+        LXB_ENCODING_ENCODE_OK
+        LXB_ENCODING_ENCODE_ERROR
+        LXB_ENCODING_ENCODE_SMALL_BUFFER
+
+    ctypedef struct lxb_encoding_data_t:
+        lxb_encoding_t encoding
+        lxb_status_t (*decode)(lxb_encoding_decode_t *ctx, const lxb_char_t **data,
+                               const lxb_char_t *end) noexcept nogil
+        lxb_char_t *name
+
+    lxb_encoding_t lxb_encoding_bom_sniff(const lxb_char_t *begin, size_t length)
+    void lxb_encoding_utf_8_skip_bom(const lxb_char_t **begin, size_t *length)
+    void lxb_encoding_utf_16be_skip_bom(const lxb_char_t **begin, size_t *length)
+    void lxb_encoding_utf_16le_skip_bom(const lxb_char_t **begin, size_t *length)
+    const lxb_encoding_data_t * lxb_encoding_data(lxb_encoding_t encoding)
+    const lxb_encoding_data_t * lxb_encoding_data_prescan_validate(const lxb_char_t *name, size_t length)
+    lxb_status_t lxb_encoding_decode_init(lxb_encoding_decode_t *decode,
+                                          const lxb_encoding_data_t *encoding_data,
+                                          lxb_codepoint_t *buffer_out, size_t buffer_length)
+    lxb_status_t lxb_encoding_decode_finish(lxb_encoding_decode_t *decode)
+    lxb_status_t lxb_encoding_decode_replace_set(lxb_encoding_decode_t *decode,
+                                                 const lxb_codepoint_t *replace, size_t length)
+    int lxb_encoding_encode_utf_8_single(lxb_encoding_encode_t *ctx, lxb_char_t **data,
+                                         const lxb_char_t *end, lxb_codepoint_t cp)
+
+cdef extern from "lexbor/html/encoding.h" nogil:
+    ctypedef struct lxb_html_encoding_t:
+        pass
+
+    lxb_html_encoding_t * lxb_html_encoding_create()
+    lxb_status_t lxb_html_encoding_init(lxb_html_encoding_t *em)
+    lxb_html_encoding_t * lxb_html_encoding_destroy(lxb_html_encoding_t *em, bint self_destroy)
+    const lxb_char_t * lxb_html_encoding_prescan(lxb_html_encoding_t *em, const lxb_char_t *data,
+                                                 const lxb_char_t *end, size_t *out_length)
+
 cdef extern from * nogil:
     """
     #ifdef LXB_HTML_SERIALIZE_OPT_HTML5TEST
@@ -284,12 +392,16 @@ cdef class LexborNode:
         lxb_dom_node_t *node
         public LexborHTMLParser parser
         cdef bint _is_fragment_root
+        object __weakref__
 
     @staticmethod
     cdef LexborNode new(lxb_dom_node_t *node, LexborHTMLParser parser)
+    @staticmethod
+    cdef LexborNode _wrap(lxb_dom_node_t *node, LexborHTMLParser parser)
     cdef void set_as_fragment_root(self)
-    cdef str _serialize_html(self, lxb_html_serialize_opt_t options, size_t indent, bint pretty)
-    cdef str _serialize_inner_html(self, lxb_html_serialize_opt_t options, size_t indent, bint pretty)
+    cdef object _serialize_html(self, lxb_html_serialize_opt_t options, size_t indent, bint pretty, bint as_bytes)
+    cdef object _serialize_inner_html(self, lxb_html_serialize_opt_t options, size_t indent, bint pretty, bint as_bytes)
+    cdef object _text(self, bint deep, str separator, bint strip, bint skip_empty, bint as_bytes)
     cdef inline LexborNode _get_node(self)
 
 
@@ -297,33 +409,73 @@ cdef bint is_empty_text_node(lxb_dom_node_t *node)
 cdef inline bint _is_whitespace_only(const lxb_char_t *buffer, size_t buffer_length) nogil
 
 
+cdef class LexborCompiledSelector:
+    cdef lxb_css_selector_list_t * selectors_list
+    cdef readonly str query
+
+
 cdef class LexborCSSSelector:
-    cdef lxb_css_parser_t* parser
     cdef lxb_selectors_t * selectors
-    cdef lxb_css_selectors_t * css_selectors
     cdef public list results
     cdef public LexborNode current_node
-    cdef int _create_css_parser(self) except -1
-    cpdef list find(self, str query, LexborNode node)
-    cpdef list find_first(self, str query, LexborNode node)
-    cpdef list _find(self, str query, LexborNode node, bint only_first)
-    cpdef int any_matches(self, str query, LexborNode node) except -1
+    cdef int _create_selectors(self) except -1
+    cdef LexborCompiledSelector _compile(self, object query)
+    cpdef list find(self, object query, LexborNode node)
+    cpdef list find_first(self, object query, LexborNode node)
+    cpdef list _find(self, object query, LexborNode node, bint only_first)
+    cpdef dict find_many(self, dict queries, LexborNode node)
+    cpdef int any_matches(self, object query, LexborNode node) except -1
+
+ctypedef struct _MutationHooks:
+    # Callbacks of the document that were replaced by the index hooks, called after them.
+    const lxb_dom_document_mutation_cb_t *mutation
+    const lxb_dom_document_attr_mutation_cb_t *attr_mutation
+    # Bumped on every tree or id/class attribute change.
+    size_t version
+    # Bumped on every attribute change.
+    size_t attributes_version
+
+ctypedef struct _StopAfter:
+    lxb_html_tokenizer_token_f callback
+    void *ctx
+    lxb_html_tree_t *tree
+    lxb_tag_id_t tag_id
+    # First target element inserted into the tree and its last seen position
+    # on the stack of open elements.
+    lxb_dom_node_t *element
+    size_t index
+    # Last node checked by _stop_after_find_inserted.
+    lxb_dom_node_t *cursor
+    bint stopped
 
 cdef class LexborHTMLParser:
     cdef lxb_html_document_t *document
     cdef lxb_dom_node_t *_fragment_wrapper
-    cdef lxb_dom_node_t *_fragment_root
     cdef bint _is_fragment
+    cdef bint _is_streaming
+    cdef _StopAfter _stop_after
     cdef lxb_tag_id_t _fragment_tag_id
     cdef lxb_ns_id_t _fragment_namespace_id
     cdef public bytes raw_html
+    cdef const lxb_encoding_data_t *_encoding
+    cdef public bint detect_encoding
+    cdef public bint use_meta_tags
     cdef LexborCSSSelector _selector
+    # Weak mapping of node addresses to their wrappers, None when caching is disabled.
+    cdef object _node_cache
+    # Tag, id and class index, None when indexing is disabled.
+    cdef object _index
+    cdef _MutationHooks _mutation_hooks
     cdef inline void _new_html_document(self)
     cdef inline lxb_status_t _parse_html_document(self, char *html, size_t html_len) nogil
     cdef inline lxb_status_t _parse_html_fragment(self, char *html, size_t html_len) nogil
     cdef int _parse_html(self, char *html, size_t html_len) except -1
-    cdef object cached_script_texts
-    cdef object cached_script_srcs
+    cdef int _parse_chunk_begin(self, str stop_after) except -1
+    cdef int _parse_chunk(self, const char *html, size_t html_len) except -1
+    cdef int _parse_input(self, char *html, size_t html_len, str stop_after) except -1
+    cdef int _check_mutable(self) except -1
+    # Contents of scripts and other elements, None until first used.
+    cdef object _raw_text_cache
 
     @staticmethod
     cdef LexborHTMLParser from_document(lxb_html_document_t * document, bytes raw_html)
@@ -343,7 +495,16 @@ cdef extern from "lexbor/dom/dom.h" nogil:
     ctypedef struct lxb_dom_text_t:
         lxb_dom_character_data_t char_data
 
-    ctypedef uintptr_t lxb_dom_attr_id_t
+    ctypedef struct lxb_dom_processing_instruction_t:
+        lxb_dom_character_data_t char_data
+        lexbor_str_t             target
+
+    ctypedef struct lxb_dom_document_fragment_t:
+        lxb_dom_node_t node
+
+    ctypedef struct lxb_html_template_element_t:
+        lxb_dom_document_fragment_t *content
+
     ctypedef struct lxb_dom_collection_t:
         lexbor_array_t     array
         lxb_dom_document_t *document
@@ -375,6 +536,8 @@ cdef extern from "lexbor/dom/dom.h" nogil:
     lxb_dom_attr_t * lxb_dom_element_first_attribute_noi(lxb_dom_element_t *element)
 
     const lxb_char_t * lxb_dom_attr_local_name_noi(lxb_dom_attr_t *attr, size_t *len)
+    const lxb_char_t * lxb_dom_attr_qualified_name(lxb_dom_attr_t *attr, size_t *len)
+    const lxb_char_t * lxb_dom_document_type_name_noi(lxb_dom_document_type_t *doc_type, size_t *len)
     const lxb_char_t * lxb_dom_attr_value_noi(lxb_dom_attr_t *attr, size_t *len)
 
     lxb_dom_attr_t * lxb_dom_element_set_attribute(lxb_dom_element_t *element,
@@ -397,10 +560,18 @@ cdef extern from "lexbor/dom/dom.h" nogil:
 
 
 cdef extern from "lexbor/dom/interfaces/element.h" nogil:
+    const lxb_char_t * lxb_dom_element_id_noi(lxb_dom_element_t *element, size_t *len)
+    const lxb_char_t * lxb_dom_element_class_noi(lxb_dom_element_t *element, size_t *len)
     lxb_status_t lxb_dom_elements_by_tag_name(lxb_dom_element_t *root, lxb_dom_collection_t *collection,
                                               const lxb_char_t *qualified_name, size_t len)
 
 
+cdef extern from "lexbor/dom/interfaces/attr_const.h" nogil:
+    ctypedef enum lxb_dom_attr_id_enum_t:
+        LXB_DOM_ATTR_CLASS = 0x0005
+        LXB_DOM_ATTR_ID = 0x0012
+
+
 cdef extern from "lexbor/dom/interfaces/document.h" nogil:
     lxb_html_document_t * lxb_html_document_destroy(lxb_html_document_t *document)
 
@@ -664,7 +835,41 @@ cdef extern from "lexbor/selectors/selectors.h" nogil:
     ctypedef struct lxb_css_selectors_t
 
     ctypedef struct lxb_selectors_t
-    ctypedef struct lxb_css_selector_list_t
+    ctypedef enum lxb_css_selector_type_t:
+        LXB_CSS_SELECTOR_TYPE__UNDEF = 0x00
+        LXB_CSS_SELECTOR_TYPE_ANY
+        LXB_CSS_SELECTOR_TYPE_ELEMENT
+        LXB_CSS_SELECTOR_TYPE_ID
+        LXB_CSS_SELECTOR_TYPE_CLASS
+        LXB_CSS_SELECTOR_TYPE_ATTRIBUTE
+        LXB_CSS_SELECTOR_TYPE_PSEUDO_CLASS
+        LXB_CSS_SELECTOR_TYPE_PSEUDO_CLASS_FUNCTION
+        LXB_CSS_SELECTOR_TYPE_PSEUDO_ELEMENT
+        LXB_CSS_SELECTOR_TYPE_PSEUDO_ELEMENT_FUNCTION
+
+    ctypedef enum lxb_css_selector_combinator_t:
+        LXB_CSS_SELECTOR_COMBINATOR_DESCENDANT = 0x00
+        LXB_CSS_SELECTOR_COMBINATOR_CLOSE
+        LXB_CSS_SELECTOR_COMBINATOR_CHILD
+        LXB_CSS_SELECTOR_COMBINATOR_SIBLING
+        LXB_CSS_SELECTOR_COMBINATOR_FOLLOWING
+        LXB_CSS_SELECTOR_COMBINATOR_CELL
+
+    ctypedef struct lxb_css_selector_t:
+        lxb_css_selector_type_t type
+        lxb_css_selector_combinator_t combinator
+        lexbor_str_t name
+        lexbor_str_t ns
+        lxb_css_selector_t *next
+        lxb_css_selector_t *prev
+        lxb_css_selector_list_t *list
+
+    ctypedef struct lxb_css_selector_list_t:
+        lxb_css_selector_t *first
+        lxb_css_selector_t *last
+        lxb_css_selector_list_t *next
+        lxb_css_selector_list_t *prev
+
     ctypedef struct lxb_css_selector_specificity_t
     ctypedef lxb_status_t (*lxb_selectors_cb_f)(lxb_dom_node_t *node, lxb_css_selector_specificity_t *spec, void *ctx)
     ctypedef enum lxb_selectors_opt_t:
@@ -684,3 +889,5 @@ cdef extern from "lexbor/selectors/selectors.h" nogil:
     lxb_selectors_t * lxb_selectors_destroy(lxb_selectors_t *selectors, bint self_destroy)
     lxb_status_t lxb_selectors_find(lxb_selectors_t *selectors, lxb_dom_node_t *root,
                                     lxb_css_selector_list_t *list, lxb_selectors_cb_f cb, void *ctx)
+    lxb_status_t lxb_selectors_match_node(lxb_selectors_t *selectors, lxb_dom_node_t *node,
+                                          lxb_css_selector_list_t *list, lxb_selectors_cb_f cb, void *ctx)
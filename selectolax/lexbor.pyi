@@ -1,6 +1,20 @@
 from __future__ import annotations
 
-from typing import Any, Iterator, Literal, NoReturn, Optional, TypeVar, overload
+import os
+from typing import (
+    Any,
+    Iterable,
+    Iterator,
+    Literal,
+    NamedTuple,
+    NoReturn,
+    Optional,
+    TypeVar,
+    overload,
+)
+
+from _typeshed import SupportsWrite
+from typing_extensions import Buffer
 
 DefaultT = TypeVar("DefaultT")
 
@@ -37,7 +51,12 @@ class LexborSelector:
     """
 
     def __init__(self, node: LexborNode, query: str): ...
-    def css(self, query: str) -> NoReturn: ...
+    def css(self, query: str | LexborCompiledSelector) -> LexborSelector:
+        """Evaluate CSS selector against current scope.
+
+        Accepts a query string or a selector created by ``compile_selector``.
+        """
+        ...
     @property
     def matches(self) -> list[LexborNode]:
         """Returns all possible matches"""
@@ -106,10 +125,29 @@ class LexborSelector:
         """
         ...
 
+class LexborCompiledSelector:
+    """A pre-parsed CSS selector that can be reused across nodes and documents.
+
+    Use ``compile_selector`` to create instances.
+    The object is immutable and can be passed to ``css``, ``css_first``
+    and ``css_matches`` in place of a query string.
+    """
+
+    @property
+    def query(self) -> str: ...
+    def __init__(self, query: str): ...
+
 class LexborCSSSelector:
     def __init__(self): ...
-    def find(self, query: str, node: LexborNode) -> list[LexborNode]: ...
-    def any_matches(self, query: str, node: LexborNode) -> bool: ...
+    def find(
+        self, query: str | LexborCompiledSelector, node: LexborNode
+    ) -> list[LexborNode]: ...
+    def find_many(
+        self, queries: dict[str, str | LexborCompiledSelector], node: LexborNode
+    ) -> dict[str, list[LexborNode]]: ...
+    def any_matches(
+        self, query: str | LexborCompiledSelector, node: LexborNode
+    ) -> bool: ...
 
 class LexborNode:
     """A class that represents HTML node (element)."""
@@ -161,6 +199,33 @@ class LexborNode:
         """
         ...
 
+    @property
+    def html_bytes(self) -> bytes | None:
+        """Return UTF-8 encoded HTML representation of the current node including all its child nodes.
+
+        Same as ``html``, but skips decoding the serialized output.
+
+        Returns
+        -------
+        html : bytes
+        """
+        ...
+
+    def write_html(self, fileobj: SupportsWrite[bytes] | SupportsWrite[str]) -> None:
+        """Write HTML representation of the current node including all its child nodes to a file object.
+
+        Unlike ``html``, the output is passed to ``fileobj.write`` in chunks while
+        the tree is serialized, so the whole string is never kept in memory.
+
+        Parameters
+        ----------
+        fileobj : object
+            Object with a ``write`` method, such as a file opened in binary mode.
+            Text streams (``io.TextIOBase``) receive ``str`` chunks, other objects
+            receive UTF-8 encoded ``bytes``.
+        """
+        ...
+
     def html_pretty(
         self,
         indent: int = 0,
@@ -198,7 +263,52 @@ class LexborNode:
         """
         ...
 
-    def __hash__(self) -> int: ...
+    def __hash__(self) -> int:
+        """Hash the node structure, consistent with ``==``.
+
+        The hash changes when the subtree is modified, use ``mem_id`` to identify nodes.
+        """
+        ...
+
+    def __eq__(self, other: object) -> bool:
+        """Compare nodes by structure: tags, attributes, text and children.
+
+        Strings are compared with the HTML representation of the node.
+        """
+        ...
+
+    def content_hash(self) -> int:
+        """Return a 64-bit hash of the node structure: tags, attributes, text and children.
+
+        Structurally equal nodes have equal hashes, even across documents.
+        The hash is computed from the tree directly, without serializing it to HTML.
+
+        Returns
+        -------
+        hash : int
+        """
+        ...
+
+    def subtree_hashes(self, min_size: int = 0) -> list[tuple[LexborNode, int, int]]:
+        """Return content hashes of the current node and all its descendant elements.
+
+        All hashes are computed in one bottom-up pass over the tree, every element
+        hash is derived from the hashes of its children. Use it to find repeated
+        blocks such as navigation bars and footers across pages.
+
+        Parameters
+        ----------
+        min_size : int, optional
+            Skip elements with fewer than ``min_size`` characters of text. Defaults to ``0``.
+
+        Returns
+        -------
+        list of tuple[LexborNode, int, int]
+            ``(node, hash, text_len)`` tuples in document order. ``hash`` equals
+            ``node.content_hash()`` and ``text_len`` equals ``len(node.text())``.
+        """
+        ...
+
     def text_lexbor(self) -> str:
         """Returns the text of the node including text of all its child nodes.
 
@@ -237,7 +347,24 @@ class LexborNode:
         """
         ...
 
-    def css(self, query: str) -> list[LexborNode]:
+    def text_bytes(
+        self,
+        deep: bool = True,
+        separator: str = "",
+        strip: bool = False,
+        skip_empty: bool = False,
+    ) -> bytes:
+        """Return concatenated text from this node as UTF-8 encoded bytes.
+
+        Same as ``text``, but skips decoding the result.
+
+        Returns
+        -------
+        text : bytes
+        """
+        ...
+
+    def css(self, query: str | LexborCompiledSelector) -> list[LexborNode]:
         """Evaluate CSS selector against current node and its child nodes.
 
         Matches pattern `query` against HTML tree.
@@ -251,8 +378,9 @@ class LexborNode:
 
         Parameters
         ----------
-        query : str
+        query : str or LexborCompiledSelector
             CSS selector (e.g. "div > :nth-child(2n+1):not(:has(a))").
+            A selector created by ``compile_selector`` skips parsing.
 
         Returns
         -------
@@ -260,9 +388,139 @@ class LexborNode:
         """
         ...
 
+    def css_many(
+        self, queries: dict[str, str | LexborCompiledSelector]
+    ) -> dict[str, list[LexborNode]]:
+        """Evaluate several CSS selectors in a single pass over the tree.
+
+        Equivalent to calling ``css`` for every selector, but the tree is walked only once
+        and every element is matched against all selectors at the same time.
+
+        Parameters
+        ----------
+        queries : dict
+            Mapping of names to CSS selectors (``str`` or ``LexborCompiledSelector``).
+
+        Returns
+        -------
+        matches : dict
+            Mapping of the same names to lists of matching `LexborNode` objects in document order.
+        """
+        ...
+
+    def extract_columns(
+        self,
+        query: str | LexborCompiledSelector,
+        attrs: Iterable[str] = (),
+        text: bool = False,
+    ) -> dict[str, tuple[bytes, bytes, bytes | None]]:
+        """Extract attribute values and text of matching nodes into Arrow-compatible buffers.
+
+        Values of all nodes matching ``query`` are written into one contiguous UTF-8
+        buffer per column, without creating a ``LexborNode`` per match or a ``str`` per value.
+        Each column has the layout of an Arrow ``string`` array and can be loaded with
+        ``pyarrow.Array.from_buffers(pyarrow.string(), len(offsets) // 4 - 1,
+        [validity and pyarrow.py_buffer(validity), pyarrow.py_buffer(offsets), pyarrow.py_buffer(data)])``.
+
+        Parameters
+        ----------
+        query : str or LexborCompiledSelector
+            CSS selector of the rows.
+        attrs : sequence of str, optional
+            Attribute names to extract, one column each.
+        text : bool, optional
+            Add a ``"text"`` column with the text content of the matched nodes. Defaults to ``False``.
+
+        Returns
+        -------
+        dict
+            Mapping of column names to ``(data, offsets, validity)`` tuples of ``bytes``.
+            ``offsets`` holds native-endian int32 values, one more than the number of rows,
+            and row ``i`` is ``data[offsets[i]:offsets[i + 1]]``. ``validity`` is a bitmap with
+            one bit per row, least significant bit first, and marks rows where the attribute
+            is missing with 0. It is ``None`` when no value is missing.
+
+        Raises
+        ------
+        OverflowError
+            If a column is larger than 2 GiB.
+
+        Examples
+        --------
+
+        >>> tree = LexborHTMLParser("<a href='/'>Home</a><a>Empty</a>")
+        >>> columns = tree.extract_columns("a", attrs=["href"], text=True)
+        >>> data, offsets, validity = columns["href"]
+        >>> data, array.array("i", offsets), validity
+        (b'/', array('i', [0, 1, 1]), b'\\x01')
+        """
+        ...
+
+    def css_attr(
+        self, query: str | LexborCompiledSelector, name: str
+    ) -> list[str | None]:
+        """Return the value of an attribute for every node matching ``query``.
+
+        Equivalent to ``[node.attrs.get(name) for node in self.css(query)]``, but values
+        are read during the selector walk, without creating a ``LexborNode`` per match.
+
+        Parameters
+        ----------
+        query : str or LexborCompiledSelector
+            CSS selector.
+        name : str
+            Attribute name.
+
+        Returns
+        -------
+        list of str or None
+            Values in document order. Like ``attrs.get``, missing attributes
+            and attributes without a value give ``None``.
+
+        Examples
+        --------
+
+        >>> tree = LexborHTMLParser("<a href='/'>Home</a><a href='/about'>About</a>")
+        >>> tree.css_attr("a[href]", "href")
+        ['/', '/about']
+        """
+        ...
+
+    def css_attrs(
+        self, query: str | LexborCompiledSelector, names: Iterable[str]
+    ) -> list[tuple[str | None, ...]]:
+        """Return the values of several attributes for every node matching ``query``.
+
+        Like ``css_attr``, but reads all ``names`` during the same selector walk.
+
+        Parameters
+        ----------
+        query : str or LexborCompiledSelector
+            CSS selector.
+        names : sequence of str
+            Attribute names.
+
+        Returns
+        -------
+        list of tuple
+            A tuple of values per match, in document order, with one item per name.
+            Missing attributes and attributes without a value give ``None``.
+
+        Examples
+        --------
+
+        >>> tree = LexborHTMLParser("<a href='/' rel='home'>Home</a><a href='/about'>About</a>")
+        >>> tree.css_attrs("a", ["href", "rel"])
+        [('/', 'home'), ('/about', None)]
+        """
+        ...
+
     @overload
     def css_first(
-        self, query: str, default: Any = ..., strict: Literal[True] = ...
+        self,
+        query: str | LexborCompiledSelector,
+        default: Any = ...,
+        strict: Literal[True] = ...,
     ) -> LexborNode:
         """Same as `css` but returns only the first match.
 
@@ -284,7 +542,10 @@ class LexborNode:
 
     @overload
     def css_first(
-        self, query: str, default: DefaultT, strict: bool = False
+        self,
+        query: str | LexborCompiledSelector,
+        default: DefaultT,
+        strict: bool = False,
     ) -> LexborNode | DefaultT:
         """Same as `css` but returns only the first match.
 
@@ -306,7 +567,10 @@ class LexborNode:
 
     @overload
     def css_first(
-        self, query: str, default: None = ..., strict: bool = False
+        self,
+        query: str | LexborCompiledSelector,
+        default: None = ...,
+        strict: bool = False,
     ) -> LexborNode | None:
         """Same as `css` but returns only the first match.
 
@@ -326,11 +590,13 @@ class LexborNode:
         """
         ...
 
-    def any_css_matches(self, selectors: tuple[str]) -> bool:
+    def any_css_matches(
+        self, selectors: tuple[str | LexborCompiledSelector, ...]
+    ) -> bool:
         """Returns True if any of CSS selectors matches a node"""
         ...
 
-    def css_matches(self, selector: str) -> bool:
+    def css_matches(self, selector: str | LexborCompiledSelector) -> bool:
         """Returns True if CSS selector matches a node."""
         ...
 
@@ -563,6 +829,32 @@ class LexborNode:
         """
         ...
 
+    def traverse_tags(
+        self, include_text: bool = False, skip_empty: bool = False
+    ) -> Iterator[tuple[int, int]]:
+        """Depth-first traversal that yields tag ids and depths instead of nodes.
+
+        Works like ``traverse``, but does not create a ``LexborNode`` per visited node,
+        which makes walks over large documents considerably faster.
+
+        Parameters
+        ----------
+        include_text : bool, optional
+            When ``True``, include text nodes in the traversal sequence. Defaults
+            to ``False``.
+        skip_empty : bool, optional
+            Skip text nodes that contain only ASCII whitespace (space, tab,
+            newline, form feed or carriage return) when ``include_text`` is
+            ``True``. Defaults to ``False``.
+
+        Returns
+        -------
+        iterator of tuple[int, int]
+            ``(tag_id, depth)`` tuples in the same order as ``traverse``. The
+            current node has depth ``0``, its children have depth ``1`` and so on.
+        """
+        ...
+
     def replace_with(self, value: bytes | str | LexborNode) -> None:
         """Replace current Node with specified value.
 
@@ -705,7 +997,7 @@ class LexborNode:
     def scripts_contain(self, query: str) -> bool:
         """Returns True if any of the script tags contain specified text.
 
-        Caches script tags on the first call to improve performance.
+        Script contents of the whole document are cached until the document is modified.
 
         Parameters
         ----------
@@ -714,10 +1006,50 @@ class LexborNode:
         """
         ...
 
+    def scripts_contain_any(self, patterns: tuple[str, ...]) -> bool:
+        """Returns True if any of the script tags contain one of the patterns.
+
+        All patterns are searched in a single pass over every script,
+        which is much faster than calling ``scripts_contain`` for each of them.
+        Script contents of the whole document are cached until the document is modified.
+
+        Parameters
+        ----------
+        patterns : tuple of str
+            Strings to look for, such as signatures of tracking scripts.
+
+        Examples
+        --------
+
+        >>> tree = LexborHTMLParser("<script>gtag('config', 'G-1');</script>")
+        >>> tree.scripts_contain_any(("fbq(", "gtag("))
+        True
+        """
+        ...
+
+    def raw_text_contains_any(
+        self, patterns: tuple[str, ...], tags: str | Iterable[str] = ("script", "style")
+    ) -> bool:
+        """Returns True if the text of any of the ``tags`` elements contains one of the patterns.
+
+        Works like ``scripts_contain_any`` for other elements with raw content,
+        such as ``style``, ``noscript``, ``title`` or ``textarea``.
+        Element contents of the whole document are cached until the document is modified.
+
+        Parameters
+        ----------
+        patterns : tuple of str
+            Strings to look for.
+        tags : str or iterable of str, default ("script", "style")
+            Names of the elements to search in.
+
+        """
+        ...
+
     def script_srcs_contain(self, queries: tuple[str]) -> bool:
         """Returns True if any of the script SRCs attributes contain on of the specified text.
 
-        Caches values on the first call to improve performance.
+        Values of the whole document are cached until the document is modified.
 
         Parameters
         ----------
@@ -806,6 +1138,18 @@ class LexborNode:
         """
         ...
 
+    @property
+    def inner_html_bytes(self) -> bytes | None:
+        """Return UTF-8 encoded HTML representation of the child nodes.
+
+        Same as ``inner_html``, but skips decoding the serialized output.
+
+        Returns
+        -------
+        html : bytes | None
+        """
+        ...
+
     def inner_html_pretty(
         self,
         indent: int = 0,
@@ -896,24 +1240,33 @@ class LexborHTMLParser:
     Parameters
     ----------
 
-    html : str (unicode) or bytes
+    html : str (unicode), bytes or buffer
     """
 
-    raw_html: bytes
+    raw_html: bytes | None
+    detect_encoding: bool
+    use_meta_tags: bool
 
     def __init__(
         self,
-        html: str | bytes,
+        html: str | Buffer,
         is_fragment: bool = False,
         fragment_tag: str = "div",
         fragment_namespace: str = "html",
+        stop_after: str | None = None,
+        detect_encoding: bool = False,
+        use_meta_tags: bool = True,
+        cache_nodes: bool = False,
+        use_index: bool = False,
     ) -> None:
         """Create a parser and load HTML.
 
         Parameters
         ----------
-        html : str or bytes
-            HTML content to parse.
+        html : str, bytes or buffer
+            HTML content to parse. Objects that support the buffer protocol,
+            such as ``bytearray``, ``memoryview`` or ``mmap``, are parsed in place
+            without copying; ``raw_html`` is ``None`` for them.
         is_fragment : bool, optional
             When ``False`` (default), the input is parsed as a full HTML document.
             If the input is only a fragment, the parser still accepts it and inserts any missing required elements,
@@ -933,6 +1286,28 @@ class LexborHTMLParser:
             Context element namespace used for fragment parsing. Defaults to ``"html"``.
             Accepts Lexbor namespace names such as ``"html"``, ``"svg"``, and ``"math"``,
             or a namespace URI recognized by Lexbor. Only used when ``is_fragment`` is ``True``.
+        stop_after : str, optional
+            Tag name of an element, such as ``"head"``. Parsing stops once the first
+            such element is closed, so the rest of the input is not built into the tree.
+            Useful when only the document metadata is needed.
+            Cannot be combined with ``is_fragment``.
+        detect_encoding : bool, optional
+            If ``True`` and ``html`` is ``bytes``, the encoding is detected from the BOM
+            and, optionally, from ``<meta>`` tags. Non UTF-8 input is converted to UTF-8
+            by Lexbor, so the bytes don't have to be decoded in Python first.
+            When nothing is found, the input is treated as UTF-8. Defaults to ``False``.
+        use_meta_tags : bool, optional
+            Whether to use ``<meta charset>`` and ``<meta http-equiv>`` tags
+            in the encoding detection process. Defaults to ``True``.
+        cache_nodes : bool, optional
+            If ``True``, every node is represented by a single ``LexborNode`` instance
+            for as long as it is referenced, so navigating back and forth returns
+            the same objects and ``is`` checks work. See ``cache_nodes``.
+            Defaults to ``False``.
+        use_index : bool, optional
+            If ``True``, ``tags`` and simple selectors such as ``"a"``, ``"#id"`` and ``".cls"``
+            are answered from an index of the document. See ``use_index``.
+            Defaults to ``False``.
 
         """
         ...
@@ -947,6 +1322,56 @@ class LexborHTMLParser:
         """
         ...
 
+    @property
+    def cache_nodes(self) -> bool:
+        """Whether node wrappers are cached.
+
+        When enabled, the parser keeps a weak mapping from nodes to their ``LexborNode``
+        wrappers. Properties such as ``parent`` and ``next`` and results of ``css``
+        return the existing wrapper of a node while it is alive, instead of a new one.
+        Disabling the cache drops the mapping.
+
+        Returns
+        -------
+        bool
+        """
+        ...
+
+    @cache_nodes.setter
+    def cache_nodes(self, value: bool) -> None: ...
+    @property
+    def use_index(self) -> bool:
+        """Whether ``tags``, ``css`` and ``css_first`` use an index of the document.
+
+        The index maps tag names, ids and classes to elements. It is built on the first
+        lookup and rebuilt lazily after the tree or ``id`` and ``class`` attributes change.
+        Only single tag names, ``"*"``, ``"#id"`` and ``".class"`` selectors of the parser
+        are answered from it; other queries, fragments and node methods work as usual.
+
+        Useful when a large document is queried many times.
+
+        Returns
+        -------
+        bool
+        """
+        ...
+
+    @use_index.setter
+    def use_index(self, value: bool) -> None: ...
+    @property
+    def input_encoding(self) -> str:
+        """Return encoding of the HTML document.
+
+        The encoding is only detected when the parser is created with
+        ``detect_encoding=True`` from ``bytes``; otherwise the input is UTF-8.
+
+        Returns
+        -------
+        str
+            Encoding name, e.g. ``"UTF-8"`` or ``"windows-1251"``.
+        """
+        ...
+
     @property
     def selector(self) -> LexborCSSSelector:
         """Return a lazily created CSS selector helper.
@@ -1013,6 +1438,68 @@ class LexborHTMLParser:
         """
         ...
 
+    @overload
+    def get_element_by_id(
+        self, element_id: str, default: DefaultT
+    ) -> LexborNode | DefaultT:
+        """Return the first element whose ``id`` attribute is exactly ``element_id``.
+
+        Works like ``document.getElementById`` in browsers: the whole document is searched
+        and the comparison is case-sensitive, unlike the ``#id`` selector in Lexbor.
+        With ``use_index`` enabled the lookup takes constant time until the document
+        is modified; otherwise the tree is walked.
+
+        Parameters
+        ----------
+        element_id : str
+            Value of the ``id`` attribute.
+        default : Any, default None
+            Value to return if there is no such element.
+
+        Returns
+        -------
+        LexborNode or default
+
+        Examples
+        --------
+
+        >>> tree = LexborHTMLParser('<div id="price">$10</div>')
+        >>> tree.get_element_by_id("price").text()
+        '$10'
+        """
+        ...
+
+    @overload
+    def get_element_by_id(
+        self, element_id: str, default: None = ...
+    ) -> LexborNode | None:
+        """Return the first element whose ``id`` attribute is exactly ``element_id``.
+
+        Works like ``document.getElementById`` in browsers: the whole document is searched
+        and the comparison is case-sensitive, unlike the ``#id`` selector in Lexbor.
+        With ``use_index`` enabled the lookup takes constant time until the document
+        is modified; otherwise the tree is walked.
+
+        Parameters
+        ----------
+        element_id : str
+            Value of the ``id`` attribute.
+        default : Any, default None
+            Value to return if there is no such element.
+
+        Returns
+        -------
+        LexborNode or default
+
+        Examples
+        --------
+
+        >>> tree = LexborHTMLParser('<div id="price">$10</div>')
+        >>> tree.get_element_by_id("price").text()
+        '$10'
+        """
+        ...
+
     def text(
         self,
         deep: bool = True,
@@ -1042,6 +1529,23 @@ class LexborHTMLParser:
         """
         ...
 
+    def text_bytes(
+        self,
+        deep: bool = True,
+        separator: str = "",
+        strip: bool = False,
+        skip_empty: bool = False,
+    ) -> bytes:
+        """Returns the text of the node including text of all its child nodes as UTF-8 encoded bytes.
+
+        Same as ``text``, but skips decoding the result.
+
+        Returns
+        -------
+        text : bytes
+        """
+        ...
+
     @property
     def html(self) -> str | None:
         """Return HTML representation of the page.
@@ -1053,6 +1557,40 @@ class LexborHTMLParser:
         """
         ...
 
+    @property
+    def html_bytes(self) -> bytes | None:
+        """Return UTF-8 encoded HTML representation of the page.
+
+        Same as ``html``, but skips decoding the serialized output.
+
+        Returns
+        -------
+        bytes or None
+            Serialized HTML of the current document.
+        """
+        ...
+
+    def write_html(self, fileobj: SupportsWrite[bytes] | SupportsWrite[str]) -> None:
+        """Write HTML representation of the page to a file object.
+
+        Unlike ``html``, the output is passed to ``fileobj.write`` in chunks while
+        the document is serialized, so the whole string is never kept in memory.
+
+        Parameters
+        ----------
+        fileobj : object
+            Object with a ``write`` method, such as a file opened in binary mode.
+            Text streams (``io.TextIOBase``) receive ``str`` chunks, other objects
+            receive UTF-8 encoded ``bytes``.
+
+        Examples
+        --------
+
+        >>> with open("page.html", "wb") as f:
+        ...     tree.write_html(f)
+        """
+        ...
+
     def html_pretty(
         self,
         indent: int = 0,
@@ -1090,7 +1628,7 @@ class LexborHTMLParser:
         """
         ...
 
-    def css(self, query: str) -> list[LexborNode]:
+    def css(self, query: str | LexborCompiledSelector) -> list[LexborNode]:
         """A CSS selector.
 
         Matches pattern `query` against HTML tree.
@@ -1103,8 +1641,9 @@ class LexborHTMLParser:
 
         Parameters
         ----------
-        query : str
+        query : str or LexborCompiledSelector
             CSS selector (e.g. "div > :nth-child(2n+1):not(:has(a))").
+            A selector created by ``compile_selector`` skips parsing.
 
         Returns
         -------
@@ -1112,16 +1651,145 @@ class LexborHTMLParser:
         """
         ...
 
+    def css_many(
+        self, queries: dict[str, str | LexborCompiledSelector]
+    ) -> dict[str, list[LexborNode]]:
+        """Evaluate several CSS selectors in a single pass over the document.
+
+        Equivalent to calling ``css`` for every selector, but the tree is walked only once.
+
+        Parameters
+        ----------
+        queries : dict
+            Mapping of names to CSS selectors (``str`` or ``LexborCompiledSelector``).
+
+        Returns
+        -------
+        matches : dict
+            Mapping of the same names to lists of matching `LexborNode` objects in document order.
+        """
+        ...
+
+    def extract_columns(
+        self,
+        query: str | LexborCompiledSelector,
+        attrs: Iterable[str] = (),
+        text: bool = False,
+    ) -> dict[str, tuple[bytes, bytes, bytes | None]]:
+        """Extract attribute values and text of matching nodes into Arrow-compatible buffers.
+
+        Values of all nodes matching ``query`` are written into one contiguous UTF-8
+        buffer per column, without creating a ``LexborNode`` per match or a ``str`` per value.
+        Each column has the layout of an Arrow ``string`` array and can be loaded with
+        ``pyarrow.Array.from_buffers(pyarrow.string(), len(offsets) // 4 - 1,
+        [validity and pyarrow.py_buffer(validity), pyarrow.py_buffer(offsets), pyarrow.py_buffer(data)])``.
+
+        Parameters
+        ----------
+        query : str or LexborCompiledSelector
+            CSS selector of the rows.
+        attrs : sequence of str, optional
+            Attribute names to extract, one column each.
+        text : bool, optional
+            Add a ``"text"`` column with the text content of the matched nodes. Defaults to ``False``.
+
+        Returns
+        -------
+        dict
+            Mapping of column names to ``(data, offsets, validity)`` tuples of ``bytes``.
+            ``offsets`` holds native-endian int32 values, one more than the number of rows,
+            and row ``i`` is ``data[offsets[i]:offsets[i + 1]]``. ``validity`` is a bitmap with
+            one bit per row, least significant bit first, and marks rows where the attribute
+            is missing with 0. It is ``None`` when no value is missing.
+
+        Raises
+        ------
+        OverflowError
+            If a column is larger than 2 GiB.
+
+        Examples
+        --------
+
+        >>> tree = LexborHTMLParser("<a href='/'>Home</a><a>Empty</a>")
+        >>> columns = tree.extract_columns("a", attrs=["href"], text=True)
+        >>> data, offsets, validity = columns["href"]
+        >>> data, array.array("i", offsets), validity
+        (b'/', array('i', [0, 1, 1]), b'\\x01')
+        """
+        ...
+
+    def css_attr(
+        self, query: str | LexborCompiledSelector, name: str
+    ) -> list[str | None]:
+        """Return the value of an attribute for every node matching ``query``.
+
+        Equivalent to ``[node.attrs.get(name) for node in self.css(query)]``, but values
+        are read during the selector walk, without creating a ``LexborNode`` per match.
+
+        Parameters
+        ----------
+        query : str or LexborCompiledSelector
+            CSS selector.
+        name : str
+            Attribute name.
+
+        Returns
+        -------
+        list of str or None
+            Values in document order. Like ``attrs.get``, missing attributes
+            and attributes without a value give ``None``.
+
+        Examples
+        --------
+
+        >>> tree = LexborHTMLParser("<a href='/'>Home</a><a href='/about'>About</a>")
+        >>> tree.css_attr("a[href]", "href")
+        ['/', '/about']
+        """
+        ...
+
+    def css_attrs(
+        self, query: str | LexborCompiledSelector, names: Iterable[str]
+    ) -> list[tuple[str | None, ...]]:
+        """Return the values of several attributes for every node matching ``query``.
+
+        Like ``css_attr``, but reads all ``names`` during the same selector walk.
+
+        Parameters
+        ----------
+        query : str or LexborCompiledSelector
+            CSS selector.
+        names : sequence of str
+            Attribute names.
+
+        Returns
+        -------
+        list of tuple
+            A tuple of values per match, in document order, with one item per name.
+            Missing attributes and attributes without a value give ``None``.
+
+        Examples
+        --------
+
+        >>> tree = LexborHTMLParser("<a href='/' rel='home'>Home</a><a href='/about'>About</a>")
+        >>> tree.css_attrs("a", ["href", "rel"])
+        [('/', 'home'), ('/about', None)]
+        """
+        ...
+
     @overload
     def css_first(
-        self, query: str, default: Any = ..., strict: Literal[True] = ...
+        self,
+        query: str | LexborCompiledSelector,
+        default: Any = ...,
+        strict: Literal[True] = ...,
     ) -> LexborNode:
         """Same as `css` but returns only the first match.
 
         Parameters
         ----------
 
-        query : str
+        query : str or LexborCompiledSelector
         default : Any, default None
             Default value to return if there is no match.
         strict: bool, default False
@@ -1136,14 +1804,17 @@ class LexborHTMLParser:
 
     @overload
     def css_first(
-        self, query: str, default: DefaultT, strict: bool = False
+        self,
+        query: str | LexborCompiledSelector,
+        default: DefaultT,
+        strict: bool = False,
     ) -> LexborNode | DefaultT:
         """Same as `css` but returns only the first match.
 
         Parameters
         ----------
 
-        query : str
+        query : str or LexborCompiledSelector
         default : Any, default None
             Default value to return if there is no match.
         strict: bool, default False
@@ -1158,14 +1829,17 @@ class LexborHTMLParser:
 
     @overload
     def css_first(
-        self, query: str, default: None = ..., strict: bool = False
+        self,
+        query: str | LexborCompiledSelector,
+        default: None = ...,
+        strict: bool = False,
     ) -> LexborNode | None:
         """Same as `css` but returns only the first match.
 
         Parameters
         ----------
 
-        query : str
+        query : str or LexborCompiledSelector
         default : Any, default None
             Default value to return if there is no match.
         strict: bool, default False
@@ -1220,7 +1894,9 @@ class LexborHTMLParser:
         """
         ...
 
-    def any_css_matches(self, selectors: tuple[str]) -> bool:
+    def any_css_matches(
+        self, selectors: tuple[str | LexborCompiledSelector, ...]
+    ) -> bool:
         """Return ``True`` if any of the specified CSS selectors match.
 
         Parameters
@@ -1238,7 +1914,7 @@ class LexborHTMLParser:
     def scripts_contain(self, query: str) -> bool:
         """Return ``True`` if any script tag contains the given text.
 
-        Caches script tags on the first call to improve performance.
+        Script contents are cached until the document is modified.
 
         Parameters
         ----------
@@ -1252,10 +1928,59 @@ class LexborHTMLParser:
         """
         ...
 
+    def scripts_contain_any(self, patterns: tuple[str, ...]) -> bool:
+        """Return ``True`` if any script tag contains one of the patterns.
+
+        All patterns are searched in a single pass over every script with
+        an Aho-Corasick automaton, so checking thousands of signatures costs about
+        as much as checking one. Compiled pattern sets and script contents are cached,
+        the latter until the document is modified.
+
+        Parameters
+        ----------
+        patterns : tuple of str
+            Strings to look for, such as signatures of tracking scripts.
+
+        Returns
+        -------
+        bool
+            ``True`` when a script contains at least one of the patterns.
+
+        Examples
+        --------
+
+        >>> tree = LexborHTMLParser("<script>gtag('config', 'G-1');</script>")
+        >>> tree.scripts_contain_any(("fbq(", "gtag("))
+        True
+        """
+        ...
+
+    def raw_text_contains_any(
+        self, patterns: tuple[str, ...], tags: str | Iterable[str] = ("script", "style")
+    ) -> bool:
+        """Return ``True`` if the text of any of the ``tags`` elements contains one of the patterns.
+
+        Works like ``scripts_contain_any`` for other elements with raw content,
+        such as ``style``, ``noscript``, ``title`` or ``textarea``.
+
+        Parameters
+        ----------
+        patterns : tuple of str
+            Strings to look for.
+        tags : str or iterable of str, default ("script", "style")
+            Names of the elements to search in.
+
+        Returns
+        -------
+        bool
+            ``True`` when an element contains at least one of the patterns.
+        """
+        ...
+
     def script_srcs_contain(self, queries: tuple[str]) -> bool:
         """Return ``True`` if any script ``src`` contains one of the strings.
 
-        Caches values on the first call to improve performance.
+        Values are cached until the document is modified.
 
         Parameters
         ----------
@@ -1269,7 +1994,7 @@ class LexborHTMLParser:
         """
         ...
 
-    def css_matches(self, selector: str) -> bool:
+    def css_matches(self, selector: str | LexborCompiledSelector) -> bool:
         """Return ``True`` if the document matches the selector at least once.
 
         Parameters
@@ -1284,6 +2009,26 @@ class LexborHTMLParser:
         """
         ...
 
+    def subtree_hashes(self, min_size: int = 0) -> list[tuple[LexborNode, int, int]]:
+        """Return content hashes of all elements in the document.
+
+        All hashes are computed in one bottom-up pass over the tree, every element
+        hash is derived from the hashes of its children. Repeated blocks, such as
+        navigation bars and footers, get equal hashes within and across documents.
+
+        Parameters
+        ----------
+        min_size : int, optional
+            Skip elements with fewer than ``min_size`` characters of text. Defaults to ``0``.
+
+        Returns
+        -------
+        list of tuple[LexborNode, int, int]
+            ``(node, hash, text_len)`` tuples in document order. ``hash`` equals
+            ``node.content_hash()`` and ``text_len`` equals ``len(node.text())``.
+        """
+        ...
+
     def merge_text_nodes(self) -> None:
         """Iterates over all text nodes and merges all text nodes that are close to each other.
 
@@ -1308,6 +2053,202 @@ class LexborHTMLParser:
         """
         ...
 
+    @staticmethod
+    def incremental(stop_after: str | None = None) -> LexborHTMLParser:
+        """Create an empty parser that accepts HTML in chunks.
+
+        Feed the input with :meth:`feed` as it arrives and call :meth:`close`
+        once the input is exhausted. Only full documents can be parsed this way.
+
+        Parameters
+        ----------
+        stop_after : str, optional
+            Tag name of an element, such as ``"head"``. Once the first such element
+            is closed, the tree is no longer built and further input is ignored.
+            See :attr:`stopped`.
+
+        Examples
+        --------
+
+        >>> parser = LexborHTMLParser.incremental()
+        >>> parser.feed(b"<div><p>Hel")
+        >>> parser.feed(b"lo</p></div>")
+        >>> parser.close()
+        >>> parser.css_first("p").text()
+        'Hello'
+
+        The partially built tree can be queried between chunks, but it is
+        read-only until :meth:`close` is called: methods that change the tree,
+        such as ``decompose`` or setting ``inner_html``, raise ``SelectolaxError``.
+
+        Returns
+        -------
+        LexborHTMLParser
+            Parser in streaming mode. Its ``raw_html`` is ``None``, because
+            the chunks are not retained.
+
+        Raises
+        ------
+        SelectolaxError
+            If the document cannot be created or the parser cannot be started.
+        ValueError
+            If ``stop_after`` is not a known tag name.
+        """
+        ...
+
+    @staticmethod
+    def from_iter(
+        chunks: Iterable[str | Buffer], stop_after: str | None = None
+    ) -> LexborHTMLParser:
+        """Parse a document from an iterable of chunks.
+
+        Useful for network responses and large files, where the input does not
+        have to be joined into one string first.
+
+        Parameters
+        ----------
+        chunks : iterable of str, bytes or buffers
+            HTML chunks in document order. Chunk boundaries may fall anywhere,
+            including inside of tags.
+        stop_after : str, optional
+            Tag name of an element, such as ``"head"``. Once the first such element
+            is closed, the remaining chunks are not consumed.
+
+        Examples
+        --------
+
+        >>> parser = LexborHTMLParser.from_iter(response.iter_content(8192))
+        >>> head_only = LexborHTMLParser.from_iter(response.iter_content(8192), stop_after="head")
+
+        Returns
+        -------
+        LexborHTMLParser
+            Parser with the parsed document.
+        """
+        ...
+
+    @staticmethod
+    def from_file(
+        path: str | os.PathLike[str],
+        is_fragment: bool = False,
+        fragment_tag: str = "div",
+        fragment_namespace: str = "html",
+        stop_after: str | None = None,
+        detect_encoding: bool = False,
+        use_meta_tags: bool = True,
+        cache_nodes: bool = False,
+        use_index: bool = False,
+    ) -> LexborHTMLParser:
+        """Parse an HTML file without reading it into memory first.
+
+        The file is memory-mapped and the mapping is passed to Lexbor directly,
+        so no intermediate ``bytes`` object is created.
+
+        Parameters
+        ----------
+        path : str or os.PathLike
+            Path to the HTML file.
+        is_fragment, fragment_tag, fragment_namespace, stop_after, detect_encoding, use_meta_tags, cache_nodes, use_index
+            Same as in :class:`LexborHTMLParser`.
+
+        Examples
+        --------
+
+        >>> parser = LexborHTMLParser.from_file("page.html", detect_encoding=True)
+
+        Returns
+        -------
+        LexborHTMLParser
+            Parser with the parsed file. Its ``raw_html`` is ``None``.
+        """
+        ...
+
+    @staticmethod
+    def from_fd(
+        fd: int,
+        is_fragment: bool = False,
+        fragment_tag: str = "div",
+        fragment_namespace: str = "html",
+        stop_after: str | None = None,
+        detect_encoding: bool = False,
+        use_meta_tags: bool = True,
+        cache_nodes: bool = False,
+        use_index: bool = False,
+    ) -> LexborHTMLParser:
+        """Parse HTML from an open file descriptor.
+
+        Regular files are memory-mapped and unmapped again once parsing is done.
+        Descriptors that can't be mapped, such as pipes, are read to the end instead.
+        In both cases the input starts at the current offset of the descriptor,
+        as with ``os.read``. The descriptor is not closed.
+
+        Parameters
+        ----------
+        fd : int
+            File descriptor opened for reading.
+        is_fragment, fragment_tag, fragment_namespace, stop_after, detect_encoding, use_meta_tags, cache_nodes, use_index
+            Same as in :class:`LexborHTMLParser`.
+
+        Returns
+        -------
+        LexborHTMLParser
+            Parser with the parsed file.
+        """
+        ...
+
+    @property
+    def stopped(self) -> bool:
+        """Whether parsing was stopped early by ``stop_after``.
+
+        Returns
+        -------
+        bool
+            ``True`` when the ``stop_after`` element was closed and the rest of
+            the input was skipped.
+        """
+        ...
+
+    def feed(self, chunk: str | Buffer) -> None:
+        """Parse the next chunk of HTML.
+
+        When the parser was created with ``stop_after`` and has already
+        stopped, the chunk is ignored.
+
+        Parameters
+        ----------
+        chunk : str, bytes or buffer
+            Next part of the document. Objects that support the buffer protocol,
+            such as ``bytearray`` or ``memoryview``, are parsed without copying.
+
+        Returns
+        -------
+        None
+
+        Raises
+        ------
+        SelectolaxError
+            If the parser was not created by :meth:`incremental`, was already
+            closed, or Lexbor fails to parse the chunk.
+        """
+        ...
+
+    def close(self) -> None:
+        """Finish chunked parsing.
+
+        Flushes any buffered input and completes the tree. Calling ``close``
+        on a parser that is not streaming does nothing.
+
+        Returns
+        -------
+        None
+
+        Raises
+        ------
+        SelectolaxError
+            If Lexbor fails to finish the document.
+        """
+        ...
+
     def clone(self) -> LexborHTMLParser:
         """Clone the current document tree.
 
@@ -1379,6 +2320,18 @@ class LexborHTMLParser:
         """
         ...
 
+    @property
+    def inner_html_bytes(self) -> bytes:
+        """Return UTF-8 encoded HTML representation of the child nodes.
+
+        Same as ``inner_html``, but skips decoding the serialized output.
+
+        Returns
+        -------
+        html : bytes | None
+        """
+        ...
+
     def inner_html_pretty(
         self,
         indent: int = 0,
@@ -1464,6 +2417,112 @@ def parse_fragment(html: str) -> list[LexborNode]:
     """
     ...
 
+def parse_many(
+    documents: Iterable[str | Buffer], threads: int | None = None, **kwargs: Any
+) -> list[LexborHTMLParser]:
+    """
+    Parse many HTML documents on a thread pool and return a list of ``LexborHTMLParser``.
+
+    Lexbor parses without holding the GIL, so the documents are parsed on
+    ``threads`` threads in parallel. The order of ``documents`` is preserved.
+
+    Args:
+        documents: Iterable of ``str``, ``bytes`` or buffer objects.
+        threads: Number of worker threads. Defaults to ``os.cpu_count()``.
+        **kwargs: Passed to ``LexborHTMLParser``, e.g. ``detect_encoding=True``.
+
+    Returns:
+        A list of parsers, one per document.
+
+    Raises:
+        ValueError: If ``threads`` is less than 1.
+
+    Examples:
+        >>> trees = parse_many(pages, threads=8, stop_after="head")
+        >>> titles = [tree.css_first("title", default=None) for tree in trees]
+    """
+    ...
+
+def extract_many(
+    documents: Iterable[str | Buffer],
+    spec: dict[str, tuple[str | LexborCompiledSelector, str]],
+    threads: int | None = None,
+) -> list[dict[str, list[str]]]:
+    """
+    Parse many HTML documents and extract text and attribute values with CSS selectors.
+
+    Each document is parsed, matched and extracted without holding the GIL and
+    without creating a ``LexborNode`` per match; only the resulting strings are
+    Python objects. Like ``parse_many``, documents are processed on ``threads``
+    threads in parallel.
+
+    Args:
+        documents: Iterable of ``str``, ``bytes`` or buffer objects.
+        spec: Mapping of field names to ``(selector, source)`` pairs.
+            ``selector`` is a CSS selector string or a ``LexborCompiledSelector``.
+            ``source`` is ``"text"`` for the text content of the matched nodes,
+            or an attribute name. Nodes without the attribute are skipped,
+            attributes without a value produce empty strings.
+        threads: Number of worker threads. Defaults to ``os.cpu_count()``.
+
+    Returns:
+        A list with a dict per document, mapping the field names to lists of
+        strings in document order.
+
+    Raises:
+        ValueError: If ``threads`` is less than 1.
+
+    Examples:
+        >>> extract_many(pages, {"title": ("title", "text"), "links": ("a", "href")})
+        [{'title': ['Home'], 'links': ['/', '/about']}, ...]
+    """
+    ...
+
+def compile_selector(query: str) -> LexborCompiledSelector:
+    """
+    Parse a CSS selector once and return a reusable ``LexborCompiledSelector``.
+
+    The result can be passed to ``css``, ``css_first`` and ``css_matches``
+    of any ``LexborHTMLParser`` or ``LexborNode`` instead of a query string,
+    which skips selector parsing on every call.
+    """
+    ...
+
+def set_selector_cache_size(maxsize: int | None) -> None:
+    """Resize the process-wide cache of parsed CSS selectors.
+
+    Query strings passed to ``css``, ``css_first`` and ``css_matches`` are parsed
+    once and kept in an LRU cache shared by all parsers.
+    Resizing drops all cached selectors and resets the counters.
+
+    Parameters
+    ----------
+    maxsize : int or None
+        Maximum number of cached selectors. ``0`` disables caching,
+        ``None`` makes the cache unbounded.
+    """
+    ...
+
+class _SelectorCacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int | None
+    currsize: int
+
+def selector_cache_info() -> _SelectorCacheInfo:
+    """Return hit/miss statistics of the selector cache.
+
+    Returns
+    -------
+    CacheInfo
+        Named tuple with ``hits``, ``misses``, ``maxsize`` and ``currsize`` fields.
+    """
+    ...
+
+def clear_selector_cache() -> None:
+    """Drop all cached selectors and reset the counters."""
+    ...
+
 class SelectolaxError(Exception):
     """An exception that indicates error."""
 
@@ -6,16 +6,28 @@ from cpython.mem cimport (
     PyMem_RawMalloc,
     PyMem_RawRealloc
 )
+import mmap
+import os
+import weakref
+
 _ENCODING = 'UTF-8'
 
 include "base.pxi"
 include "utils.pxi"
+include "input.pxi"
+include "lexbor/buffer.pxi"
+include "lexbor/structure.pxi"
 include "lexbor/attrs.pxi"
 include "lexbor/node.pxi"
 include "lexbor/selection.pxi"
 include "lexbor/util.pxi"
 include "lexbor/node_remove.pxi"
 include "lexbor/fragment_lookup.pxi"
+include "lexbor/stop_after.pxi"
+include "lexbor/encoding.pxi"
+include "lexbor/extract.pxi"
+include "lexbor/index.pxi"
+include "lexbor/raw_text.pxi"
 
 # We don't inherit from HTMLParser here, because it also includes all the C code from Modest.
 
@@ -29,21 +41,28 @@ cdef class LexborHTMLParser:
     Parameters
     ----------
 
-    html : str (unicode) or bytes
+    html : str (unicode), bytes or buffer
     """
     def __init__(
         self,
-        html: str | bytes,
+        html: str | bytes | bytearray | memoryview,
         is_fragment: bool = False,
         fragment_tag: str = "div",
         fragment_namespace: str = "html",
+        stop_after: str | None = None,
+        detect_encoding: bool = False,
+        use_meta_tags: bool = True,
+        cache_nodes: bool = False,
+        use_index: bool = False,
     ):
         """Create a parser and load HTML.
 
         Parameters
         ----------
-        html : str or bytes
-            HTML content to parse.
+        html : str, bytes or buffer
+            HTML content to parse. Objects that support the buffer protocol,
+            such as ``bytearray``, ``memoryview`` or ``mmap``, are parsed in place
+            without copying; ``raw_html`` is ``None`` for them.
         is_fragment : bool, optional
             When ``False`` (default), the input is parsed as a full HTML document.
             If the input is only a fragment, the parser still accepts it and inserts any missing required elements,
@@ -63,24 +82,112 @@ cdef class LexborHTMLParser:
             Context element namespace used for fragment parsing. Defaults to ``"html"``.
             Accepts Lexbor namespace names such as ``"html"``, ``"svg"``, and ``"math"``,
             or a namespace URI recognized by Lexbor. Only used when ``is_fragment`` is ``True``.
+        stop_after : str, optional
+            Tag name of an element, such as ``"head"``. Parsing stops once the first
+            such element is closed, so the rest of the input is not built into the tree.
+            Useful when only the document metadata is needed.
+            Cannot be combined with ``is_fragment``.
+        detect_encoding : bool, optional
+            If ``True`` and ``html`` is ``bytes``, the encoding is detected from the BOM
+            and, optionally, from ``<meta>`` tags. Non UTF-8 input is converted to UTF-8
+            by Lexbor, so the bytes don't have to be decoded in Python first.
+            When nothing is found, the input is treated as UTF-8. Defaults to ``False``.
+        use_meta_tags : bool, optional
+            Whether to use ``<meta charset>`` and ``<meta http-equiv>`` tags
+            in the encoding detection process. Defaults to ``True``.
+        cache_nodes : bool, optional
+            If ``True``, every node is represented by a single ``LexborNode`` instance
+            for as long as it is referenced, so navigating back and forth returns
+            the same objects and ``is`` checks work. See ``cache_nodes``.
+            Defaults to ``False``.
+        use_index : bool, optional
+            If ``True``, ``tags`` and simple selectors such as ``"a"``, ``"#id"`` and ``".cls"``
+            are answered from an index of the document. See ``use_index``.
+            Defaults to ``False``.
 
         """
         cdef size_t html_len
         cdef object bytes_html
+        cdef const lxb_char_t *html_chars
+        cdef lxb_char_t *transcoded = NULL
+        cdef size_t transcoded_len = 0
+        cdef lxb_status_t transcode_status = LXB_STATUS_OK
 
         self._is_fragment = is_fragment
+        self._is_streaming = False
+        self.detect_encoding = detect_encoding
+        self.use_meta_tags = use_meta_tags
+        self._encoding = lxb_encoding_data(LXB_ENCODING_UTF_8)
         self._fragment_wrapper = NULL
-        self._fragment_root = NULL
         self._fragment_tag_id = LXB_TAG_DIV
         self._fragment_namespace_id = LXB_NS_HTML
         self._selector = None
+        self.cache_nodes = cache_nodes
+        self.use_index = use_index
         self._new_html_document()
         if self._is_fragment:
             self._fragment_tag_id = _fragment_tag_id_from_string(self.document, fragment_tag)
             self._fragment_namespace_id = _fragment_namespace_id_from_string(self.document, fragment_namespace)
         bytes_html, html_len = preprocess_input(html)
-        self._parse_html(bytes_html, html_len)
-        self.raw_html = bytes_html
+        try:
+            html_chars = <const lxb_char_t *> input_data(bytes_html)
+            if not detect_encoding or isinstance(html, str):
+                self._parse_input(<char *> html_chars, html_len, stop_after)
+            else:
+                with nogil:
+                    self._encoding = _lexbor_detect_encoding(html_chars, html_len, self.use_meta_tags)
+                    if self._encoding.encoding == LXB_ENCODING_UTF_8:
+                        lxb_encoding_utf_8_skip_bom(&html_chars, &html_len)
+                    else:
+                        if self._encoding.encoding == LXB_ENCODING_UTF_16LE:
+                            lxb_encoding_utf_16le_skip_bom(&html_chars, &html_len)
+                        elif self._encoding.encoding == LXB_ENCODING_UTF_16BE:
+                            lxb_encoding_utf_16be_skip_bom(&html_chars, &html_len)
+                        transcoded = _lexbor_transcode_to_utf8(
+                            self._encoding, html_chars, html_len, &transcoded_len, &transcode_status
+                        )
+
+                if self._encoding.encoding == LXB_ENCODING_UTF_8:
+                    self._parse_input(<char *> html_chars, html_len, stop_after)
+                elif transcoded == NULL:
+                    if transcode_status == LXB_STATUS_ERROR_MEMORY_ALLOCATION:
+                        raise MemoryError("Can't convert HTML to UTF-8.")
+                    raise SelectolaxError("Can't convert HTML to UTF-8.")
+                else:
+                    try:
+                        self._parse_input(<char *> transcoded, transcoded_len, stop_after)
+                    finally:
+                        PyMem_RawFree(transcoded)
+        finally:
+            # Lexbor copies everything it needs, so buffers are not kept after parsing.
+            release_input(bytes_html)
+        self.raw_html = bytes_html if isinstance(bytes_html, bytes) else None
+
+    cdef int _parse_input(self, char *html, size_t html_len, str stop_after) except -1:
+        """Parse UTF-8 input, either at once or until ``stop_after`` is closed.
+
+        Parameters
+        ----------
+        html : char *
+            Pointer to UTF-8 encoded HTML bytes.
+        html_len : size_t
+            Length of the HTML buffer.
+        stop_after : str or None
+            Tag name of the element after which tree building stops.
+
+        Returns
+        -------
+        int
+            ``0`` on success; ``-1`` when parsing fails.
+        """
+        if stop_after is None:
+            return self._parse_html(html, html_len)
+        if self._is_fragment:
+            raise ValueError("stop_after can't be used with is_fragment")
+        self._parse_chunk_begin(stop_after)
+        self._parse_chunk(html, html_len)
+        self.close()
+        return 0
 
     cdef inline void _new_html_document(self):
         """Initialize a fresh Lexbor HTML document.
@@ -208,7 +315,6 @@ cdef class LexborHTMLParser:
             return status
 
         self._fragment_wrapper = fragment_html_node
-        self._fragment_root = fragment_html_node.first_child
         lxb_html_parser_destroy(parser)
         return LXB_STATUS_OK
 
@@ -238,6 +344,68 @@ cdef class LexborHTMLParser:
         html_len = len(self.root.html if self.root is not None else "")
         return f"<LexborHTMLParser chars='{html_len}'>"
 
+    @property
+    def cache_nodes(self):
+        """Whether node wrappers are cached.
+
+        When enabled, the parser keeps a weak mapping from nodes to their ``LexborNode``
+        wrappers. Properties such as ``parent`` and ``next`` and results of ``css``
+        return the existing wrapper of a node while it is alive, instead of a new one.
+        Disabling the cache drops the mapping.
+
+        Returns
+        -------
+        bool
+        """
+        return self._node_cache is not None
+
+    @cache_nodes.setter
+    def cache_nodes(self, bint value):
+        if not value:
+            self._node_cache = None
+        elif self._node_cache is None:
+            self._node_cache = weakref.WeakValueDictionary()
+
+    @property
+    def use_index(self):
+        """Whether ``tags``, ``css`` and ``css_first`` use an index of the document.
+
+        The index maps tag names, ids and classes to elements. It is built on the first
+        lookup and rebuilt lazily after the tree or ``id`` and ``class`` attributes change.
+        Only single tag names, ``"*"``, ``"#id"`` and ``".class"`` selectors of the parser
+        are answered from it; other queries, fragments and node methods work as usual.
+
+        Useful when a large document is queried many times.
+
+        Returns
+        -------
+        bool
+        """
+        return self._index is not None
+
+    @use_index.setter
+    def use_index(self, bint value):
+        if not value:
+            self._index = None
+            if self.document != NULL:
+                _remove_mutation_hooks(self)
+        elif self._index is None:
+            self._index = _NodeIndex()
+
+    @property
+    def input_encoding(self):
+        """Return encoding of the HTML document.
+
+        The encoding is only detected when the parser is created with
+        ``detect_encoding=True`` from ``bytes``; otherwise the input is UTF-8.
+
+        Returns
+        -------
+        str
+            Encoding name, e.g. ``"UTF-8"`` or ``"windows-1251"``.
+        """
+        return (<char *> self._encoding.name).decode("ascii")
+
     @property
     def selector(self):
         """Return a lazily created CSS selector helper.
@@ -264,15 +432,19 @@ cdef class LexborHTMLParser:
             return None
         cdef LexborNode  node
         cdef lxb_dom_node_t* dom_root
-        if self._is_fragment and self._fragment_root != NULL:
-            dom_root = self._fragment_root
+        if self._is_fragment and self._fragment_wrapper != NULL:
+            # Read it on every access: mutations may have replaced the first node.
+            dom_root = self._fragment_wrapper.first_child
         else:
             dom_root = lxb_dom_document_root(&self.document.dom_document)
         if dom_root == NULL:
             return None
-        node =  LexborNode.new(dom_root, self)
         if self._is_fragment:
+            # The fragment root stands for a run of siblings, so it never comes from the cache.
+            node = LexborNode._wrap(dom_root, self)
             node.set_as_fragment_root()
+        else:
+            node = LexborNode.new(dom_root, self)
         return node
 
     @property
@@ -333,6 +505,14 @@ cdef class LexborHTMLParser:
 
         cdef lxb_dom_collection_t* collection = NULL
         cdef lxb_status_t status
+        cdef _NodeIndex index = _parser_index(self)
+        cdef list indexed
+
+        if index is not None:
+            indexed = index.lookup_tag(self, name)
+            if indexed is not None:
+                return indexed
+
         pybyte_name = name.encode('UTF-8')
 
         result = list()
@@ -359,6 +539,49 @@ cdef class LexborHTMLParser:
         lxb_dom_collection_destroy(collection, <bint> True)
         return result
 
+    def get_element_by_id(self, str element_id, default=None):
+        """Return the first element whose ``id`` attribute is exactly ``element_id``.
+
+        Works like ``document.getElementById`` in browsers: the whole document is searched
+        and the comparison is case-sensitive, unlike the ``#id`` selector in Lexbor.
+        With ``use_index`` enabled the lookup takes constant time until the document
+        is modified; otherwise the tree is walked.
+
+        Parameters
+        ----------
+        element_id : str
+            Value of the ``id`` attribute.
+        default : Any, default None
+            Value to return if there is no such element.
+
+        Returns
+        -------
+        LexborNode or default
+
+        Examples
+        --------
+
+        >>> tree = LexborHTMLParser('<div id="price">$10</div>')
+        >>> tree.get_element_by_id("price").text()
+        '$10'
+        """
+        cdef bytes value = element_id.encode("UTF-8")
+        cdef _NodeIndex index
+        cdef lxb_dom_node_t *node
+
+        if self.document == NULL or not value:
+            return default
+        index = _parser_index(self)
+        if index is not None:
+            node = index.lookup_id(value)
+        elif self._is_fragment and self._fragment_wrapper != NULL:
+            node = _element_by_id(self._fragment_wrapper, <const char *> value, len(value))
+        else:
+            node = _element_by_id(<lxb_dom_node_t *> self.document, <const char *> value, len(value))
+        if node == NULL:
+            return default
+        return LexborNode.new(node, self)
+
     def text(
         self,
         deep: bool = True,
@@ -390,6 +613,25 @@ cdef class LexborHTMLParser:
             return ""
         return self.root.text(deep=deep, separator=separator, strip=strip, skip_empty=skip_empty)
 
+    def text_bytes(
+        self,
+        deep: bool = True,
+        separator: str = "",
+        strip: bool = False,
+        skip_empty: bool = False,
+    ) -> bytes:
+        """Returns the text of the node including text of all its child nodes as UTF-8 encoded bytes.
+
+        Same as ``text``, but skips decoding the result.
+
+        Returns
+        -------
+        text : bytes
+        """
+        if self.root is None:
+            return b""
+        return self.root.text_bytes(deep=deep, separator=separator, strip=strip, skip_empty=skip_empty)
+
     @property
     def html(self):
         """Return HTML representation of the page.
@@ -408,6 +650,54 @@ cdef class LexborHTMLParser:
         node = LexborNode.new(<lxb_dom_node_t *> &self.document.dom_document, self)
         return node.html
 
+    def write_html(self, object fileobj):
+        """Write HTML representation of the page to a file object.
+
+        Unlike ``html``, the output is passed to ``fileobj.write`` in chunks while
+        the document is serialized, so the whole string is never kept in memory.
+
+        Parameters
+        ----------
+        fileobj : object
+            Object with a ``write`` method, such as a file opened in binary mode.
+            Text streams (``io.TextIOBase``) receive ``str`` chunks, other objects
+            receive UTF-8 encoded ``bytes``.
+
+        Examples
+        --------
+
+        >>> with open("page.html", "wb") as f:
+        ...     tree.write_html(f)
+        """
+        if self.document == NULL:
+            return
+        if self._is_fragment:
+            if self.root is not None:
+                self.root.write_html(fileobj)
+            return
+        node = LexborNode.new(<lxb_dom_node_t *> &self.document.dom_document, self)
+        node.write_html(fileobj)
+
+    @property
+    def html_bytes(self):
+        """Return UTF-8 encoded HTML representation of the page.
+
+        Same as ``html``, but skips decoding the serialized output.
+
+        Returns
+        -------
+        bytes or None
+            Serialized HTML of the current document.
+        """
+        if self.document == NULL:
+            return None
+        if self._is_fragment:
+            if self.root is None:
+                return b""
+            return self.root.html_bytes
+        node = LexborNode.new(<lxb_dom_node_t *> &self.document.dom_document, self)
+        return node.html_bytes
+
     def html_pretty(
         self,
         Py_ssize_t indent=0,
@@ -473,9 +763,9 @@ cdef class LexborHTMLParser:
                 html5test=html5test,
             )
         node = LexborNode.new(<lxb_dom_node_t *> &self.document.dom_document, self)
-        return node._serialize_html(options, <size_t> indent, True)
+        return node._serialize_html(options, <size_t> indent, True, False)
 
-    def css(self, str query):
+    def css(self, object query):
         """A CSS selector.
 
         Matches pattern `query` against HTML tree.
@@ -488,22 +778,152 @@ cdef class LexborHTMLParser:
 
         Parameters
         ----------
-        query : str
+        query : str or LexborCompiledSelector
             CSS selector (e.g. "div > :nth-child(2n+1):not(:has(a))").
+            A selector created by ``compile_selector`` skips parsing.
 
         Returns
         -------
         selector : list of `Node` objects
         """
+        cdef _NodeIndex index = _parser_index(self)
+        cdef list addresses
+
+        if index is not None:
+            addresses = index.lookup_selector(self, query)
+            if addresses is not None:
+                return _index_nodes(self, addresses)
         return self.root.css(query)
 
-    def css_first(self, str query, default=None, strict=False):
+    def css_many(self, dict queries):
+        """Evaluate several CSS selectors in a single pass over the document.
+
+        Equivalent to calling ``css`` for every selector, but the tree is walked only once.
+
+        Parameters
+        ----------
+        queries : dict
+            Mapping of names to CSS selectors (``str`` or ``LexborCompiledSelector``).
+
+        Returns
+        -------
+        matches : dict
+            Mapping of the same names to lists of matching `LexborNode` objects in document order.
+
+        Examples
+        --------
+
+        >>> tree = LexborHTMLParser("<title>Hi</title><a href='/'>Home</a>")
+        >>> tree.css_many({"title": "title", "links": "a[href]"})
+        {'title': [<LexborNode title>], 'links': [<LexborNode a>]}
+        """
+        return self.root.css_many(queries)
+
+    def extract_columns(self, object query, attrs=(), bint text=False):
+        """Extract attribute values and text of matching nodes into Arrow-compatible buffers.
+
+        Values of all nodes matching ``query`` are written into one contiguous UTF-8
+        buffer per column, without creating a ``LexborNode`` per match or a ``str`` per value.
+        Each column has the layout of an Arrow ``string`` array and can be loaded with
+        ``pyarrow.Array.from_buffers(pyarrow.string(), len(offsets) // 4 - 1,
+        [validity and pyarrow.py_buffer(validity), pyarrow.py_buffer(offsets), pyarrow.py_buffer(data)])``.
+
+        Parameters
+        ----------
+        query : str or LexborCompiledSelector
+            CSS selector of the rows.
+        attrs : sequence of str, optional
+            Attribute names to extract, one column each.
+        text : bool, optional
+            Add a ``"text"`` column with the text content of the matched nodes. Defaults to ``False``.
+
+        Returns
+        -------
+        dict
+            Mapping of column names to ``(data, offsets, validity)`` tuples of ``bytes``.
+            ``offsets`` holds native-endian int32 values, one more than the number of rows,
+            and row ``i`` is ``data[offsets[i]:offsets[i + 1]]``. ``validity`` is a bitmap with
+            one bit per row, least significant bit first, and marks rows where the attribute
+            is missing with 0. It is ``None`` when no value is missing.
+
+        Raises
+        ------
+        OverflowError
+            If a column is larger than 2 GiB.
+
+        Examples
+        --------
+
+        >>> tree = LexborHTMLParser("<a href='/'>Home</a><a>Empty</a>")
+        >>> columns = tree.extract_columns("a", attrs=["href"], text=True)
+        >>> data, offsets, validity = columns["href"]
+        >>> data, array.array("i", offsets), validity
+        (b'/', array('i', [0, 1, 1]), b'\\x01')
+        """
+        return self.root.extract_columns(query, attrs, text)
+
+    def css_attr(self, object query, str name):
+        """Return the value of an attribute for every node matching ``query``.
+
+        Equivalent to ``[node.attrs.get(name) for node in self.css(query)]``, but values
+        are read during the selector walk, without creating a ``LexborNode`` per match.
+
+        Parameters
+        ----------
+        query : str or LexborCompiledSelector
+            CSS selector.
+        name : str
+            Attribute name.
+
+        Returns
+        -------
+        list of str or None
+            Values in document order. Like ``attrs.get``, missing attributes
+            and attributes without a value give ``None``.
+
+        Examples
+        --------
+
+        >>> tree = LexborHTMLParser("<a href='/'>Home</a><a href='/about'>About</a>")
+        >>> tree.css_attr("a[href]", "href")
+        ['/', '/about']
+        """
+        return self.root.css_attr(query, name)
+
+    def css_attrs(self, object query, names):
+        """Return the values of several attributes for every node matching ``query``.
+
+        Like ``css_attr``, but reads all ``names`` during the same selector walk.
+
+        Parameters
+        ----------
+        query : str or LexborCompiledSelector
+            CSS selector.
+        names : sequence of str
+            Attribute names.
+
+        Returns
+        -------
+        list of tuple
+            A tuple of values per match, in document order, with one item per name.
+            Missing attributes and attributes without a value give ``None``.
+
+        Examples
+        --------
+
+        >>> tree = LexborHTMLParser("<a href='/' rel='home'>Home</a><a href='/about'>About</a>")
+        >>> tree.css_attrs("a", ["href", "rel"])
+        [('/', 'home'), ('/about', None)]
+        """
+        return self.root.css_attrs(query, names)
+
+    def css_first(self, object query, default=None, strict=False):
         """Same as `css` but returns only the first match.
 
         Parameters
         ----------
 
-        query : str
+        query : str or LexborCompiledSelector
         default : Any, default None
             Default value to return if there is no match.
         strict: bool, default False
@@ -514,6 +934,17 @@ cdef class LexborHTMLParser:
         -------
         selector : `LexborNode` object
         """
+        cdef _NodeIndex index = _parser_index(self)
+        cdef list addresses
+
+        if index is not None:
+            addresses = index.lookup_selector(self, query)
+            if addresses is not None:
+                if not addresses:
+                    return default
+                if strict and len(addresses) > 1:
+                    raise ValueError("Expected 1 match, but found %s matches" % len(addresses))
+                return LexborNode.new(<lxb_dom_node_t *> <size_t> addresses[0], self)
         return self.root.css_first(query, default, strict)
 
     def strip_tags(self, list tags, bool recursive = False):
@@ -539,33 +970,16 @@ cdef class LexborHTMLParser:
         -------
         None
         """
-        cdef lxb_dom_collection_t* collection = NULL
-        cdef lxb_status_t status
-
-        for tag in tags:
-            pybyte_name = tag.encode('UTF-8')
-
-            collection = lxb_dom_collection_make(&self.document.dom_document, 128)
+        cdef lxb_dom_node_t *root
 
-            if collection == NULL:
-                raise SelectolaxError("Can't initialize DOM collection.")
-
-            status = lxb_dom_elements_by_tag_name(
-                <lxb_dom_element_t *> self.document,
-                collection,
-                <lxb_char_t *> pybyte_name,
-                len(pybyte_name)
-            )
-            if status != 0x0000:
-                lxb_dom_collection_destroy(collection, <bint> True)
-                raise SelectolaxError("Can't locate elements.")
-
-            for i in range(lxb_dom_collection_length_noi(collection)):
-                if recursive:
-                    node_remove_deep(<lxb_dom_node_t *> lxb_dom_collection_element_noi(collection, i))
-                else:
-                    lxb_dom_node_remove(<lxb_dom_node_t *> lxb_dom_collection_element_noi(collection, i))
-            lxb_dom_collection_destroy(collection, <bint> True)
+        if self.document == NULL:
+            return
+        self._check_mutable()
+        if self._is_fragment and self._fragment_wrapper != NULL:
+            root = self._fragment_wrapper
+        else:
+            root = <lxb_dom_node_t *> self.document
+        _strip_tags(root, False, tags, recursive)
 
     def select(self, query=None):
         """Select nodes given a CSS selector.
@@ -593,7 +1007,7 @@ cdef class LexborHTMLParser:
 
         Parameters
         ----------
-        selectors : tuple[str]
+        selectors : tuple[str | LexborCompiledSelector]
             CSS selectors to evaluate.
 
         Returns
@@ -606,7 +1020,7 @@ cdef class LexborHTMLParser:
     def scripts_contain(self, str query):
         """Return ``True`` if any script tag contains the given text.
 
-        Caches script tags on the first call to improve performance.
+        Script contents are cached until the document is modified.
 
         Parameters
         ----------
@@ -620,10 +1034,57 @@ cdef class LexborHTMLParser:
         """
         return self.root.scripts_contain(query)
 
+    def scripts_contain_any(self, tuple patterns):
+        """Return ``True`` if any script tag contains one of the patterns.
+
+        All patterns are searched in a single pass over every script with
+        an Aho-Corasick automaton, so checking thousands of signatures costs about
+        as much as checking one. Compiled pattern sets and script contents are cached,
+        the latter until the document is modified.
+
+        Parameters
+        ----------
+        patterns : tuple of str
+            Strings to look for, such as signatures of tracking scripts.
+
+        Returns
+        -------
+        bool
+            ``True`` when a script contains at least one of the patterns.
+
+        Examples
+        --------
+
+        >>> tree = LexborHTMLParser("<script>gtag('config', 'G-1');</script>")
+        >>> tree.scripts_contain_any(("fbq(", "gtag("))
+        True
+        """
+        return self.root.scripts_contain_any(patterns)
+
+    def raw_text_contains_any(self, tuple patterns, tags=("script", "style")):
+        """Return ``True`` if the text of any of the ``tags`` elements contains one of the patterns.
+
+        Works like ``scripts_contain_any`` for other elements with raw content,
+        such as ``style``, ``noscript``, ``title`` or ``textarea``.
+
+        Parameters
+        ----------
+        patterns : tuple of str
+            Strings to look for.
+        tags : str or iterable of str, default ("script", "style")
+            Names of the elements to search in.
+
+        Returns
+        -------
+        bool
+            ``True`` when an element contains at least one of the patterns.
+        """
+        return self.root.raw_text_contains_any(patterns, tags)
+
     def script_srcs_contain(self, tuple queries):
         """Return ``True`` if any script ``src`` contains one of the strings.
 
-        Caches values on the first call to improve performance.
+        Values are cached until the document is modified.
 
         Parameters
         ----------
@@ -637,12 +1098,12 @@ cdef class LexborHTMLParser:
         """
         return self.root.script_srcs_contain(queries)
 
-    def css_matches(self, str selector):
+    def css_matches(self, object selector):
         """Return ``True`` if the document matches the selector at least once.
 
         Parameters
         ----------
-        selector : str
+        selector : str or LexborCompiledSelector
             CSS selector to test.
 
         Returns
@@ -652,6 +1113,29 @@ cdef class LexborHTMLParser:
         """
         return self.root.css_matches(selector)
 
+    def subtree_hashes(self, Py_ssize_t min_size = 0):
+        """Return content hashes of all elements in the document.
+
+        All hashes are computed in one bottom-up pass over the tree, every element
+        hash is derived from the hashes of its children. Repeated blocks, such as
+        navigation bars and footers, get equal hashes within and across documents.
+
+        Parameters
+        ----------
+        min_size : int, optional
+            Skip elements with fewer than ``min_size`` characters of text. Defaults to ``0``.
+
+        Returns
+        -------
+        list of tuple[LexborNode, int, int]
+            ``(node, hash, text_len)`` tuples in document order. ``hash`` equals
+            ``node.content_hash()`` and ``text_len`` equals ``len(node.text())``.
+        """
+        node = self.root
+        if node is None:
+            return []
+        return node.subtree_hashes(min_size)
+
     def merge_text_nodes(self):
         """Iterates over all text nodes and merges all text nodes that are close to each other.
 
@@ -695,16 +1179,378 @@ cdef class LexborHTMLParser:
         obj = <LexborHTMLParser> LexborHTMLParser.__new__(LexborHTMLParser)
         obj.document = document
         obj.raw_html = raw_html
-        obj.cached_script_texts = None
-        obj.cached_script_srcs = None
+        obj._raw_text_cache = None
         obj._is_fragment = False
+        obj._is_streaming = False
+        obj.detect_encoding = False
+        obj.use_meta_tags = True
+        obj._encoding = lxb_encoding_data(LXB_ENCODING_UTF_8)
         obj._fragment_wrapper = NULL
-        obj._fragment_root = NULL
         obj._fragment_tag_id = LXB_TAG_DIV
         obj._fragment_namespace_id = LXB_NS_HTML
         obj._selector = None
         return obj
 
+    cdef int _parse_chunk_begin(self, str stop_after) except -1:
+        """Start chunked parsing of the internal document.
+
+        Parameters
+        ----------
+        stop_after : str or None
+            Tag name of the element after which tree building stops.
+
+        Returns
+        -------
+        int
+            ``0`` on success; ``-1`` when the parser cannot be started.
+        """
+        cdef lxb_status_t status
+        cdef lxb_html_parser_t *parser
+        cdef lxb_html_tokenizer_t *tkz
+
+        if stop_after is not None:
+            self._stop_after.tag_id = _stop_after_tag_id_from_string(self.document, stop_after)
+
+        with nogil:
+            status = lxb_html_document_parse_chunk_begin(self.document)
+
+        if status != LXB_STATUS_OK:
+            PyErr_SetObject(SelectolaxError, "Can't parse HTML.")
+            return -1
+
+        self._is_streaming = True
+        if stop_after is not None:
+            parser = <lxb_html_parser_t *> self.document.dom_document.parser
+            tkz = parser.tkz
+            self._stop_after.callback = tkz.callback_token_done
+            self._stop_after.ctx = tkz.callback_token_ctx
+            self._stop_after.tree = parser.tree
+            self._stop_after.element = NULL
+            self._stop_after.cursor = &self.document.dom_document.node
+            tkz.callback_token_done = _stop_after_callback
+            tkz.callback_token_ctx = &self._stop_after
+        return 0
+
+    cdef int _parse_chunk(self, const char *html, size_t html_len) except -1:
+        """Parse the next chunk of the document.
+
+        Input that arrives after the ``stop_after`` element was closed is ignored.
+
+        Parameters
+        ----------
+        html : const char *
+            Pointer to UTF-8 encoded HTML bytes.
+        html_len : size_t
+            Length of the HTML buffer.
+
+        Returns
+        -------
+        int
+            ``0`` on success; ``-1`` when parsing fails.
+        """
+        cdef lxb_status_t status = LXB_STATUS_OK
+        cdef size_t offset = 0
+        cdef size_t size
+
+        with nogil:
+            # Feed the tokenizer in slices, so it does not have to consume
+            # the whole buffer after the stop_after element is found.
+            while offset < html_len and not self._stop_after.stopped:
+                size = min(html_len - offset, _STOP_AFTER_SLICE_SIZE)
+                status = lxb_html_document_parse_chunk(self.document, <lxb_char_t *> html + offset, size)
+                if status != LXB_STATUS_OK:
+                    break
+                offset += size
+
+        if status != LXB_STATUS_OK:
+            PyErr_SetObject(SelectolaxError, "Can't parse HTML.")
+            return -1
+        return 0
+
+    cdef int _check_mutable(self) except -1:
+        """Raise an error while the tree is still being built from chunks.
+
+        The tree builder keeps pointers to the open elements, so changing
+        the tree between :meth:`feed` calls could corrupt the document.
+        """
+        if self._is_streaming:
+            raise SelectolaxError("Can't modify the document before close() is called.")
+        return 0
+
+    @staticmethod
+    def incremental(stop_after: str | None = None):
+        """Create an empty parser that accepts HTML in chunks.
+
+        Feed the input with :meth:`feed` as it arrives and call :meth:`close`
+        once the input is exhausted. Only full documents can be parsed this way.
+
+        Parameters
+        ----------
+        stop_after : str, optional
+            Tag name of an element, such as ``"head"``. Once the first such element
+            is closed, the tree is no longer built and further input is ignored.
+            See :attr:`stopped`.
+
+        Examples
+        --------
+
+        >>> parser = LexborHTMLParser.incremental()
+        >>> parser.feed(b"<div><p>Hel")
+        >>> parser.feed(b"lo</p></div>")
+        >>> parser.close()
+        >>> parser.css_first("p").text()
+        'Hello'
+
+        The partially built tree can be queried between chunks, but it is
+        read-only until :meth:`close` is called: methods that change the tree,
+        such as ``decompose`` or setting ``inner_html``, raise ``SelectolaxError``.
+
+        Returns
+        -------
+        LexborHTMLParser
+            Parser in streaming mode. Its ``raw_html`` is ``None``, because
+            the chunks are not retained.
+
+        Raises
+        ------
+        SelectolaxError
+            If the document cannot be created or the parser cannot be started.
+        ValueError
+            If ``stop_after`` is not a known tag name.
+        """
+        cdef lxb_html_document_t *document
+        cdef LexborHTMLParser obj
+
+        with nogil:
+            document = lxb_html_document_create()
+
+        if document == NULL:
+            raise SelectolaxError("Failed to initialize object for HTML Document.")
+
+        obj = LexborHTMLParser.from_document(document, None)
+        obj._parse_chunk_begin(stop_after)
+        return obj
+
+    @staticmethod
+    def from_iter(chunks, stop_after: str | None = None):
+        """Parse a document from an iterable of chunks.
+
+        Useful for network responses and large files, where the input does not
+        have to be joined into one string first.
+
+        Parameters
+        ----------
+        chunks : iterable of str, bytes or buffers
+            HTML chunks in document order. Chunk boundaries may fall anywhere,
+            including inside of tags.
+        stop_after : str, optional
+            Tag name of an element, such as ``"head"``. Once the first such element
+            is closed, the remaining chunks are not consumed.
+
+        Examples
+        --------
+
+        >>> parser = LexborHTMLParser.from_iter(response.iter_content(8192))
+        >>> head_only = LexborHTMLParser.from_iter(response.iter_content(8192), stop_after="head")
+
+        Returns
+        -------
+        LexborHTMLParser
+            Parser with the parsed document.
+        """
+        cdef LexborHTMLParser parser = LexborHTMLParser.incremental(stop_after)
+        for chunk in chunks:
+            parser.feed(chunk)
+            if parser._stop_after.stopped:
+                break
+        parser.close()
+        return parser
+
+    @staticmethod
+    def from_file(
+        path,
+        is_fragment: bool = False,
+        fragment_tag: str = "div",
+        fragment_namespace: str = "html",
+        stop_after: str | None = None,
+        detect_encoding: bool = False,
+        use_meta_tags: bool = True,
+        cache_nodes: bool = False,
+        use_index: bool = False,
+    ):
+        """Parse an HTML file without reading it into memory first.
+
+        The file is memory-mapped and the mapping is passed to Lexbor directly,
+        so no intermediate ``bytes`` object is created.
+
+        Parameters
+        ----------
+        path : str or os.PathLike
+            Path to the HTML file.
+        is_fragment, fragment_tag, fragment_namespace, stop_after, detect_encoding, use_meta_tags, cache_nodes, use_index
+            Same as in :class:`LexborHTMLParser`.
+
+        Examples
+        --------
+
+        >>> parser = LexborHTMLParser.from_file("page.html", detect_encoding=True)
+
+        Returns
+        -------
+        LexborHTMLParser
+            Parser with the parsed file. Its ``raw_html`` is ``None``.
+        """
+        with open(path, "rb") as f:
+            return LexborHTMLParser.from_fd(
+                f.fileno(),
+                is_fragment=is_fragment,
+                fragment_tag=fragment_tag,
+                fragment_namespace=fragment_namespace,
+                stop_after=stop_after,
+                detect_encoding=detect_encoding,
+                use_meta_tags=use_meta_tags,
+                cache_nodes=cache_nodes,
+                use_index=use_index,
+            )
+
+    @staticmethod
+    def from_fd(
+        int fd,
+        is_fragment: bool = False,
+        fragment_tag: str = "div",
+        fragment_namespace: str = "html",
+        stop_after: str | None = None,
+        detect_encoding: bool = False,
+        use_meta_tags: bool = True,
+        cache_nodes: bool = False,
+        use_index: bool = False,
+    ):
+        """Parse HTML from an open file descriptor.
+
+        Regular files are memory-mapped and unmapped again once parsing is done.
+        Descriptors that can't be mapped, such as pipes, are read to the end instead.
+        In both cases the input starts at the current offset of the descriptor,
+        as with ``os.read``. The descriptor is not closed.
+
+        Parameters
+        ----------
+        fd : int
+            File descriptor opened for reading.
+        is_fragment, fragment_tag, fragment_namespace, stop_after, detect_encoding, use_meta_tags, cache_nodes, use_index
+            Same as in :class:`LexborHTMLParser`.
+
+        Returns
+        -------
+        LexborHTMLParser
+            Parser with the parsed file.
+        """
+        kwargs = dict(
+            is_fragment=is_fragment,
+            fragment_tag=fragment_tag,
+            fragment_namespace=fragment_namespace,
+            stop_after=stop_after,
+            detect_encoding=detect_encoding,
+            use_meta_tags=use_meta_tags,
+            cache_nodes=cache_nodes,
+            use_index=use_index,
+        )
+        try:
+            offset = os.lseek(fd, 0, os.SEEK_CUR)
+            mapped = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            # Empty files and non-regular files can't be mapped.
+            chunks = []
+            while chunk := os.read(fd, mmap.PAGESIZE * 16):
+                chunks.append(chunk)
+            return LexborHTMLParser(b"".join(chunks), **kwargs)
+
+        # The mapping covers the whole file, skip what was already consumed.
+        with mapped, memoryview(mapped) as view, view[offset:] as data:
+            if hasattr(mapped, "madvise"):
+                mapped.madvise(mmap.MADV_SEQUENTIAL)
+            return LexborHTMLParser(data, **kwargs)
+
+    @property
+    def stopped(self):
+        """Whether parsing was stopped early by ``stop_after``.
+
+        Returns
+        -------
+        bool
+            ``True`` when the ``stop_after`` element was closed and the rest of
+            the input was skipped.
+        """
+        return bool(self._stop_after.stopped)
+
+    def feed(self, chunk):
+        """Parse the next chunk of HTML.
+
+        When the parser was created with ``stop_after`` and has already
+        stopped, the chunk is ignored.
+
+        Parameters
+        ----------
+        chunk : str, bytes or buffer
+            Next part of the document. Objects that support the buffer protocol,
+            such as ``bytearray`` or ``memoryview``, are parsed without copying.
+
+        Returns
+        -------
+        None
+
+        Raises
+        ------
+        SelectolaxError
+            If the parser was not created by :meth:`incremental`, was already
+            closed, or Lexbor fails to parse the chunk.
+        """
+        cdef size_t chunk_len
+
+        if not self._is_streaming:
+            raise SelectolaxError("Parser is not accepting chunks.")
+
+        bytes_chunk, chunk_len = preprocess_input(chunk)
+        try:
+            self._parse_chunk(input_data(bytes_chunk), chunk_len)
+        finally:
+            release_input(bytes_chunk)
+
+    def close(self):
+        """Finish chunked parsing.
+
+        Flushes any buffered input and completes the tree. Calling ``close``
+        on a parser that is not streaming does nothing.
+
+        Returns
+        -------
+        None
+
+        Raises
+        ------
+        SelectolaxError
+            If Lexbor fails to finish the document.
+        """
+        cdef lxb_status_t status
+        cdef lxb_html_parser_t *parser
+
+        if not self._is_streaming:
+            return
+
+        self._is_streaming = False
+        with nogil:
+            status = lxb_html_document_parse_chunk_end(self.document)
+
+        if self._stop_after.tree != NULL:
+            # The document parser is reused by later parsing calls, e.g. when
+            # setting inner_html, so give the tokenizer back to the tree builder.
+            parser = <lxb_html_parser_t *> self.document.dom_document.parser
+            parser.tkz.callback_token_done = self._stop_after.callback
+            parser.tkz.callback_token_ctx = self._stop_after.ctx
+            self._stop_after.tree = NULL
+
+        if status != LXB_STATUS_OK:
+            raise SelectolaxError("Can't parse HTML.")
+
     def clone(self):
         """Clone the current document tree.
 
@@ -720,7 +1566,6 @@ cdef class LexborHTMLParser:
         cdef lxb_html_document_t* cloned_document
         cdef lxb_dom_node_t* cloned_node
         cdef lxb_dom_node_t* source_node
-        cdef lxb_dom_node_t* cloned_root
         cdef LexborHTMLParser cls
 
         with nogil:
@@ -749,14 +1594,14 @@ cdef class LexborHTMLParser:
             lxb_dom_node_insert_child(<lxb_dom_node_t * > cloned_document, cloned_node)
 
         cls = LexborHTMLParser.from_document(cloned_document, self.raw_html)
+        cls.detect_encoding = self.detect_encoding
+        cls.use_meta_tags = self.use_meta_tags
+        cls._encoding = self._encoding
         if self._is_fragment:
             cls._is_fragment = True
             cls._fragment_tag_id = self._fragment_tag_id
             cls._fragment_namespace_id = self._fragment_namespace_id
             cls._fragment_wrapper = cloned_node
-            cloned_root = cloned_node
-            if cloned_root != NULL:
-                cls._fragment_root = cloned_root.first_child
         return cls
 
     def unwrap_tags(self, list tags, delete_empty = False):
@@ -818,6 +1663,18 @@ cdef class LexborHTMLParser:
         """
         self.root.inner_html = html
 
+    @property
+    def inner_html_bytes(self) -> bytes:
+        """Return UTF-8 encoded HTML representation of the child nodes.
+
+        Same as ``inner_html``, but skips decoding the serialized output.
+
+        Returns
+        -------
+        html : bytes | None
+        """
+        return self.root.inner_html_bytes
+
     def inner_html_pretty(
         self,
         Py_ssize_t indent=0,
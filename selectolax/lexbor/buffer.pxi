@@ -0,0 +1,166 @@
+from cpython.mem cimport PyMem_RawFree, PyMem_RawRealloc
+from libc.string cimport memcpy
+
+
+ctypedef struct _ByteBuffer:
+    char *data
+    size_t length
+    size_t capacity
+
+
+cdef inline void _buffer_init(_ByteBuffer *buffer) noexcept nogil:
+    buffer.data = NULL
+    buffer.length = 0
+    buffer.capacity = 0
+
+
+cdef inline void _buffer_free(_ByteBuffer *buffer) noexcept nogil:
+    PyMem_RawFree(buffer.data)
+    _buffer_init(buffer)
+
+
+cdef bint _buffer_reserve(_ByteBuffer *buffer, size_t size) noexcept nogil:
+    """Make room for ``size`` more bytes. Returns ``False`` when out of memory."""
+    cdef size_t capacity = buffer.capacity or 256
+    cdef char *data
+
+    if buffer.length + size <= buffer.capacity:
+        return True
+    while capacity < buffer.length + size:
+        capacity *= 2
+    data = <char *> PyMem_RawRealloc(buffer.data, capacity)
+    if data == NULL:
+        return False
+    buffer.data = data
+    buffer.capacity = capacity
+    return True
+
+
+cdef inline bint _buffer_append(_ByteBuffer *buffer, const char *data, size_t size) noexcept nogil:
+    if size == 0:
+        return True
+    if not _buffer_reserve(buffer, size):
+        return False
+    memcpy(buffer.data + buffer.length, data, size)
+    buffer.length += size
+    return True
+
+
+ctypedef struct _TextOptions:
+    const char *separator
+    size_t separator_len
+    bint strip
+    bint skip_empty
+    # Set once the first fragment is written, separators only go between fragments.
+    bint started
+
+
+cdef inline void _text_options_init(
+    _TextOptions *options,
+    const char *separator,
+    size_t separator_len,
+    bint strip,
+    bint skip_empty
+) noexcept nogil:
+    options.separator = separator
+    options.separator_len = separator_len
+    options.strip = strip
+    options.skip_empty = skip_empty
+    options.started = False
+
+
+cdef inline size_t _utf8_space_len(const lxb_char_t *data, const lxb_char_t *end) noexcept nogil:
+    """Return the length of the whitespace character at ``data``, or 0.
+
+    Matches ``str.isspace``, so that stripping bytes gives the same result as ``str.strip``.
+    """
+    cdef size_t available = end - data
+
+    if data[0] in b' \t\n\x0b\x0c\r\x1c\x1d\x1e\x1f':
+        return 1
+    if available >= 2 and data[0] == 0xC2 and (data[1] == 0x85 or data[1] == 0xA0):
+        return 2
+    if available >= 3:
+        if data[0] == 0xE2 and data[1] == 0x80 and (
+            0x80 <= data[2] <= 0x8A or data[2] == 0xA8 or data[2] == 0xA9 or data[2] == 0xAF
+        ):
+            return 3
+        if ((data[0] == 0xE1 and data[1] == 0x9A and data[2] == 0x80)
+                or (data[0] == 0xE2 and data[1] == 0x81 and data[2] == 0x9F)
+                or (data[0] == 0xE3 and data[1] == 0x80 and data[2] == 0x80)):
+            return 3
+    return 0
+
+
+cdef bint _buffer_append_text_part(
+    _ByteBuffer *buffer,
+    const lxb_char_t *data,
+    size_t length,
+    _TextOptions *options
+) noexcept nogil:
+    """Append a text fragment according to ``options``. Returns ``False`` when out of memory."""
+    cdef const lxb_char_t *end = data + length
+    cdef size_t space_len
+
+    if options.skip_empty and _is_whitespace_only(data, length):
+        return True
+
+    if options.strip:
+        while data < end:
+            space_len = _utf8_space_len(data, end)
+            if space_len == 0:
+                break
+            data += space_len
+        while data < end:
+            if _utf8_space_len(end - 1, end) == 1:
+                end -= 1
+            elif end - data >= 2 and _utf8_space_len(end - 2, end) == 2:
+                end -= 2
+            elif end - data >= 3 and _utf8_space_len(end - 3, end) == 3:
+                end -= 3
+            else:
+                break
+
+    if options.started and not _buffer_append(buffer, options.separator, options.separator_len):
+        return False
+    options.started = True
+    return _buffer_append(buffer, <const char *> data, end - data)
+
+
+cdef inline bint _buffer_append_text_node(
+    _ByteBuffer *buffer,
+    lxb_dom_node_t *node,
+    _TextOptions *options
+) noexcept nogil:
+    cdef lexbor_str_t *data = &(<lxb_dom_character_data_t *> node).data
+
+    if data.data == NULL:
+        return True
+    return _buffer_append_text_part(buffer, data.data, data.length, options)
+
+
+cdef bint _buffer_append_text(
+    _ByteBuffer *buffer,
+    lxb_dom_node_t *root,
+    _TextOptions *options
+) noexcept nogil:
+    """Append the data of all text nodes below ``root`` in document order.
+
+    Returns ``False`` when out of memory.
+    """
+    cdef lxb_dom_node_t *node = root.first_child
+
+    while node != NULL:
+        if node.local_name == LXB_TAG__TEXT:
+            if not _buffer_append_text_node(buffer, node, options):
+                return False
+        elif node.first_child != NULL:
+            node = node.first_child
+            continue
+
+        while node != root and node.next == NULL:
+            node = node.parent
+        if node == root:
+            break
+        node = node.next
+    return True
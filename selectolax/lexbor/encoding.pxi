@@ -0,0 +1,132 @@
+from libc.string cimport memset
+
+cdef enum:
+    # The HTML Standard limits the <meta> prescan to the first 1024 bytes.
+    _ENCODING_PRESCAN_SIZE = 1024
+    _ENCODING_DECODE_BUFFER_SIZE = 4096
+    # Input is decoded in slices that always fit into the code point buffer:
+    # the single-byte decoders of lexbor drop a byte when they run out of room.
+    # A byte yields at most one code point, plus a few flushed from a pending sequence.
+    _ENCODING_DECODE_CHUNK_SIZE = 1024
+
+cdef lxb_codepoint_t _ENCODING_REPLACEMENT_CODEPOINT = 0xFFFD
+
+
+cdef const lxb_encoding_data_t * _lexbor_detect_encoding(
+    const lxb_char_t *html,
+    size_t html_len,
+    bint use_meta_tags
+) noexcept nogil:
+    """Determine the input encoding from the BOM or a ``<meta>`` declaration.
+
+    Falls back to UTF-8 when neither is present.
+    """
+    cdef lxb_encoding_t encoding = lxb_encoding_bom_sniff(html, html_len)
+    cdef const lxb_encoding_data_t *encoding_data = NULL
+    cdef lxb_html_encoding_t *em
+    cdef const lxb_char_t *name
+    cdef size_t name_len = 0
+
+    if encoding != LXB_ENCODING_DEFAULT:
+        return lxb_encoding_data(encoding)
+
+    if use_meta_tags:
+        em = lxb_html_encoding_create()
+        if em != NULL and lxb_html_encoding_init(em) == LXB_STATUS_OK:
+            name = lxb_html_encoding_prescan(
+                em, html, html + min(html_len, <size_t> _ENCODING_PRESCAN_SIZE), &name_len
+            )
+            if name != NULL:
+                encoding_data = lxb_encoding_data_prescan_validate(name, name_len)
+        lxb_html_encoding_destroy(em, True)
+
+    if encoding_data == NULL:
+        encoding_data = lxb_encoding_data(LXB_ENCODING_UTF_8)
+    return encoding_data
+
+
+cdef inline lxb_status_t _lexbor_write_utf8(
+    lxb_codepoint_t *codepoints,
+    size_t length,
+    lxb_char_t **buffer,
+    lxb_char_t **pos,
+    size_t *capacity
+) noexcept nogil:
+    cdef lxb_encoding_encode_t encode
+    cdef lxb_char_t *new_buffer
+    cdef size_t used = pos[0] - buffer[0]
+    cdef size_t required
+    cdef size_t i
+
+    # A code point takes at most 4 bytes in UTF-8. The encoder doesn't check
+    # the bounds for ASCII, so the room has to be reserved up front.
+    required = used + length * 4
+    if required > capacity[0]:
+        required = max(required, capacity[0] * 2)
+        new_buffer = <lxb_char_t *> PyMem_RawRealloc(buffer[0], required)
+        if new_buffer == NULL:
+            return LXB_STATUS_ERROR_MEMORY_ALLOCATION
+        buffer[0] = new_buffer
+        pos[0] = new_buffer + used
+        capacity[0] = required
+
+    memset(&encode, 0, sizeof(lxb_encoding_encode_t))
+    for i in range(length):
+        if lxb_encoding_encode_utf_8_single(
+            &encode, pos, buffer[0] + capacity[0], codepoints[i]
+        ) < 0:
+            return LXB_STATUS_ERROR
+    return LXB_STATUS_OK
+
+
+cdef lxb_char_t * _lexbor_transcode_to_utf8(
+    const lxb_encoding_data_t *encoding,
+    const lxb_char_t *html,
+    size_t html_len,
+    size_t *out_len,
+    lxb_status_t *out_status
+) noexcept nogil:
+    """Convert ``html`` from ``encoding`` to UTF-8.
+
+    Malformed input is replaced with U+FFFD, as browsers do.
+    The result must be released with ``PyMem_RawFree``; on failure ``NULL``
+    is returned and the reason is stored in ``out_status``.
+    """
+    cdef lxb_encoding_decode_t decode
+    cdef lxb_codepoint_t codepoints[_ENCODING_DECODE_BUFFER_SIZE]
+    cdef const lxb_char_t *end = html + html_len
+    cdef size_t capacity = html_len * 2 + 16
+    cdef lxb_char_t *buffer
+    cdef lxb_char_t *pos
+    cdef lxb_status_t status
+
+    buffer = <lxb_char_t *> PyMem_RawMalloc(capacity)
+    if buffer == NULL:
+        out_status[0] = LXB_STATUS_ERROR_MEMORY_ALLOCATION
+        return NULL
+    pos = buffer
+
+    lxb_encoding_decode_init(&decode, encoding, codepoints, _ENCODING_DECODE_BUFFER_SIZE)
+    lxb_encoding_decode_replace_set(&decode, &_ENCODING_REPLACEMENT_CODEPOINT, 1)
+
+    while html < end:
+        status = encoding.decode(
+            &decode, &html, html + min(<size_t> (end - html), <size_t> _ENCODING_DECODE_CHUNK_SIZE)
+        )
+        out_status[0] = _lexbor_write_utf8(codepoints, decode.buffer_used, &buffer, &pos, &capacity)
+        if out_status[0] != LXB_STATUS_OK:
+            PyMem_RawFree(buffer)
+            return NULL
+        decode.buffer_used = 0
+        # LXB_STATUS_CONTINUE means that a sequence spans the end of the slice.
+        if status == LXB_STATUS_ERROR:
+            break
+
+    lxb_encoding_decode_finish(&decode)
+    out_status[0] = _lexbor_write_utf8(codepoints, decode.buffer_used, &buffer, &pos, &capacity)
+    if out_status[0] != LXB_STATUS_OK:
+        PyMem_RawFree(buffer)
+        return NULL
+
+    out_len[0] = pos - buffer
+    return buffer
@@ -0,0 +1,452 @@
+cimport cython
+from cpython.bytes cimport PyBytes_FromStringAndSize
+from cpython.mem cimport PyMem_Free, PyMem_Malloc
+from cpython.unicode cimport PyUnicode_DecodeUTF8
+from libc.stdint cimport INT32_MAX, int32_t
+
+
+ctypedef struct _ExtractField:
+    lxb_css_selector_list_t *selectors_list
+    # NULL when the text content is extracted.
+    const lxb_char_t *attribute
+    size_t attribute_len
+
+ctypedef struct _ExtractValue:
+    Py_ssize_t field
+    size_t offset
+    size_t length
+
+ctypedef struct _ExtractContext:
+    const _ExtractField *field
+    Py_ssize_t index
+    _ByteBuffer *data
+    _ByteBuffer *values
+    _TextOptions text_options
+    bint failed
+
+
+cdef lxb_status_t _extract_callback(
+    lxb_dom_node_t *node,
+    lxb_css_selector_specificity_t *spec,
+    void *ctx
+) noexcept nogil:
+    cdef _ExtractContext *context = <_ExtractContext *> ctx
+    cdef _ExtractValue value
+    cdef lxb_dom_attr_t *attr
+    cdef const lxb_char_t *attr_value
+    cdef size_t attr_value_len = 0
+
+    value.field = context.index
+    value.offset = context.data.length
+    if context.field.attribute == NULL:
+        _text_options_init(&context.text_options, NULL, 0, False, False)
+        if not _buffer_append_text(context.data, node, &context.text_options):
+            context.failed = True
+            return LXB_STATUS_ERROR_MEMORY_ALLOCATION
+    else:
+        attr = lxb_dom_element_attr_by_name(
+            <lxb_dom_element_t *> node, context.field.attribute, context.field.attribute_len
+        )
+        if attr == NULL:
+            return LXB_STATUS_OK
+        attr_value = lxb_dom_attr_value_noi(attr, &attr_value_len)
+        if attr_value != NULL and not _buffer_append(context.data, <const char *> attr_value, attr_value_len):
+            context.failed = True
+            return LXB_STATUS_ERROR_MEMORY_ALLOCATION
+
+    value.length = context.data.length - value.offset
+    if not _buffer_append(context.values, <const char *> &value, sizeof(_ExtractValue)):
+        context.failed = True
+        return LXB_STATUS_ERROR_MEMORY_ALLOCATION
+    return LXB_STATUS_OK
+
+
+cdef lxb_status_t _extract_document(
+    lxb_selectors_t *selectors,
+    const _ExtractField *fields,
+    Py_ssize_t n_fields,
+    const char *html,
+    size_t html_len,
+    _ByteBuffer *data,
+    _ByteBuffer *values
+) noexcept nogil:
+    """Parse a document and append the values of all fields to ``data`` and ``values``."""
+    cdef lxb_html_document_t *document
+    cdef lxb_dom_node_t *root
+    cdef _ExtractContext context
+    cdef lxb_status_t status
+    cdef Py_ssize_t i
+
+    document = lxb_html_document_create()
+    if document == NULL:
+        return LXB_STATUS_ERROR_MEMORY_ALLOCATION
+
+    status = lxb_html_document_parse(document, <const lxb_char_t *> html, html_len)
+    if status == LXB_STATUS_OK:
+        root = lxb_dom_document_root(&document.dom_document)
+        context.data = data
+        context.values = values
+        context.failed = False
+        for i in range(n_fields):
+            if root == NULL:
+                break
+            context.field = &fields[i]
+            context.index = i
+            lxb_selectors_find(selectors, root, fields[i].selectors_list,
+                               <lxb_selectors_cb_f> _extract_callback, <void *> &context)
+            if context.failed:
+                status = LXB_STATUS_ERROR_MEMORY_ALLOCATION
+                break
+
+    lxb_html_document_destroy(document)
+    return status
+
+
+@cython.final
+cdef class _ExtractSpec:
+    """Compiled form of the ``spec`` argument of ``extract_many``."""
+    cdef list names
+    # Keep the compiled selectors and attribute names alive for the raw pointers in ``fields``.
+    cdef list selectors
+    cdef list attributes
+    cdef _ExtractField *fields
+    cdef Py_ssize_t n_fields
+
+    def __cinit__(self, dict spec):
+        cdef LexborCompiledSelector compiled
+        cdef Py_ssize_t i
+
+        self.names = list(spec)
+        self.selectors = []
+        self.attributes = []
+        for name in self.names:
+            field = spec[name]
+            if not isinstance(field, (tuple, list)) or len(field) != 2:
+                raise TypeError(f"Expected a (selector, source) pair for field {name!r}")
+            query, source = field
+            if isinstance(query, LexborCompiledSelector):
+                compiled = <LexborCompiledSelector> query
+            elif isinstance(query, str):
+                compiled = <LexborCompiledSelector> _selector_cache(query)
+            else:
+                raise TypeError("Query must be a string or a compiled selector.")
+            if not isinstance(source, str):
+                raise TypeError(f"Expected 'text' or an attribute name for field {name!r}")
+            self.selectors.append(compiled)
+            self.attributes.append(None if source == "text" else source.lower().encode(_ENCODING))
+
+        self.n_fields = len(self.names)
+        self.fields = <_ExtractField *> PyMem_Malloc(max(self.n_fields, 1) * sizeof(_ExtractField))
+        if self.fields == NULL:
+            raise MemoryError()
+        for i in range(self.n_fields):
+            self.fields[i].selectors_list = (<LexborCompiledSelector> self.selectors[i]).selectors_list
+            if self.attributes[i] is None:
+                self.fields[i].attribute = NULL
+                self.fields[i].attribute_len = 0
+            else:
+                self.fields[i].attribute = <const lxb_char_t *> <bytes> self.attributes[i]
+                self.fields[i].attribute_len = len(<bytes> self.attributes[i])
+
+    def __dealloc__(self):
+        PyMem_Free(self.fields)
+
+    cpdef list extract(self, list documents):
+        """Extract the fields from every document. Safe to call from several threads at once."""
+        cdef lxb_selectors_t *selectors
+        cdef _ByteBuffer data
+        cdef _ByteBuffer values
+        cdef _ExtractValue *value
+        cdef lxb_status_t status
+        cdef size_t html_len
+        cdef char *html
+        cdef Py_ssize_t i
+        cdef list results = []
+        cdef dict result
+
+        selectors = lxb_selectors_create()
+        status = lxb_selectors_init(selectors)
+        if status != LXB_STATUS_OK:
+            lxb_selectors_destroy(selectors, True)
+            raise SelectolaxError("Can't initialize CSS selector.")
+        lxb_selectors_opt_set(selectors, LXB_SELECTORS_OPT_MATCH_ROOT)
+
+        _buffer_init(&data)
+        _buffer_init(&values)
+        try:
+            for document in documents:
+                bytes_html, html_len = preprocess_input(document)
+                html = input_data(bytes_html)
+                try:
+                    data.length = 0
+                    values.length = 0
+                    with nogil:
+                        status = _extract_document(
+                            selectors, self.fields, self.n_fields, html, html_len, &data, &values
+                        )
+                finally:
+                    release_input(bytes_html)
+                if status == LXB_STATUS_ERROR_MEMORY_ALLOCATION:
+                    raise MemoryError()
+                if status != LXB_STATUS_OK:
+                    raise SelectolaxError("Can't parse HTML: %s" % status)
+
+                result = {name: [] for name in self.names}
+                value = <_ExtractValue *> values.data
+                for i in range(<Py_ssize_t> (values.length // sizeof(_ExtractValue))):
+                    result[self.names[value[i].field]].append(
+                        PyUnicode_DecodeUTF8(data.data + value[i].offset, value[i].length, "replace")
+                    )
+                results.append(result)
+        finally:
+            _buffer_free(&data)
+            _buffer_free(&values)
+            lxb_selectors_destroy(selectors, True)
+        return results
+
+
+def extract_many(documents, dict spec, threads=None):
+    """
+    Parse many HTML documents and extract text and attribute values with CSS selectors.
+
+    Each document is parsed, matched and extracted without holding the GIL and
+    without creating a ``LexborNode`` per match; only the resulting strings are
+    Python objects. Like ``parse_many``, documents are processed on ``threads``
+    threads in parallel.
+
+    Args:
+        documents: Iterable of ``str``, ``bytes`` or buffer objects.
+        spec: Mapping of field names to ``(selector, source)`` pairs.
+            ``selector`` is a CSS selector string or a ``LexborCompiledSelector``.
+            ``source`` is ``"text"`` for the text content of the matched nodes,
+            or an attribute name. Nodes without the attribute are skipped,
+            attributes without a value produce empty strings.
+        threads: Number of worker threads. Defaults to ``os.cpu_count()``.
+
+    Returns:
+        A list with a dict per document, mapping the field names to lists of
+        strings in document order.
+
+    Raises:
+        ValueError: If ``threads`` is less than 1.
+
+    Examples:
+        >>> extract_many(pages, {"title": ("title", "text"), "links": ("a", "href")})
+        [{'title': ['Home'], 'links': ['/', '/about']}, ...]
+    """
+    return _map_batches(_ExtractSpec(spec).extract, list(documents), threads)
+
+
+ctypedef struct _Column:
+    # NULL when the text content is extracted.
+    const lxb_char_t *attribute
+    size_t attribute_len
+    # Whether attributes without a value are null rather than empty strings.
+    bint null_without_value
+    _ByteBuffer data
+    # Arrow layout: int32 offsets into ``data``, one more than there are rows.
+    _ByteBuffer offsets
+    # Arrow layout: one bit per row, least significant bit first.
+    _ByteBuffer validity
+    size_t null_count
+
+ctypedef struct _ColumnsContext:
+    _Column *columns
+    Py_ssize_t n_columns
+    size_t rows
+    _TextOptions text_options
+    lxb_status_t status
+
+
+cdef bint _column_append(
+    _Column *column,
+    lxb_dom_node_t *node,
+    size_t row,
+    _TextOptions *text_options
+) noexcept nogil:
+    """Append the value of ``node`` as row ``row``. Returns ``False`` when out of memory."""
+    cdef lxb_dom_attr_t *attr
+    cdef const lxb_char_t *value
+    cdef size_t value_len = 0
+    cdef bint valid = True
+    cdef char empty = 0
+
+    if column.attribute == NULL:
+        _text_options_init(text_options, NULL, 0, False, False)
+        if not _buffer_append_text(&column.data, node, text_options):
+            return False
+    else:
+        attr = lxb_dom_element_attr_by_name(<lxb_dom_element_t *> node, column.attribute, column.attribute_len)
+        value = lxb_dom_attr_value_noi(attr, &value_len) if attr != NULL else NULL
+        if attr == NULL or (value == NULL and column.null_without_value):
+            valid = False
+            column.null_count += 1
+        elif value != NULL and not _buffer_append(&column.data, <const char *> value, value_len):
+            return False
+
+    if row % 8 == 0 and not _buffer_append(&column.validity, &empty, 1):
+        return False
+    if valid:
+        column.validity.data[row // 8] |= 1 << (row % 8)
+    return True
+
+
+cdef lxb_status_t _columns_callback(
+    lxb_dom_node_t *node,
+    lxb_css_selector_specificity_t *spec,
+    void *ctx
+) noexcept nogil:
+    cdef _ColumnsContext *context = <_ColumnsContext *> ctx
+    cdef _Column *column
+    cdef int32_t offset
+    cdef Py_ssize_t i
+
+    for i in range(context.n_columns):
+        column = &context.columns[i]
+        if not _column_append(column, node, context.rows, &context.text_options):
+            context.status = LXB_STATUS_ERROR_MEMORY_ALLOCATION
+            return context.status
+        if column.data.length > <size_t> INT32_MAX:
+            context.status = LXB_STATUS_ERROR_OVERFLOW
+            return context.status
+        offset = <int32_t> column.data.length
+        if not _buffer_append(&column.offsets, <const char *> &offset, sizeof(int32_t)):
+            context.status = LXB_STATUS_ERROR_MEMORY_ALLOCATION
+            return context.status
+    context.rows += 1
+    return LXB_STATUS_OK
+
+
+cdef list _attribute_names(object names):
+    if isinstance(names, str):
+        raise TypeError("Expected a sequence of attribute names, not a string.")
+    names = list(names)
+    for name in names:
+        if not isinstance(name, str):
+            raise TypeError("Attribute names must be strings.")
+    return names
+
+
+cdef int _fill_columns(
+    _ColumnsContext *context,
+    LexborNode node,
+    object query,
+    list attributes,
+    bint null_without_value
+) except -1:
+    """Fill a column per item of ``attributes``, ``None`` stands for the text content.
+
+    The columns must be released with ``_free_columns``, even when an exception is raised.
+    """
+    cdef LexborCSSSelector selector = node.parser.selector
+    cdef LexborCompiledSelector compiled = selector._compile(query)
+    cdef _Column *column
+    cdef int32_t offset = 0
+    cdef Py_ssize_t i
+
+    context.n_columns = 0
+    context.rows = 0
+    context.status = LXB_STATUS_OK
+    context.columns = <_Column *> PyMem_Malloc(max(len(attributes), 1) * sizeof(_Column))
+    if context.columns == NULL:
+        raise MemoryError()
+    for i in range(len(attributes)):
+        column = &context.columns[i]
+        if attributes[i] is None:
+            column.attribute = NULL
+            column.attribute_len = 0
+        else:
+            column.attribute = <const lxb_char_t *> <bytes> attributes[i]
+            column.attribute_len = len(<bytes> attributes[i])
+        column.null_without_value = null_without_value
+        column.null_count = 0
+        _buffer_init(&column.data)
+        _buffer_init(&column.offsets)
+        _buffer_init(&column.validity)
+        context.n_columns += 1
+        if not _buffer_append(&column.offsets, <const char *> &offset, sizeof(int32_t)):
+            raise MemoryError()
+
+    if context.n_columns > 0:
+        lxb_selectors_find(selector.selectors, node.node, compiled.selectors_list,
+                           <lxb_selectors_cb_f> _columns_callback, <void *> context)
+    if context.status == LXB_STATUS_ERROR_MEMORY_ALLOCATION:
+        raise MemoryError()
+    if context.status == LXB_STATUS_ERROR_OVERFLOW:
+        raise OverflowError("A column exceeds 2 GiB, the limit of 32-bit offsets.")
+    return 0
+
+
+cdef void _free_columns(_ColumnsContext *context):
+    cdef Py_ssize_t i
+
+    for i in range(context.n_columns):
+        _buffer_free(&context.columns[i].data)
+        _buffer_free(&context.columns[i].offsets)
+        _buffer_free(&context.columns[i].validity)
+    PyMem_Free(context.columns)
+    context.columns = NULL
+    context.n_columns = 0
+
+
+cdef inline object _column_value(_Column *column, size_t row):
+    cdef int32_t *offsets = <int32_t *> column.offsets.data
+
+    if column.null_count and not column.validity.data[row // 8] & (1 << (row % 8)):
+        return None
+    return PyUnicode_DecodeUTF8(column.data.data + offsets[row], offsets[row + 1] - offsets[row], NULL)
+
+
+cdef dict _extract_columns(LexborNode node, object query, object attrs, bint text):
+    """Implementation of ``LexborNode.extract_columns``."""
+    cdef _ColumnsContext context
+    cdef _Column *column
+    cdef Py_ssize_t i
+    cdef list names = _attribute_names(attrs)
+    cdef list attributes = [name.lower().encode(_ENCODING) for name in names]
+    cdef dict result = {}
+
+    if text:
+        if "text" in names:
+            raise ValueError("The 'text' column can't be combined with an attribute of the same name.")
+        names.append("text")
+        attributes.append(None)
+
+    context.columns = NULL
+    context.n_columns = 0
+    try:
+        _fill_columns(&context, node, query, attributes, False)
+        for i in range(context.n_columns):
+            column = &context.columns[i]
+            result[names[i]] = (
+                PyBytes_FromStringAndSize(column.data.data, column.data.length),
+                PyBytes_FromStringAndSize(column.offsets.data, column.offsets.length),
+                PyBytes_FromStringAndSize(column.validity.data, column.validity.length)
+                if column.null_count else None,
+            )
+    finally:
+        _free_columns(&context)
+    return result
+
+
+cdef list _css_attrs(LexborNode node, object query, object names, bint single):
+    """Implementation of ``LexborNode.css_attr`` and ``LexborNode.css_attrs``."""
+    cdef _ColumnsContext context
+    cdef Py_ssize_t i, n_columns
+    cdef size_t row
+    cdef list result = []
+
+    names = [names] if single else _attribute_names(names)
+    context.columns = NULL
+    context.n_columns = 0
+    try:
+        _fill_columns(&context, node, query, [name.encode(_ENCODING) for name in names], True)
+        n_columns = context.n_columns
+        for row in range(context.rows):
+            if single:
+                result.append(_column_value(&context.columns[0], row))
+                continue
+            result.append(tuple([_column_value(&context.columns[i], row) for i in range(n_columns)]))
+    finally:
+        _free_columns(&context)
+    return result
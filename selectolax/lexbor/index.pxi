@@ -0,0 +1,377 @@
+cimport cython
+from cpython.bytes cimport PyBytes_FromStringAndSize
+from libc.string cimport memcmp
+
+import re
+
+# Selectors that can be answered from the index: a single tag name, id or class.
+_INDEXED_SELECTOR_RE = re.compile(r"(?:[#.]?-?[A-Za-z_][A-Za-z0-9_-]*|\*)\Z")
+
+
+cdef inline _MutationHooks * _mutation_hooks(lxb_dom_node_t *node) noexcept nogil:
+    return <_MutationHooks *> node.owner_document.user
+
+
+cdef lxb_status_t _index_node_inserted(lxb_dom_node_t *node) noexcept nogil:
+    cdef _MutationHooks *hooks = _mutation_hooks(node)
+
+    hooks.version += 1
+    if hooks.mutation.inserted == NULL:
+        return LXB_STATUS_OK
+    return hooks.mutation.inserted(node)
+
+
+cdef lxb_status_t _index_node_removed(lxb_dom_node_t *node, lxb_dom_node_t *old_parent) noexcept nogil:
+    cdef _MutationHooks *hooks = _mutation_hooks(node)
+
+    hooks.version += 1
+    if hooks.mutation.removed == NULL:
+        return LXB_STATUS_OK
+    return hooks.mutation.removed(node, old_parent)
+
+
+cdef lxb_status_t _index_node_moved(lxb_dom_node_t *node, lxb_dom_node_t *old_parent) noexcept nogil:
+    cdef _MutationHooks *hooks = _mutation_hooks(node)
+
+    hooks.version += 1
+    if hooks.mutation.moved == NULL:
+        return LXB_STATUS_OK
+    return hooks.mutation.moved(node, old_parent)
+
+
+cdef lxb_status_t _index_node_destroyed(lxb_dom_node_t *node) noexcept nogil:
+    cdef _MutationHooks *hooks = _mutation_hooks(node)
+
+    if hooks.mutation.destroy == NULL:
+        return LXB_STATUS_OK
+    return hooks.mutation.destroy(node)
+
+
+cdef lxb_status_t _index_children_changed(lxb_dom_node_t *node) noexcept nogil:
+    cdef _MutationHooks *hooks = _mutation_hooks(node)
+
+    if hooks.mutation.children_changed == NULL:
+        return LXB_STATUS_OK
+    return hooks.mutation.children_changed(node)
+
+
+cdef lxb_status_t _index_node_connected(lxb_dom_node_t *node) noexcept nogil:
+    cdef _MutationHooks *hooks = _mutation_hooks(node)
+
+    if hooks.mutation.connected == NULL:
+        return LXB_STATUS_OK
+    return hooks.mutation.connected(node)
+
+
+cdef inline _MutationHooks * _attr_mutation_hooks(
+    lxb_dom_element_t *element,
+    lxb_dom_attr_id_t local_name
+) noexcept nogil:
+    cdef _MutationHooks *hooks = _mutation_hooks(<lxb_dom_node_t *> element)
+
+    hooks.attributes_version += 1
+    # Other attributes don't affect the index.
+    if local_name == LXB_DOM_ATTR_ID or local_name == LXB_DOM_ATTR_CLASS:
+        hooks.version += 1
+    return hooks
+
+
+cdef lxb_status_t _index_attr_changed(
+    lxb_dom_element_t *element,
+    lxb_dom_attr_id_t local_name,
+    const lxb_char_t *old_value, size_t old_len,
+    const lxb_char_t *value, size_t value_len,
+    lxb_ns_id_t ns
+) noexcept nogil:
+    cdef _MutationHooks *hooks = _attr_mutation_hooks(element, local_name)
+
+    if hooks.attr_mutation.change == NULL:
+        return LXB_STATUS_OK
+    return hooks.attr_mutation.change(element, local_name, old_value, old_len, value, value_len, ns)
+
+
+cdef lxb_status_t _index_attr_appended(
+    lxb_dom_element_t *element,
+    lxb_dom_attr_id_t local_name,
+    const lxb_char_t *old_value, size_t old_len,
+    const lxb_char_t *value, size_t value_len,
+    lxb_ns_id_t ns
+) noexcept nogil:
+    cdef _MutationHooks *hooks = _attr_mutation_hooks(element, local_name)
+
+    if hooks.attr_mutation.append == NULL:
+        return LXB_STATUS_OK
+    return hooks.attr_mutation.append(element, local_name, old_value, old_len, value, value_len, ns)
+
+
+cdef lxb_status_t _index_attr_removed(
+    lxb_dom_element_t *element,
+    lxb_dom_attr_id_t local_name,
+    const lxb_char_t *old_value, size_t old_len,
+    const lxb_char_t *value, size_t value_len,
+    lxb_ns_id_t ns
+) noexcept nogil:
+    cdef _MutationHooks *hooks = _attr_mutation_hooks(element, local_name)
+
+    if hooks.attr_mutation.remove == NULL:
+        return LXB_STATUS_OK
+    return hooks.attr_mutation.remove(element, local_name, old_value, old_len, value, value_len, ns)
+
+
+cdef lxb_status_t _index_attr_replaced(
+    lxb_dom_element_t *element,
+    lxb_dom_attr_id_t local_name,
+    const lxb_char_t *old_value, size_t old_len,
+    const lxb_char_t *value, size_t value_len,
+    lxb_ns_id_t ns
+) noexcept nogil:
+    cdef _MutationHooks *hooks = _attr_mutation_hooks(element, local_name)
+
+    if hooks.attr_mutation.replace == NULL:
+        return LXB_STATUS_OK
+    return hooks.attr_mutation.replace(element, local_name, old_value, old_len, value, value_len, ns)
+
+
+cdef lxb_dom_document_mutation_cb_t _INDEX_MUTATION_CALLBACKS
+_INDEX_MUTATION_CALLBACKS.inserted = _index_node_inserted
+_INDEX_MUTATION_CALLBACKS.removed = _index_node_removed
+_INDEX_MUTATION_CALLBACKS.moved = _index_node_moved
+_INDEX_MUTATION_CALLBACKS.destroy = _index_node_destroyed
+_INDEX_MUTATION_CALLBACKS.children_changed = _index_children_changed
+_INDEX_MUTATION_CALLBACKS.connected = _index_node_connected
+
+cdef lxb_dom_document_attr_mutation_cb_t _INDEX_ATTR_MUTATION_CALLBACKS
+_INDEX_ATTR_MUTATION_CALLBACKS.change = _index_attr_changed
+_INDEX_ATTR_MUTATION_CALLBACKS.append = _index_attr_appended
+_INDEX_ATTR_MUTATION_CALLBACKS.remove = _index_attr_removed
+_INDEX_ATTR_MUTATION_CALLBACKS.replace = _index_attr_replaced
+
+
+cdef void _install_mutation_hooks(LexborHTMLParser parser) noexcept:
+    """Make the document report its changes to ``parser._mutation_hooks``.
+
+    Lexbor resets the callbacks when a document is parsed again, so this is checked
+    before every use of the index. Installing the hooks invalidates the index.
+    """
+    cdef lxb_dom_document_t *document = &parser.document.dom_document
+    cdef _MutationHooks *hooks = &parser._mutation_hooks
+
+    if (document.mutation == &_INDEX_MUTATION_CALLBACKS
+            and document.attr_mutation == &_INDEX_ATTR_MUTATION_CALLBACKS
+            and document.user == hooks):
+        return
+    hooks.mutation = document.mutation
+    hooks.attr_mutation = document.attr_mutation
+    hooks.version += 1
+    document.user = hooks
+    document.mutation = &_INDEX_MUTATION_CALLBACKS
+    document.attr_mutation = &_INDEX_ATTR_MUTATION_CALLBACKS
+
+
+cdef void _remove_mutation_hooks(LexborHTMLParser parser) noexcept:
+    cdef lxb_dom_document_t *document = &parser.document.dom_document
+    cdef _MutationHooks *hooks = &parser._mutation_hooks
+
+    if document.user != hooks or document.mutation != &_INDEX_MUTATION_CALLBACKS:
+        return
+    document.mutation = hooks.mutation
+    document.attr_mutation = hooks.attr_mutation
+    document.user = NULL
+
+
+cdef inline bint _has_id(lxb_dom_node_t *node, const char *value, size_t length) noexcept nogil:
+    cdef size_t id_len
+    cdef const lxb_char_t *id_value = lxb_dom_element_id_noi(<lxb_dom_element_t *> node, &id_len)
+
+    return id_value != NULL and id_len == length and memcmp(id_value, value, length) == 0
+
+
+cdef lxb_dom_node_t * _element_by_id(lxb_dom_node_t *root, const char *value, size_t length) noexcept nogil:
+    """Return the first element below ``root`` whose id is exactly ``value``, or ``NULL``."""
+    cdef lxb_dom_node_t *node = root.first_child
+
+    while node != NULL:
+        if node.type == LXB_DOM_NODE_TYPE_ELEMENT:
+            if _has_id(node, value, length):
+                return node
+            if node.first_child != NULL:
+                node = node.first_child
+                continue
+
+        while node != root and node.next == NULL:
+            node = node.parent
+        if node == root:
+            break
+        node = node.next
+    return NULL
+
+
+cdef inline void _index_append(dict buckets, object key, size_t address):
+    cdef list bucket = buckets.get(key)
+
+    if bucket is None:
+        buckets[key] = [address]
+    # Repeated class names of a single element are added only once.
+    elif bucket[len(bucket) - 1] != address:
+        bucket.append(address)
+
+
+cdef inline bint _is_class_separator(lxb_char_t c) noexcept nogil:
+    return c == b' ' or c == b'\t' or c == b'\n' or c == b'\x0c' or c == b'\r'
+
+
+@cython.final
+cdef class _NodeIndex:
+    """Elements of a document grouped by tag, id and class.
+
+    Nodes are stored as addresses in document order. Ids and classes are
+    ASCII lowercased, because Lexbor matches them case-insensitively.
+    """
+    cdef bint built
+    cdef size_t version
+    # Whether the document element is the only element child of the document,
+    # so that the whole index is also the subtree of ``parser.root``.
+    cdef bint single_root
+    cdef list elements
+    cdef dict tags
+    cdef dict ids
+    cdef dict classes
+
+    cdef void build(self, lxb_dom_node_t *document, size_t version):
+        cdef lxb_dom_node_t *node = document.first_child
+        cdef const lxb_char_t *value
+        cdef const lxb_char_t *end
+        cdef const lxb_char_t *start
+        cdef size_t value_len
+        cdef size_t address
+        cdef Py_ssize_t root_elements = 0
+
+        self.elements = []
+        self.tags = {}
+        self.ids = {}
+        self.classes = {}
+
+        while node != NULL:
+            if node.type == LXB_DOM_NODE_TYPE_ELEMENT:
+                if node.parent == document:
+                    root_elements += 1
+                address = <size_t> node
+                self.elements.append(address)
+                _index_append(self.tags, node.local_name, address)
+
+                value = lxb_dom_element_id_noi(<lxb_dom_element_t *> node, &value_len)
+                if value != NULL and value_len > 0:
+                    _index_append(
+                        self.ids, PyBytes_FromStringAndSize(<const char *> value, value_len).lower(), address
+                    )
+
+                value = lxb_dom_element_class_noi(<lxb_dom_element_t *> node, &value_len)
+                if value != NULL:
+                    end = value + value_len
+                    while value < end:
+                        while value < end and _is_class_separator(value[0]):
+                            value += 1
+                        start = value
+                        while value < end and not _is_class_separator(value[0]):
+                            value += 1
+                        if value > start:
+                            _index_append(
+                                self.classes,
+                                PyBytes_FromStringAndSize(<const char *> start, value - start).lower(),
+                                address,
+                            )
+
+                if node.first_child != NULL:
+                    node = node.first_child
+                    continue
+
+            while node != document and node.next == NULL:
+                node = node.parent
+            if node == document:
+                break
+            node = node.next
+
+        self.single_root = root_elements == 1
+        self.version = version
+        self.built = True
+
+    cdef list lookup_tag(self, LexborHTMLParser parser, str name):
+        """Return the elements that ``tags(name)`` matches, or ``None`` when the index can't answer."""
+        cdef bytes name_bytes
+        cdef lxb_tag_id_t tag_id
+        cdef lxb_dom_node_t *node
+        cdef list result = []
+        cdef object address
+
+        if name == "*":
+            return _index_nodes(parser, self.elements)
+        if ":" in name:
+            return None
+        name_bytes = name.encode("UTF-8")
+        tag_id = lxb_tag_id_by_name_noi(
+            parser.document.dom_document.tags, <const lxb_char_t *> name_bytes, len(name_bytes)
+        )
+        if tag_id == LXB_TAG__UNDEF:
+            return result
+        for address in self.tags.get(tag_id, ()):
+            node = <lxb_dom_node_t *> <size_t> address
+            # Same as Lexbor, prefixed elements only match prefixed names.
+            if node.prefix == LXB_NS__UNDEF:
+                result.append(LexborNode.new(node, parser))
+        return result
+
+    cdef lxb_dom_node_t * lookup_id(self, bytes value):
+        """Return the first element whose id is exactly ``value``, or ``NULL``."""
+        cdef object address
+        cdef lxb_dom_node_t *node
+
+        # Buckets are case-insensitive, so the exact id is checked as well.
+        for address in self.ids.get(value.lower(), ()):
+            node = <lxb_dom_node_t *> <size_t> address
+            if _has_id(node, value, len(value)):
+                return node
+        return NULL
+
+    cdef list lookup_selector(self, LexborHTMLParser parser, object query):
+        """Return the addresses of the elements that match ``query``, or ``None`` when the index can't answer."""
+        cdef bytes key
+        cdef lxb_tag_id_t tag_id
+
+        if not self.single_root or not isinstance(query, str) or _INDEXED_SELECTOR_RE.match(query) is None:
+            return None
+        if query == "*":
+            return self.elements
+        if query[0] == "#":
+            return self.ids.get(query[1:].encode("UTF-8").lower(), [])
+        if query[0] == ".":
+            return self.classes.get(query[1:].encode("UTF-8").lower(), [])
+        key = query.encode("UTF-8")
+        tag_id = lxb_tag_id_by_name_noi(parser.document.dom_document.tags, <const lxb_char_t *> key, len(key))
+        if tag_id == LXB_TAG__UNDEF:
+            return []
+        return self.tags.get(tag_id, [])
+
+
+cdef list _index_nodes(LexborHTMLParser parser, list addresses):
+    cdef list result = []
+    cdef object address
+
+    for address in addresses:
+        result.append(LexborNode.new(<lxb_dom_node_t *> <size_t> address, parser))
+    return result
+
+
+cdef _NodeIndex _parser_index(LexborHTMLParser parser):
+    """Return the up to date index of ``parser``, or ``None`` when it is disabled or can't be used."""
+    cdef _NodeIndex index = parser._index
+
+    if index is None or parser.document == NULL or parser._is_fragment:
+        return None
+    if parser._is_streaming:
+        # The tree builder doesn't report its changes, so the index is rebuilt afterwards.
+        index.built = False
+        return None
+    _install_mutation_hooks(parser)
+    if not index.built or index.version != parser._mutation_hooks.version:
+        index.build(<lxb_dom_node_t *> parser.document, parser._mutation_hooks.version)
+    return index
@@ -1,6 +1,9 @@
 cimport cython
-from cpython.exc cimport PyErr_SetNone
+from cpython.bytes cimport PyBytes_FromStringAndSize
+from cpython.unicode cimport PyUnicode_DecodeUTF8
 
+import codecs
+import io
 import logging
 
 logger = logging.getLogger("selectolax")
@@ -37,6 +40,21 @@ cdef class LexborNode:
 
     @staticmethod
     cdef LexborNode new(lxb_dom_node_t *node, LexborHTMLParser parser):
+        cdef LexborNode lxbnode
+        cdef object cached
+
+        if parser is None or parser._node_cache is None:
+            return LexborNode._wrap(node, parser)
+        cached = parser._node_cache.get(<size_t> node)
+        if cached is not None:
+            return <LexborNode> cached
+        lxbnode = LexborNode._wrap(node, parser)
+        parser._node_cache[<size_t> node] = lxbnode
+        return lxbnode
+
+    @staticmethod
+    cdef LexborNode _wrap(lxb_dom_node_t *node, LexborHTMLParser parser):
+        """Create a new wrapper, bypassing the node cache of the parser."""
         cdef LexborNode lxbnode = LexborNode.__new__(LexborNode)
         lxbnode.node = node
         lxbnode.parser = parser
@@ -108,22 +126,53 @@ cdef class LexborNode:
         -------
         text : str
         """
-        cdef lexbor_str_t *lxb_str
+        return self._serialize_html(LXB_HTML_SERIALIZE_OPT_UNDEF, 0, False, False)
+
+    @property
+    def html_bytes(self):
+        """Return UTF-8 encoded HTML representation of the current node including all its child nodes.
+
+        Same as ``html``, but skips decoding the serialized output.
+
+        Returns
+        -------
+        html : bytes
+        """
+        return self._serialize_html(LXB_HTML_SERIALIZE_OPT_UNDEF, 0, False, True)
+
+    def write_html(self, object fileobj):
+        """Write HTML representation of the current node including all its child nodes to a file object.
+
+        Unlike ``html``, the output is passed to ``fileobj.write`` in chunks while
+        the tree is serialized, so the whole string is never kept in memory.
+
+        Parameters
+        ----------
+        fileobj : object
+            Object with a ``write`` method, such as a file opened in binary mode.
+            Text streams (``io.TextIOBase``) receive ``str`` chunks, other objects
+            receive UTF-8 encoded ``bytes``.
+        """
+        cdef _HTMLWriter writer = _HTMLWriter(fileobj)
+        cdef lxb_dom_node_t *node = self.node
         cdef lxb_status_t status
-        lxb_str = lexbor_str_create()
+
         if self._is_fragment_root:
-            status = serialize_fragment(self.node, lxb_str)
-            # status = lxb_html_serialize_tree_str(self.node, lxb_str)
+            status = LXB_STATUS_OK
+            while node != NULL and status == LXB_STATUS_OK:
+                status = lxb_html_serialize_tree_cb(
+                    node, <lxb_html_serialize_cb_f> _write_html_callback, <void *> writer
+                )
+                node = node.next
         else:
-            status = lxb_html_serialize_tree_str(self.node, lxb_str)
-        if status == 0:
-            html = lxb_str.data.decode(_ENCODING).replace('<-undef>', '')
-            lexbor_str_destroy(lxb_str, self.node.owner_document.text, True)
-            return html
-        lexbor_str_destroy(lxb_str, self.node.owner_document.text, True)
-        return None
+            status = lxb_html_serialize_tree_cb(
+                node, <lxb_html_serialize_cb_f> _write_html_callback, <void *> writer
+            )
+        writer.finish(status)
 
-    cdef inline str _serialize_html(self, lxb_html_serialize_opt_t options, size_t indent, bint pretty):
+    cdef inline object _serialize_html(
+        self, lxb_html_serialize_opt_t options, size_t indent, bint pretty, bint as_bytes
+    ):
         cdef lexbor_str_t *lxb_str
         cdef lxb_status_t status
 
@@ -140,13 +189,15 @@ cdef class LexborNode:
                 status = lxb_html_serialize_tree_str(self.node, lxb_str)
 
         if status == 0:
-            html = lxb_str.data.decode(_ENCODING).replace('<-undef>', '')
+            html = _serialized_html(lxb_str, as_bytes)
             lexbor_str_destroy(lxb_str, self.node.owner_document.text, True)
             return html
         lexbor_str_destroy(lxb_str, self.node.owner_document.text, True)
         return None
 
-    cdef inline str _serialize_inner_html(self, lxb_html_serialize_opt_t options, size_t indent, bint pretty):
+    cdef inline object _serialize_inner_html(
+        self, lxb_html_serialize_opt_t options, size_t indent, bint pretty, bint as_bytes
+    ):
         cdef lexbor_str_t *lxb_str
         cdef lxb_status_t status
 
@@ -157,7 +208,7 @@ cdef class LexborNode:
             status = lxb_html_serialize_deep_str(self.node, lxb_str)
 
         if status == 0 and lxb_str.data:
-            html = lxb_str.data.decode(_ENCODING).replace('<-undef>', '')
+            html = _serialized_html(lxb_str, as_bytes)
             lexbor_str_destroy(lxb_str, self.node.owner_document.text, True)
             return html
         lexbor_str_destroy(lxb_str, self.node.owner_document.text, True)
@@ -211,7 +262,7 @@ cdef class LexborNode:
             full_doctype,
             html5test,
         )
-        return self._serialize_html(options, <size_t> indent, True)
+        return self._serialize_html(options, <size_t> indent, True, False)
 
     def inner_html_pretty(
         self,
@@ -261,10 +312,17 @@ cdef class LexborNode:
             full_doctype,
             html5test,
         )
-        return self._serialize_inner_html(options, <size_t> indent, True)
+        return self._serialize_inner_html(options, <size_t> indent, True, False)
 
     def __hash__(self):
-        return self.mem_id
+        """Hash the node structure, consistent with ``==``.
+
+        The hash changes when the subtree is modified, use ``mem_id`` to identify nodes.
+        """
+        cdef uint64_t result
+        if _node_run_hash(self.node, self._is_fragment_root, &result) == -1:
+            raise MemoryError()
+        return <Py_hash_t> result
 
     def text_lexbor(self):
         """Returns the text of the node including text of all its child nodes.
@@ -305,42 +363,49 @@ cdef class LexborNode:
             Combined textual content assembled according to the provided options.
 
         """
-        cdef unsigned char * text
+        return self._text(deep, separator, strip, skip_empty, False)
+
+    def text_bytes(self, bool deep=True, str separator='', bool strip=False, bool skip_empty=False):
+        """Return concatenated text from this node as UTF-8 encoded bytes.
+
+        Same as ``text``, but skips decoding the result.
+
+        Returns
+        -------
+        text : bytes
+        """
+        return self._text(deep, separator, strip, skip_empty, True)
+
+    cdef object _text(self, bint deep, str separator, bint strip, bint skip_empty, bint as_bytes):
         cdef LexborNode start_node = self._get_node()
         cdef lxb_dom_node_t * node = <lxb_dom_node_t *> start_node.node.first_child
-
-        if not deep:
-            container = TextContainer(separator, strip)
-            if _is_node_type(self.node, LXB_DOM_NODE_TYPE_TEXT):
-                text = <unsigned char *> lexbor_str_data_noi(&(<lxb_dom_character_data_t *> self.node).data)
-                if text != NULL:
-                    if not skip_empty or not self.is_empty_text_node:
-                        py_text = text.decode(_ENCODING)
-                        container.append(py_text)
-
-            while node != NULL:
-                if _is_node_type(node, LXB_DOM_NODE_TYPE_TEXT):
-                    text = <unsigned char *> lexbor_str_data_noi(&(<lxb_dom_character_data_t *> node).data)
-                    if text != NULL:
-                        if not skip_empty or not is_empty_text_node(node):
-                            py_text = text.decode(_ENCODING)
-                            container.append(py_text)
-                node = node.next
-            return container.text
-        else:
-            container = TextContainer(separator, strip)
+        cdef bytes separator_bytes = separator.encode(_ENCODING)
+        cdef _TextOptions options
+        cdef _ByteBuffer buffer
+        cdef bint ok = True
+
+        # Fragments are joined in a single UTF-8 buffer and decoded once.
+        _text_options_init(&options, separator_bytes, len(separator_bytes), strip, skip_empty)
+        _buffer_init(&buffer)
+        try:
             if _is_node_type(self.node, LXB_DOM_NODE_TYPE_TEXT):
-                text = <unsigned char *> lexbor_str_data_noi(&(<lxb_dom_character_data_t *> self.node).data)
-                if text != NULL:
-                    if not skip_empty or not self.is_empty_text_node:
-                        container.append(text.decode(_ENCODING))
-
-            lxb_dom_node_simple_walk(
-                <lxb_dom_node_t *> start_node.node,
-                <lxb_dom_node_simple_walker_f> text_callback,
-                <void *> container
-            )
-            return container.text
+                ok = _buffer_append_text_node(&buffer, self.node, &options)
+
+            if not deep:
+                while ok and node != NULL:
+                    if _is_node_type(node, LXB_DOM_NODE_TYPE_TEXT):
+                        ok = _buffer_append_text_node(&buffer, node, &options)
+                    node = node.next
+            elif ok:
+                ok = _buffer_append_text(&buffer, start_node.node, &options)
+
+            if not ok:
+                raise MemoryError()
+            if as_bytes:
+                return PyBytes_FromStringAndSize(buffer.data, buffer.length)
+            return PyUnicode_DecodeUTF8(buffer.data, buffer.length, "replace")
+        finally:
+            _buffer_free(&buffer)
 
     cdef inline LexborNode _get_node(self):
         cdef LexborNode node
@@ -350,7 +415,7 @@ cdef class LexborNode:
             node = self
         return node
 
-    def css(self, str query):
+    def css(self, object query):
         """Evaluate CSS selector against current node and its child nodes.
 
         Matches pattern `query` against HTML tree.
@@ -364,8 +429,9 @@ cdef class LexborNode:
 
         Parameters
         ----------
-        query : str
+        query : str or LexborCompiledSelector
             CSS selector (e.g. "div > :nth-child(2n+1):not(:has(a))").
+            A selector created by ``compile_selector`` skips parsing.
 
         Returns
         -------
@@ -373,7 +439,130 @@ cdef class LexborNode:
         """
         return self.parser.selector.find(query, self._get_node())
 
-    def css_first(self, str query, default=None, bool strict=False):
+    def css_many(self, dict queries):
+        """Evaluate several CSS selectors in a single pass over the tree.
+
+        Equivalent to calling ``css`` for every selector, but the tree is walked only once
+        and every element is matched against all selectors at the same time.
+
+        Parameters
+        ----------
+        queries : dict
+            Mapping of names to CSS selectors (``str`` or ``LexborCompiledSelector``).
+
+        Returns
+        -------
+        matches : dict
+            Mapping of the same names to lists of matching `LexborNode` objects in document order.
+
+        Examples
+        --------
+
+        >>> tree = LexborHTMLParser("<title>Hi</title><a href='/'>Home</a>")
+        >>> tree.root.css_many({"title": "title", "links": "a[href]"})
+        {'title': [<LexborNode title>], 'links': [<LexborNode a>]}
+        """
+        return self.parser.selector.find_many(queries, self._get_node())
+
+    def extract_columns(self, object query, attrs=(), bint text=False):
+        """Extract attribute values and text of matching nodes into Arrow-compatible buffers.
+
+        Values of all nodes matching ``query`` are written into one contiguous UTF-8
+        buffer per column, without creating a ``LexborNode`` per match or a ``str`` per value.
+        Each column has the layout of an Arrow ``string`` array and can be loaded with
+        ``pyarrow.Array.from_buffers(pyarrow.string(), len(offsets) // 4 - 1,
+        [validity and pyarrow.py_buffer(validity), pyarrow.py_buffer(offsets), pyarrow.py_buffer(data)])``.
+
+        Parameters
+        ----------
+        query : str or LexborCompiledSelector
+            CSS selector of the rows.
+        attrs : sequence of str, optional
+            Attribute names to extract, one column each.
+        text : bool, optional
+            Add a ``"text"`` column with the text content of the matched nodes. Defaults to ``False``.
+
+        Returns
+        -------
+        dict
+            Mapping of column names to ``(data, offsets, validity)`` tuples of ``bytes``.
+            ``offsets`` holds native-endian int32 values, one more than the number of rows,
+            and row ``i`` is ``data[offsets[i]:offsets[i + 1]]``. ``validity`` is a bitmap with
+            one bit per row, least significant bit first, and marks rows where the attribute
+            is missing with 0. It is ``None`` when no value is missing.
+
+        Raises
+        ------
+        OverflowError
+            If a column is larger than 2 GiB.
+
+        Examples
+        --------
+
+        >>> tree = LexborHTMLParser("<a href='/'>Home</a><a>Empty</a>")
+        >>> columns = tree.extract_columns("a", attrs=["href"], text=True)
+        >>> data, offsets, validity = columns["href"]
+        >>> data, array.array("i", offsets), validity
+        (b'/', array('i', [0, 1, 1]), b'\\x01')
+        """
+        return _extract_columns(self._get_node(), query, attrs, text)
+
+    def css_attr(self, object query, str name):
+        """Return the value of an attribute for every node matching ``query``.
+
+        Equivalent to ``[node.attrs.get(name) for node in self.css(query)]``, but values
+        are read during the selector walk, without creating a ``LexborNode`` per match.
+
+        Parameters
+        ----------
+        query : str or LexborCompiledSelector
+            CSS selector.
+        name : str
+            Attribute name.
+
+        Returns
+        -------
+        list of str or None
+            Values in document order. Like ``attrs.get``, missing attributes
+            and attributes without a value give ``None``.
+
+        Examples
+        --------
+
+        >>> tree = LexborHTMLParser("<a href='/'>Home</a><a href='/about'>About</a>")
+        >>> tree.css_attr("a[href]", "href")
+        ['/', '/about']
+        """
+        return _css_attrs(self._get_node(), query, name, True)
+
+    def css_attrs(self, object query, names):
+        """Return the values of several attributes for every node matching ``query``.
+
+        Like ``css_attr``, but reads all ``names`` during the same selector walk.
+
+        Parameters
+        ----------
+        query : str or LexborCompiledSelector
+            CSS selector.
+        names : sequence of str
+            Attribute names.
+
+        Returns
+        -------
+        list of tuple
+            A tuple of values per match, in document order, with one item per name.
+            Missing attributes and attributes without a value give ``None``.
+
+        Examples
+        --------
+
+        >>> tree = LexborHTMLParser("<a href='/' rel='home'>Home</a><a href='/about'>About</a>")
+        >>> tree.css_attrs("a", ["href", "rel"])
+        [('/', 'home'), ('/about', None)]
+        """
+        return _css_attrs(self._get_node(), query, names, False)
+
+    def css_first(self, object query, default=None, bool strict=False):
         """Same as `css` but returns only the first match.
 
         When `strict=False` stops at the first match. Works faster.
@@ -381,7 +570,7 @@ cdef class LexborNode:
         Parameters
         ----------
 
-        query : str
+        query : str or LexborCompiledSelector
         default : Any, default None
             Default value to return if there is no match.
         strict: bool, default False
@@ -410,7 +599,7 @@ cdef class LexborNode:
                 return True
         return False
 
-    def css_matches(self, str selector):
+    def css_matches(self, object selector):
         """Returns True if CSS selector matches a node."""
         return bool(self.parser.selector.any_matches(selector, self))
 
@@ -465,6 +654,7 @@ cdef class LexborNode:
         >>>     tag.decompose()
 
         """
+        self.parser._check_mutable()
         if self.node == <lxb_dom_node_t *> lxb_dom_document_root(&self.parser.document.dom_document):
             raise SelectolaxError("Decomposing the root node is not allowed.")
 
@@ -494,9 +684,17 @@ cdef class LexborNode:
 
         """
         cdef LexborNode element
-        for tag in tags:
-            for element in self.css(tag):
-                element.decompose(recursive=recursive)
+        cdef LexborNode root
+
+        self.parser._check_mutable()
+        if not _is_tag_names(tags):
+            for tag in tags:
+                for element in self.css(tag):
+                    element.decompose(recursive=recursive)
+            return
+
+        root = self._get_node()
+        _strip_tags(root.node, root is self, tags, recursive)
 
     @property
     def attributes(self):
@@ -651,6 +849,7 @@ cdef class LexborNode:
 
         Note: by default, empty tags are ignored, use "delete_empty" to change this.
         """
+        self.parser._check_mutable()
         if self.node.parent == NULL:
             return
 
@@ -658,20 +857,7 @@ cdef class LexborNode:
             logger.error("Attempt to unwrap removed node. Does nothing.")
             return
 
-        cdef lxb_dom_node_t * current_node = self.node.first_child
-        cdef lxb_dom_node_t * next_node
-
-        if current_node == NULL:
-            if delete_empty:
-                lxb_dom_node_remove(<lxb_dom_node_t *> self.node)
-            return
-
-        while current_node != NULL:
-            next_node = current_node.next
-            lxb_dom_node_insert_before(self.node, current_node)
-            current_node = next_node
-
-        lxb_dom_node_remove(<lxb_dom_node_t *> self.node)
+        _unwrap_node(self.node, delete_empty)
 
     def unwrap_tags(self, list tags, bint delete_empty = False):
         """Unwraps specified tags from the HTML tree.
@@ -696,11 +882,21 @@ cdef class LexborNode:
         Note: by default, empty tags are ignored, use "delete_empty" to change this.
         """
         cdef LexborNode element
-        for tag in tags:
-            if self.node.parent == NULL and not _is_node_type(self.node, LXB_DOM_NODE_TYPE_DOCUMENT):
-                break
-            for element in self.css(tag):
-                element.unwrap(delete_empty)
+        cdef LexborNode root
+
+        self.parser._check_mutable()
+        if not _is_tag_names(tags):
+            for tag in tags:
+                if self.node.parent == NULL and not _is_node_type(self.node, LXB_DOM_NODE_TYPE_DOCUMENT):
+                    break
+                for element in self.css(tag):
+                    element.unwrap(delete_empty)
+            return
+
+        if self.node.parent == NULL and not _is_node_type(self.node, LXB_DOM_NODE_TYPE_DOCUMENT):
+            return
+        root = self._get_node()
+        _unwrap_tags(root.node, root is self, tags, delete_empty)
 
     def merge_text_nodes(self):
         """Iterates over all text nodes and merges all text nodes that are close to each other.
@@ -720,6 +916,7 @@ cdef class LexborNode:
         >>> tree.text(deep=True, separator=" ", strip=True)
         "John Doe"
         """
+        self.parser._check_mutable()
         _merge_text_nodes(self.node)
 
     def traverse(self, bool include_text = False, bool skip_empty = False):
@@ -760,6 +957,37 @@ cdef class LexborNode:
                     break
                 node = node.next
 
+    def traverse_tags(self, bool include_text = False, bool skip_empty = False):
+        """Depth-first traversal that yields tag ids and depths instead of nodes.
+
+        Works like ``traverse``, but does not create a ``LexborNode`` per visited node,
+        which makes walks over large documents considerably faster.
+
+        Parameters
+        ----------
+        include_text : bool, optional
+            When ``True``, include text nodes in the traversal sequence. Defaults
+            to ``False``.
+        skip_empty : bool, optional
+            Skip text nodes that contain only ASCII whitespace (space, tab,
+            newline, form feed or carriage return) when ``include_text`` is
+            ``True``. Defaults to ``False``.
+
+        Returns
+        -------
+        iterator of tuple[int, int]
+            ``(tag_id, depth)`` tuples in the same order as ``traverse``. The
+            current node has depth ``0``, its children have depth ``1`` and so on.
+
+        Examples
+        --------
+
+        >>> tree = LexborHTMLParser("<div><p>Hi</p></div>")
+        >>> list(tree.css_first("div").traverse_tags())
+        [(51, 0), (145, 1)]
+        """
+        return _TagTraversal.new(self, include_text, skip_empty)
+
     def replace_with(self, str_or_LexborNode value):
         """Replace current Node with specified value.
 
@@ -789,6 +1017,7 @@ cdef class LexborNode:
         """
         cdef lxb_dom_node_t * new_node
 
+        self.parser._check_mutable()
         if isinstance(value, (str, bytes, unicode)):
             bytes_val = to_bytes(value)
             new_node = <lxb_dom_node_t *> lxb_dom_document_create_text_node(
@@ -842,6 +1071,7 @@ cdef class LexborNode:
         """
         cdef lxb_dom_node_t * new_node
 
+        self.parser._check_mutable()
         if isinstance(value, (str, bytes, unicode)):
             bytes_val = to_bytes(value)
             new_node = <lxb_dom_node_t *> lxb_dom_document_create_text_node(
@@ -893,6 +1123,7 @@ cdef class LexborNode:
         """
         cdef lxb_dom_node_t * new_node
 
+        self.parser._check_mutable()
         if isinstance(value, (str, bytes, unicode)):
             bytes_val = to_bytes(value)
             new_node = <lxb_dom_node_t *> lxb_dom_document_create_text_node(
@@ -944,6 +1175,7 @@ cdef class LexborNode:
         """
         cdef lxb_dom_node_t * new_node
 
+        self.parser._check_mutable()
         if isinstance(value, (str, bytes, unicode)):
             bytes_val = to_bytes(value)
             new_node = <lxb_dom_node_t *> lxb_dom_document_create_text_node(
@@ -991,7 +1223,7 @@ cdef class LexborNode:
     def scripts_contain(self, str query):
         """Returns True if any of the script tags contain specified text.
 
-        Caches script tags on the first call to improve performance.
+        Script contents of the whole document are cached until the document is modified.
 
         Parameters
         ----------
@@ -999,42 +1231,63 @@ cdef class LexborNode:
             The query to check.
 
         """
-        cdef LexborNode node
-        if self.parser.cached_script_texts is None:
-            nodes = self.parser.selector.find('script', self)
-            text_nodes = []
-            for node in nodes:
-                node_text = node.text(deep=True)
-                if node_text:
-                    text_nodes.append(node_text)
-            self.parser.cached_script_texts = text_nodes
-
-        for text in self.parser.cached_script_texts:
-            if query in text:
+        cdef bytes query_bytes = query.encode(_ENCODING)
+        cdef bytes text
+
+        for text in _raw_texts(self, LXB_TAG_SCRIPT):
+            if query_bytes in text:
                 return True
         return False
 
+    def scripts_contain_any(self, tuple patterns):
+        """Returns True if any of the script tags contain one of the patterns.
+
+        All patterns are searched in a single pass over every script,
+        which is much faster than calling ``scripts_contain`` for each of them.
+        Script contents of the whole document are cached until the document is modified.
+
+        Parameters
+        ----------
+        patterns : tuple of str
+            Strings to look for, such as signatures of tracking scripts.
+
+        Examples
+        --------
+
+        >>> tree = LexborHTMLParser("<script>gtag('config', 'G-1');</script>")
+        >>> tree.scripts_contain_any(("fbq(", "gtag("))
+        True
+        """
+        return _raw_texts_contain_any(self, patterns, ("script",))
+
+    def raw_text_contains_any(self, tuple patterns, tags=("script", "style")):
+        """Returns True if the text of any of the ``tags`` elements contains one of the patterns.
+
+        Works like ``scripts_contain_any`` for other elements with raw content,
+        such as ``style``, ``noscript``, ``title`` or ``textarea``.
+        Element contents of the whole document are cached until the document is modified.
+
+        Parameters
+        ----------
+        patterns : tuple of str
+            Strings to look for.
+        tags : str or iterable of str, default ("script", "style")
+            Names of the elements to search in.
+
+        """
+        return _raw_texts_contain_any(self, patterns, tags)
+
     def script_srcs_contain(self, tuple queries):
         """Returns True if any of the script SRCs attributes contain on of the specified text.
 
-        Caches values on the first call to improve performance.
+        Values of the whole document are cached until the document is modified.
 
         Parameters
         ----------
         queries : tuple of str
 
         """
-        cdef LexborNode node
-        if self.parser.cached_script_srcs is None:
-            nodes = self.parser.selector.find('script', self)
-            src_nodes = []
-            for node in nodes:
-                node_src = node.attrs.get('src')
-                if node_src:
-                    src_nodes.append(node_src)
-            self.parser.cached_script_srcs = src_nodes
-
-        for text in self.parser.cached_script_srcs:
+        for text in _script_srcs(self):
             for query in queries:
                 if query in text:
                     return True
@@ -1061,11 +1314,85 @@ cdef class LexborNode:
         return LexborSelector(self._get_node(), query)
 
     def __eq__(self, other):
+        """Compare nodes by structure: tags, attributes, text and children.
+
+        Strings are compared with the HTML representation of the node.
+        """
+        cdef LexborNode other_node
         if isinstance(other, str):
             return self.html == other
         if not isinstance(other, LexborNode):
             return False
-        return self.html == other.html
+        other_node = <LexborNode> other
+        return _node_runs_equal(self.node, self._is_fragment_root, other_node.node, other_node._is_fragment_root)
+
+    def content_hash(self):
+        """Return a 64-bit hash of the node structure: tags, attributes, text and children.
+
+        Structurally equal nodes have equal hashes, even across documents.
+        The hash is computed from the tree directly, without serializing it to HTML.
+
+        Returns
+        -------
+        hash : int
+        """
+        cdef uint64_t result
+        if _node_run_hash(self.node, self._is_fragment_root, &result) == -1:
+            raise MemoryError()
+        return result
+
+    def subtree_hashes(self, Py_ssize_t min_size = 0):
+        """Return content hashes of the current node and all its descendant elements.
+
+        All hashes are computed in one bottom-up pass over the tree, every element
+        hash is derived from the hashes of its children. Use it to find repeated
+        blocks such as navigation bars and footers across pages.
+
+        Parameters
+        ----------
+        min_size : int, optional
+            Skip elements with fewer than ``min_size`` characters of text. Defaults to ``0``.
+
+        Returns
+        -------
+        list of tuple[LexborNode, int, int]
+            ``(node, hash, text_len)`` tuples in document order. ``hash`` equals
+            ``node.content_hash()`` and ``text_len`` equals ``len(node.text())``.
+
+        Examples
+        --------
+
+        >>> tree = LexborHTMLParser("<div><p>Hi</p><p>Hi</p></div>")
+        >>> [(node.tag, text_len) for node, _, text_len in tree.body.subtree_hashes(min_size=1)]
+        [('body', 4), ('div', 4), ('p', 2), ('p', 2)]
+        """
+        cdef lxb_dom_node_t *node = self.node
+        cdef bint run = self._is_fragment_root
+        cdef _ByteBuffer records
+        cdef _SubtreeHashRecord *record
+        cdef uint64_t subtree_hash
+        cdef Py_ssize_t i
+        cdef int status = 0
+        cdef list result = []
+
+        _buffer_init(&records)
+        try:
+            with nogil:
+                while node != NULL and status == 0:
+                    status = _hash_subtrees(node, &subtree_hash, &records)
+                    node = node.next if run else NULL
+            if status == -1:
+                raise MemoryError()
+
+            record = <_SubtreeHashRecord *> records.data
+            for i in range(<Py_ssize_t> (records.length // sizeof(_SubtreeHashRecord))):
+                if <Py_ssize_t> record[i].text_len >= min_size:
+                    result.append(
+                        (LexborNode.new(record[i].node, self.parser), record[i].hash, record[i].text_len)
+                    )
+        finally:
+            _buffer_free(&records)
+        return result
 
     @property
     def text_content(self):
@@ -1079,17 +1406,12 @@ cdef class LexborNode:
         text : str or None.
         """
         cdef unsigned char * text
-        cdef lxb_dom_node_t * node = <lxb_dom_node_t *> self.node.first_child
-        cdef TextContainer container
         if not _is_node_type(self.node, LXB_DOM_NODE_TYPE_TEXT):
             return None
 
         text = <unsigned char *> lexbor_str_data_noi(&(<lxb_dom_character_data_t *> self.node).data)
         if text != NULL:
-            container = TextContainer.new_with_defaults()
-            py_text = text.decode(_ENCODING)
-            container.append(py_text)
-            return container.text
+            return text.decode(_ENCODING)
         return None
 
     @property
@@ -1130,7 +1452,7 @@ cdef class LexborNode:
         text : str | None
         """
 
-        return self._serialize_inner_html(LXB_HTML_SERIALIZE_OPT_UNDEF, 0, False)
+        return self._serialize_inner_html(LXB_HTML_SERIALIZE_OPT_UNDEF, 0, False, False)
 
     @inner_html.setter
     def inner_html(self, str html) -> None:
@@ -1145,12 +1467,29 @@ cdef class LexborNode:
 
         """
         cdef bytes bytes_val
+        self.parser._check_mutable()
         bytes_val = <bytes> html.encode("utf-8")
+        # Lexbor destroys the current children, so their addresses can be reused by new nodes.
+        _forget_descendants(self.parser, self.node)
+        # Destroying nodes is not reported to the mutation hooks, only the insertions are.
+        self.parser._mutation_hooks.version += 1
         lxb_html_element_inner_html_set(
             <lxb_html_element_t *> self.node,
             <lxb_char_t *> bytes_val, len(bytes_val)
         )
 
+    @property
+    def inner_html_bytes(self) -> bytes | None:
+        """Return UTF-8 encoded HTML representation of the child nodes.
+
+        Same as ``inner_html``, but skips decoding the serialized output.
+
+        Returns
+        -------
+        html : bytes | None
+        """
+        return self._serialize_inner_html(LXB_HTML_SERIALIZE_OPT_UNDEF, 0, False, True)
+
     def clone(self) -> LexborNode:
         """Clone the current node.
 
@@ -1197,57 +1536,153 @@ cdef class LexborNode:
         return is_empty_text_node(self.node)
 
 
-@cython.internal
 @cython.final
-cdef class TextContainer:
-    cdef list _parts
-    cdef str separator
-    cdef bint strip
+cdef class _TagTraversal:
+    """Iterator behind ``LexborNode.traverse_tags``."""
+    # Keeps the document alive while the walk holds raw node pointers.
+    cdef LexborHTMLParser parser
+    cdef lxb_dom_node_t *root
+    cdef lxb_dom_node_t *node
+    cdef Py_ssize_t depth
+    cdef bint include_text
+    cdef bint skip_empty
 
     @staticmethod
-    cdef TextContainer new_with_defaults():
-        cdef TextContainer cls = TextContainer.__new__(TextContainer)
-        cls._parts = []
-        cls.separator = ''
-        cls.strip = False
-        return cls
-
-    def __init__(self, str separator = '', bool strip = False):
-        self._parts = []
-        self.separator = separator
-        self.strip = strip
-
-    def append(self, str node_text):
-        if self.strip:
-            self._parts.append(node_text.strip())
-        else:
-            self._parts.append(node_text)
+    cdef _TagTraversal new(LexborNode start, bint include_text, bint skip_empty):
+        cdef _TagTraversal traversal = _TagTraversal.__new__(_TagTraversal)
+        traversal.parser = start.parser
+        traversal.root = start.node
+        traversal.node = start.node
+        traversal.depth = 0
+        traversal.include_text = include_text
+        traversal.skip_empty = skip_empty
+        return traversal
 
-    @property
-    def text(self):
-        return self.separator.join(self._parts)
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        cdef lxb_dom_node_t *node
+        cdef Py_ssize_t depth
+
+        while self.node != NULL:
+            node = self.node
+            depth = self.depth
+            self._advance()
+            if self.include_text or node.type != LXB_DOM_NODE_TYPE_TEXT:
+                if not self.skip_empty or not is_empty_text_node(node):
+                    return lxb_dom_node_tag_id_noi(node), depth
+        raise StopIteration
+
+    cdef inline void _advance(self):
+        cdef lxb_dom_node_t *node = self.node
+
+        if node.first_child != NULL:
+            self.node = node.first_child
+            self.depth += 1
+            return
+        while node != self.root and node.next == NULL:
+            node = node.parent
+            self.depth -= 1
+        self.node = NULL if node == self.root else node.next
 
-cdef lexbor_action_t text_callback(lxb_dom_node_t *node, void *ctx):
-    cdef unsigned char *text
-    cdef lxb_tag_id_t tag_id = lxb_dom_node_tag_id_noi(node)
-    if tag_id != LXB_TAG__TEXT:
-        return LEXBOR_ACTION_OK
 
-    text = <unsigned char *> lexbor_str_data_noi(&(<lxb_dom_text_t *> node).char_data.data)
-    if not text:
-        return LEXBOR_ACTION_OK
+cdef void _forget_descendants(LexborHTMLParser parser, lxb_dom_node_t *root):
+    """Drop the cached wrappers of all descendants of ``root``."""
+    cdef lxb_dom_node_t *node = root.first_child
 
-    try:
-        py_str = text.decode(_ENCODING, "replace")
+    if parser is None or parser._node_cache is None or not parser._node_cache:
+        return
+    while node != NULL:
+        parser._node_cache.pop(<size_t> node, None)
+        if node.first_child != NULL:
+            node = node.first_child
+            continue
+        while node != root and node.next == NULL:
+            node = node.parent
+        if node == root:
+            break
+        node = node.next
+
+
+cdef inline object _serialized_html(lexbor_str_t *lxb_str, bint as_bytes):
+    if as_bytes:
+        return PyBytes_FromStringAndSize(<char *> lxb_str.data, lxb_str.length)
+    return PyUnicode_DecodeUTF8(<char *> lxb_str.data, lxb_str.length, NULL)
 
-    except Exception as e:
-        PyErr_SetNone(e)
-        return LEXBOR_ACTION_STOP
 
-    cdef TextContainer cls
-    cls = <TextContainer> ctx
-    cls.append(py_str)
-    return LEXBOR_ACTION_OK
+cdef enum:
+    _WRITE_HTML_CHUNK_SIZE = 65536
+
+
+@cython.final
+cdef class _HTMLWriter:
+    """Collects the serializer output and passes it to ``fileobj.write`` in chunks."""
+    cdef object write
+    cdef object decoder
+    cdef object error
+    cdef _ByteBuffer buffer
+
+    def __cinit__(self, object fileobj):
+        self.write = fileobj.write
+        # Text streams such as sys.stdout don't accept bytes.
+        self.decoder = codecs.getincrementaldecoder(_ENCODING)() if isinstance(fileobj, io.TextIOBase) else None
+        self.error = None
+        _buffer_init(&self.buffer)
+
+    def __dealloc__(self):
+        _buffer_free(&self.buffer)
+
+    cdef int write_chunk(self, const char *data, size_t length, bint final) except -1:
+        chunk = PyBytes_FromStringAndSize(data, length)
+        if self.decoder is not None:
+            chunk = self.decoder.decode(chunk, final)
+        if chunk:
+            self.write(chunk)
+        return 0
+
+    cdef int flush(self, bint final) except -1:
+        cdef size_t length = self.buffer.length
+
+        self.buffer.length = 0
+        return self.write_chunk(self.buffer.data, length, final)
+
+    cdef int append(self, const char *data, size_t length) except -1:
+        """Buffer ``data``, keeping every write within ``_WRITE_HTML_CHUNK_SIZE`` bytes."""
+        cdef size_t size
+
+        if self.buffer.length + length > _WRITE_HTML_CHUNK_SIZE and self.buffer.length > 0:
+            self.flush(False)
+        # Large pieces, such as a long text node, are written in slices.
+        while length > _WRITE_HTML_CHUNK_SIZE:
+            size = _WRITE_HTML_CHUNK_SIZE
+            self.write_chunk(data, size, False)
+            data += size
+            length -= size
+        if not _buffer_append(&self.buffer, data, length):
+            raise MemoryError()
+        if self.buffer.length == _WRITE_HTML_CHUNK_SIZE:
+            self.flush(False)
+        return 0
+
+    cdef int finish(self, lxb_status_t status) except -1:
+        if self.error is not None:
+            raise self.error
+        if status != LXB_STATUS_OK:
+            raise SelectolaxError("Can't serialize HTML: %s" % status)
+        return self.flush(True)
+
+
+cdef lxb_status_t _write_html_callback(const lxb_char_t *data, size_t length, void *ctx) noexcept:
+    cdef _HTMLWriter writer = <_HTMLWriter> ctx
+
+    try:
+        writer.append(<const char *> data, length)
+    except BaseException as e:
+        writer.error = e
+        return LXB_STATUS_ERROR
+    return LXB_STATUS_OK
+
 
 cdef lxb_status_t serialize_fragment(lxb_dom_node_t *node, lexbor_str_t *lxb_str):
     cdef lxb_status_t status
@@ -1310,46 +1745,62 @@ cdef inline lxb_html_serialize_opt_t _html_pretty_options(
 cdef inline bint _is_node_type(lxb_dom_node_t *node, lxb_dom_node_type_t expected_type):
     return node != NULL and node.type == expected_type
 
-cdef void _merge_text_nodes(lxb_dom_node_t *root):
-    if root == NULL or node_is_removed(root):
-        return
+cdef lxb_dom_node_t * _merge_text_run(lxb_dom_node_t *first, _ByteBuffer *buffer) noexcept:
+    """Replace ``first`` and the text nodes that directly follow it with a single text node.
 
-    cdef lxb_dom_node_t *node
+    Returns the new node, or NULL when out of memory.
+    """
+    cdef lxb_dom_node_t *node = first
     cdef lxb_dom_node_t *next_node
-    cdef lxb_dom_text_t *new_text_node
-    cdef lxb_char_t *left_text
-    cdef lxb_char_t *right_text
-    cdef size_t left_length, right_length
-    cdef bytes combined
-
-    cdef bint changed = 1
-    while changed:
-        changed = 0
-        node = root.first_child
-        while node != NULL:
-            next_node = node.next
-            if node.type == LXB_DOM_NODE_TYPE_TEXT and next_node != NULL and next_node.type == LXB_DOM_NODE_TYPE_TEXT:
-                left_text = lxb_dom_node_text_content(node, &left_length)
-                right_text = lxb_dom_node_text_content(next_node, &right_length)
-
-                if left_text != NULL and right_text != NULL:
-                    combined = (<bytes>left_text[:left_length]) + (<bytes>right_text[:right_length])
-                    new_text_node = lxb_dom_document_create_text_node(
-                        root.owner_document,
-                        <lxb_char_t *>combined,
-                        len(combined)
-                    )
-                    if new_text_node != NULL:
-                        lxb_dom_node_insert_before(node, <lxb_dom_node_t *>new_text_node)
-                        lxb_dom_node_remove(node)
-                        lxb_dom_node_remove(next_node)
-                        changed = 1
-                        break
+    cdef lexbor_str_t *data
+    cdef lxb_dom_text_t *text_node
+
+    buffer.length = 0
+    while node != NULL and node.type == LXB_DOM_NODE_TYPE_TEXT:
+        data = &(<lxb_dom_character_data_t *> node).data
+        if data.data != NULL and not _buffer_append(buffer, <const char *> data.data, data.length):
+            return NULL
+        node = node.next
 
-            node = next_node
+    # Make sure lexbor gets a valid pointer even when the whole run is empty.
+    if not _buffer_reserve(buffer, 1):
+        return NULL
+    text_node = lxb_dom_document_create_text_node(
+        first.owner_document, <const lxb_char_t *> buffer.data, buffer.length
+    )
+    if text_node == NULL:
+        return NULL
+    lxb_dom_node_insert_before(first, <lxb_dom_node_t *> text_node)
+
+    node = first
+    while node != NULL and node.type == LXB_DOM_NODE_TYPE_TEXT:
+        next_node = node.next
+        lxb_dom_node_remove(node)
+        node = next_node
+    return <lxb_dom_node_t *> text_node
+
+
+cdef int _merge_text_nodes(lxb_dom_node_t *root) except -1:
+    """Merge every run of adjacent text nodes below ``root`` during a single walk."""
+    cdef _ByteBuffer buffer
+    cdef lxb_dom_node_t *node
 
-    node = root.first_child
-    while node != NULL:
-        if node.type == LXB_DOM_NODE_TYPE_ELEMENT and node.first_child:
-            _merge_text_nodes(node)
-        node = node.next
+    if root == NULL or node_is_removed(root):
+        return 0
+
+    _buffer_init(&buffer)
+    try:
+        node = root.first_child
+        while node != NULL:
+            if (node.type == LXB_DOM_NODE_TYPE_TEXT and node.next != NULL
+                    and node.next.type == LXB_DOM_NODE_TYPE_TEXT):
+                node = _merge_text_run(node, &buffer)
+                if node == NULL:
+                    raise MemoryError()
+            elif node.type == LXB_DOM_NODE_TYPE_ELEMENT and node.first_child != NULL:
+                node = node.first_child
+                continue
+            node = _next_skipping_children(node, root)
+    finally:
+        _buffer_free(&buffer)
+    return 0
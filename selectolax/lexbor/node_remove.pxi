@@ -1,3 +1,6 @@
+from cpython.mem cimport PyMem_Free, PyMem_Malloc
+
+
 
 cdef lxb_dom_node_t * node_remove_deep(lxb_dom_node_t* root):
     cdef lxb_dom_node_t *tmp
@@ -27,3 +30,151 @@ cdef bint node_is_removed(lxb_dom_node_t* node):
        and node.prev == NULL:
         return 1
     return 0
+
+
+ctypedef struct _TagSet:
+    # -1 when every element matches, otherwise the number of valid tag_ids.
+    Py_ssize_t count
+    lxb_tag_id_t *tag_ids
+
+
+cdef int _tag_set_init(_TagSet *tag_set, lxb_dom_document_t *document, list tags) except -1:
+    """Resolve tag names to tag ids once. ``tag_set.tag_ids`` must be freed by the caller."""
+    cdef bytes name
+    cdef lxb_tag_id_t tag_id
+
+    tag_set.count = 0
+    tag_set.tag_ids = <lxb_tag_id_t *> PyMem_Malloc(max(len(tags), 1) * sizeof(lxb_tag_id_t))
+    if tag_set.tag_ids == NULL:
+        raise MemoryError()
+    for tag in tags:
+        if not isinstance(tag, str):
+            raise TypeError("Expected a tag name, got %s" % type(tag))
+        if tag == "*":
+            tag_set.count = -1
+            continue
+        name = (<str> tag).lower().encode(_ENCODING)
+        tag_id = lxb_tag_id_by_name_noi(document.tags, <const lxb_char_t *> name, len(name))
+        # Unknown tags can't be present in the document.
+        if tag_id != LXB_TAG__UNDEF and tag_set.count != -1:
+            tag_set.tag_ids[tag_set.count] = tag_id
+            tag_set.count += 1
+    return 0
+
+
+cdef inline bint _tag_set_contains(const _TagSet *tag_set, lxb_dom_node_t *node) noexcept nogil:
+    cdef Py_ssize_t i
+
+    if node.type != LXB_DOM_NODE_TYPE_ELEMENT:
+        return False
+    if tag_set.count == -1:
+        return True
+    for i in range(tag_set.count):
+        if tag_set.tag_ids[i] == node.local_name:
+            return True
+    return False
+
+
+cdef inline lxb_dom_node_t * _next_skipping_children(lxb_dom_node_t *node, lxb_dom_node_t *root) noexcept nogil:
+    """Return the node that follows ``node`` and its descendants in document order, up to ``root``."""
+    while node != root and node.next == NULL:
+        node = node.parent
+    return NULL if node == root else node.next
+
+
+cdef bint _is_tag_names(list tags):
+    """Whether every item is a plain tag name rather than a more complex CSS selector."""
+    for tag in tags:
+        if not isinstance(tag, str) or not tag:
+            return False
+        if tag != "*" and not (tag.isascii() and tag[0].isalpha() and tag.replace("-", "").isalnum()):
+            return False
+    return True
+
+
+cdef int _strip_tags(lxb_dom_node_t *root, bint include_root, list tags, bint recursive) except -1:
+    """Remove the elements named in ``tags`` below ``root`` in a single pass.
+
+    Raises ``SelectolaxError`` before changing anything if the document root element would be removed.
+    """
+    cdef _TagSet tag_set
+    cdef lxb_dom_node_t *node
+    cdef lxb_dom_node_t *next_node
+
+    tag_set.tag_ids = NULL
+    try:
+        _tag_set_init(&tag_set, root.owner_document, tags)
+        if include_root and _tag_set_contains(&tag_set, root):
+            if root == <lxb_dom_node_t *> lxb_dom_document_root(root.owner_document):
+                raise SelectolaxError("Decomposing the root node is not allowed.")
+            if recursive:
+                node_remove_deep(root)
+            else:
+                lxb_dom_node_remove(root)
+            return 0
+
+        node = root.first_child
+        while node != NULL:
+            if _tag_set_contains(&tag_set, node):
+                next_node = _next_skipping_children(node, root)
+                if recursive:
+                    node_remove_deep(node)
+                else:
+                    lxb_dom_node_remove(node)
+                node = next_node
+            elif node.first_child != NULL:
+                node = node.first_child
+            else:
+                node = _next_skipping_children(node, root)
+    finally:
+        PyMem_Free(tag_set.tag_ids)
+    return 0
+
+
+cdef void _unwrap_node(lxb_dom_node_t *node, bint delete_empty) noexcept:
+    cdef lxb_dom_node_t *current_node = node.first_child
+    cdef lxb_dom_node_t *next_node
+
+    if current_node == NULL:
+        if delete_empty:
+            lxb_dom_node_remove(node)
+        return
+
+    while current_node != NULL:
+        next_node = current_node.next
+        lxb_dom_node_insert_before(node, current_node)
+        current_node = next_node
+    lxb_dom_node_remove(node)
+
+
+cdef int _unwrap_tags(lxb_dom_node_t *root, bint include_root, list tags, bint delete_empty) except -1:
+    """Unwrap the elements named in ``tags`` below ``root``, collected in a single pass."""
+    cdef _TagSet tag_set
+    cdef _ByteBuffer matches
+    cdef lxb_dom_node_t **nodes
+    cdef lxb_dom_node_t *node
+    cdef size_t i
+
+    tag_set.tag_ids = NULL
+    _buffer_init(&matches)
+    try:
+        _tag_set_init(&tag_set, root.owner_document, tags)
+        # Unwrapping moves nodes around, so all matches are collected before the tree is changed.
+        node = root if include_root else root.first_child
+        while node != NULL:
+            if _tag_set_contains(&tag_set, node):
+                if not _buffer_append(&matches, <const char *> &node, sizeof(lxb_dom_node_t *)):
+                    raise MemoryError()
+            if node.first_child != NULL:
+                node = node.first_child
+            else:
+                node = _next_skipping_children(node, root)
+
+        nodes = <lxb_dom_node_t **> matches.data
+        for i in range(matches.length // sizeof(lxb_dom_node_t *)):
+            if nodes[i].parent != NULL:
+                _unwrap_node(nodes[i], delete_empty)
+    finally:
+        PyMem_Free(tag_set.tag_ids)
+        _buffer_free(&matches)
+    return 0
@@ -0,0 +1,322 @@
+cimport cython
+from cpython.bytes cimport PyBytes_AS_STRING, PyBytes_GET_SIZE
+from cpython.mem cimport PyMem_Free, PyMem_Malloc
+from libc.stdint cimport int32_t, INT32_MAX
+from libc.string cimport memset
+
+import functools
+
+
+ctypedef struct _MatcherEdge:
+    int32_t target
+    # Next edge that leaves the same state, -1 for the last one.
+    int32_t next
+    lxb_char_t byte
+
+
+ctypedef struct _MatcherState:
+    int32_t first_edge
+    int32_t fail
+    # Set when a pattern ends here or at any state of the failure chain.
+    bint terminal
+
+
+@cython.final
+cdef class _PatternMatcher:
+    """Aho–Corasick automaton that finds whether any of the patterns occurs in a text.
+
+    Patterns are matched as UTF-8 bytes, which gives the same result as
+    ``pattern in text`` for ``str``. Created through ``_pattern_matcher``,
+    so that repeated pattern sets are compiled once.
+    """
+    cdef _MatcherState *states
+    cdef _MatcherEdge *edges
+    cdef int32_t state_count
+    cdef int32_t edge_count
+    # Transitions of the root state, most of the bytes of a text are matched there.
+    cdef int32_t root_next[256]
+
+    def __cinit__(self, tuple patterns):
+        cdef Py_ssize_t total = 1
+        cdef object pattern
+
+        encoded = []
+        for pattern in patterns:
+            if not isinstance(pattern, str):
+                raise TypeError("Expected str, got %s" % type(pattern).__name__)
+            encoded.append(pattern.encode("UTF-8"))
+            total += len(encoded[len(encoded) - 1])
+        if total > INT32_MAX:
+            raise OverflowError("Patterns are too long")
+
+        self.states = <_MatcherState *> PyMem_Malloc(total * sizeof(_MatcherState))
+        self.edges = <_MatcherEdge *> PyMem_Malloc(total * sizeof(_MatcherEdge))
+        if self.states == NULL or self.edges == NULL:
+            raise MemoryError()
+        self.states[0].first_edge = -1
+        self.states[0].fail = 0
+        self.states[0].terminal = False
+        self.state_count = 1
+        self.edge_count = 0
+        memset(self.root_next, 0, sizeof(self.root_next))
+
+        for pattern in encoded:
+            self._add(<const lxb_char_t *> PyBytes_AS_STRING(pattern), PyBytes_GET_SIZE(pattern))
+        self._link()
+
+    def __dealloc__(self):
+        PyMem_Free(self.states)
+        PyMem_Free(self.edges)
+
+    cdef inline int32_t _goto(self, int32_t state, lxb_char_t byte) noexcept nogil:
+        cdef int32_t edge
+
+        if state == 0:
+            return self.root_next[byte] if self.root_next[byte] != 0 else -1
+        edge = self.states[state].first_edge
+        while edge != -1:
+            if self.edges[edge].byte == byte:
+                return self.edges[edge].target
+            edge = self.edges[edge].next
+        return -1
+
+    cdef void _add(self, const lxb_char_t *data, Py_ssize_t length) noexcept nogil:
+        cdef int32_t state = 0
+        cdef int32_t target
+        cdef Py_ssize_t i
+
+        for i in range(length):
+            target = self._goto(state, data[i])
+            if target == -1:
+                target = self.state_count
+                self.state_count += 1
+                self.states[target].first_edge = -1
+                self.states[target].fail = 0
+                self.states[target].terminal = False
+
+                self.edges[self.edge_count].target = target
+                self.edges[self.edge_count].byte = data[i]
+                self.edges[self.edge_count].next = self.states[state].first_edge
+                self.states[state].first_edge = self.edge_count
+                self.edge_count += 1
+                if state == 0:
+                    self.root_next[data[i]] = target
+            state = target
+        self.states[state].terminal = True
+
+    cdef int _link(self) except -1:
+        """Compute failure links in breadth-first order."""
+        cdef int32_t *queue = <int32_t *> PyMem_Malloc(self.state_count * sizeof(int32_t))
+        cdef int32_t head = 0
+        cdef int32_t tail = 0
+        cdef int32_t state, edge, target, fail, next_state
+
+        if queue == NULL:
+            raise MemoryError()
+        with nogil:
+            edge = self.states[0].first_edge
+            while edge != -1:
+                queue[tail] = self.edges[edge].target
+                tail += 1
+                edge = self.edges[edge].next
+
+            while head < tail:
+                state = queue[head]
+                head += 1
+                edge = self.states[state].first_edge
+                while edge != -1:
+                    target = self.edges[edge].target
+                    fail = self.states[state].fail
+                    next_state = self._goto(fail, self.edges[edge].byte)
+                    while next_state == -1 and fail != 0:
+                        fail = self.states[fail].fail
+                        next_state = self._goto(fail, self.edges[edge].byte)
+                    self.states[target].fail = next_state if next_state != -1 else 0
+                    if self.states[self.states[target].fail].terminal:
+                        self.states[target].terminal = True
+                    queue[tail] = target
+                    tail += 1
+                    edge = self.edges[edge].next
+        PyMem_Free(queue)
+        return 0
+
+    cdef bint search(self, const lxb_char_t *data, size_t length) noexcept nogil:
+        """Return ``True`` if any of the patterns occurs in ``data``."""
+        cdef int32_t state = 0
+        cdef int32_t target
+        cdef size_t i
+
+        if self.states[0].terminal:
+            return True
+        for i in range(length):
+            while True:
+                target = self._goto(state, data[i])
+                if target != -1:
+                    state = target
+                    break
+                if state == 0:
+                    break
+                state = self.states[state].fail
+            if self.states[state].terminal:
+                return True
+        return False
+
+    cdef bint search_any(self, list texts):
+        cdef bytes text
+        cdef const lxb_char_t *data
+        cdef size_t length
+        cdef bint found
+
+        for text in texts:
+            data = <const lxb_char_t *> PyBytes_AS_STRING(text)
+            length = PyBytes_GET_SIZE(text)
+            with nogil:
+                found = self.search(data, length)
+            if found:
+                return True
+        return False
+
+
+_pattern_matcher = functools.lru_cache(maxsize=64)(_PatternMatcher)
+
+
+@cython.final
+cdef class _RawTextCache:
+    """Contents of elements, kept until the document changes.
+
+    ``texts`` maps tag ids to the UTF-8 text of every such element in document
+    order, without the empty ones. ``script_srcs`` holds the non-empty ``src``
+    attributes of scripts.
+    """
+    cdef size_t version
+    cdef size_t attributes_version
+    cdef dict texts
+    cdef list script_srcs
+
+
+cdef list _collect_raw_texts(lxb_dom_node_t *root, lxb_tag_id_t tag_id):
+    """Return the text of every ``tag_id`` element in the subtree of ``root``, including ``root``."""
+    cdef lxb_dom_node_t *node = root
+    cdef _ByteBuffer buffer
+    cdef _TextOptions options
+    cdef list result = []
+
+    _buffer_init(&buffer)
+    try:
+        while node != NULL:
+            if node.type == LXB_DOM_NODE_TYPE_ELEMENT and node.local_name == tag_id:
+                buffer.length = 0
+                _text_options_init(&options, NULL, 0, False, False)
+                if not _buffer_append_text(&buffer, node, &options):
+                    raise MemoryError()
+                if buffer.length > 0:
+                    result.append(PyBytes_FromStringAndSize(buffer.data, buffer.length))
+
+            if node.first_child != NULL:
+                node = node.first_child
+                continue
+            while node != root and node.next == NULL:
+                node = node.parent
+            if node == root:
+                break
+            node = node.next
+    finally:
+        _buffer_free(&buffer)
+    return result
+
+
+cdef list _collect_script_srcs(lxb_dom_node_t *root):
+    cdef lxb_dom_node_t *node = root
+    cdef lxb_dom_attr_t *attr
+    cdef const lxb_char_t *value
+    cdef size_t value_len
+    cdef list result = []
+
+    while node != NULL:
+        if node.type == LXB_DOM_NODE_TYPE_ELEMENT and node.local_name == LXB_TAG_SCRIPT:
+            attr = lxb_dom_element_attr_by_name(<lxb_dom_element_t *> node, <const lxb_char_t *> b"src", 3)
+            if attr != NULL:
+                value = lxb_dom_attr_value_noi(attr, &value_len)
+                if value != NULL and value_len > 0:
+                    result.append(value[:value_len].decode(_ENCODING))
+
+        if node.first_child != NULL:
+            node = node.first_child
+            continue
+        while node != root and node.next == NULL:
+            node = node.parent
+        if node == root:
+            break
+        node = node.next
+    return result
+
+
+cdef _RawTextCache _raw_text_cache(LexborNode node):
+    """Return the up to date cache of the parser if ``node`` is its root, otherwise ``None``.
+
+    Only the whole document is cached, other subtrees are scanned on every call.
+    """
+    cdef LexborHTMLParser parser = node.parser
+    cdef _RawTextCache cache
+    cdef lxb_dom_node_t *root
+
+    if parser is None or parser.document == NULL or parser._is_streaming:
+        return None
+    if parser._is_fragment:
+        root = parser._fragment_wrapper
+    else:
+        root = lxb_dom_document_root(&parser.document.dom_document)
+    if root == NULL or node._get_node().node != root:
+        return None
+
+    _install_mutation_hooks(parser)
+    cache = parser._raw_text_cache
+    if (cache is None
+            or cache.version != parser._mutation_hooks.version
+            or cache.attributes_version != parser._mutation_hooks.attributes_version):
+        cache = _RawTextCache()
+        cache.version = parser._mutation_hooks.version
+        cache.attributes_version = parser._mutation_hooks.attributes_version
+        cache.texts = {}
+        parser._raw_text_cache = cache
+    return cache
+
+
+cdef list _raw_texts(LexborNode node, lxb_tag_id_t tag_id):
+    cdef _RawTextCache cache = _raw_text_cache(node)
+    cdef list texts
+
+    if cache is None:
+        return _collect_raw_texts(node._get_node().node, tag_id)
+    texts = cache.texts.get(tag_id)
+    if texts is None:
+        texts = _collect_raw_texts(node._get_node().node, tag_id)
+        cache.texts[tag_id] = texts
+    return texts
+
+
+cdef list _script_srcs(LexborNode node):
+    cdef _RawTextCache cache = _raw_text_cache(node)
+
+    if cache is None:
+        return _collect_script_srcs(node._get_node().node)
+    if cache.script_srcs is None:
+        cache.script_srcs = _collect_script_srcs(node._get_node().node)
+    return cache.script_srcs
+
+
+cdef bint _raw_texts_contain_any(LexborNode node, tuple patterns, object tags) except -1:
+    cdef _PatternMatcher matcher = _pattern_matcher(patterns)
+    cdef lxb_dom_document_t *document = node.node.owner_document
+    cdef lxb_tag_id_t tag_id
+    cdef bytes name
+
+    if isinstance(tags, str):
+        tags = (tags,)
+    for tag in tags:
+        name = tag.lower().encode(_ENCODING)
+        tag_id = lxb_tag_id_by_name_noi(document.tags, <const lxb_char_t *> name, len(name))
+        # Unknown tags can't be present in the document.
+        if tag_id != LXB_TAG__UNDEF and matcher.search_any(_raw_texts(node, tag_id)):
+            return True
+    return False
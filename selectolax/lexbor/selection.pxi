@@ -1,34 +1,166 @@
 cimport cython
 from cpython.exc cimport PyErr_SetObject
 from cpython.list cimport PyList_GET_SIZE
+from cpython.mem cimport PyMem_Free, PyMem_Malloc
+
+import functools
+
+
+# Parser used to compile all selectors, created on first use. The module is
+# built for free-threaded Python, so creating and using it is guarded by the lock.
+cdef lxb_css_parser_t *_css_parser = NULL
+cdef cython.pymutex _css_parser_lock
+
+
+cdef lxb_css_parser_t * _selector_parser() except NULL:
+    """Return the shared CSS parser, ``_css_parser_lock`` must be held."""
+    global _css_parser
+    cdef lxb_css_parser_t *parser
+    cdef lxb_css_selectors_t *css_selectors
+
+    if _css_parser != NULL:
+        return _css_parser
+
+    parser = lxb_css_parser_create()
+    if lxb_css_parser_init(parser, NULL) != LXB_STATUS_OK:
+        lxb_css_parser_destroy(parser, True)
+        raise SelectolaxError("Can't initialize CSS parser.")
+
+    css_selectors = lxb_css_selectors_create()
+    if lxb_css_selectors_init(css_selectors) != LXB_STATUS_OK:
+        lxb_css_selectors_destroy(css_selectors, True)
+        lxb_css_parser_destroy(parser, True)
+        raise SelectolaxError("Can't initialize CSS selector.")
+
+    lxb_css_parser_selectors_set(parser, css_selectors)
+    _css_parser = parser
+    return parser
 
 
 @cython.final
-cdef class LexborCSSSelector:
+cdef class LexborCompiledSelector:
+    """A pre-parsed CSS selector that can be reused across nodes and documents.
 
-    def __init__(self):
-        self._create_css_parser()
-        self.results = []
-        self.current_node = None
+    Use ``compile_selector`` to create instances.
+    The object is immutable and can be passed to ``css``, ``css_first``
+    and ``css_matches`` in place of a query string.
+    """
 
-    cdef int _create_css_parser(self) except -1:
-        cdef lxb_status_t status
+    def __cinit__(self, str query):
+        cdef lxb_css_parser_t *parser
 
-        self.parser = lxb_css_parser_create()
-        status = lxb_css_parser_init(self.parser, NULL)
+        bytes_query = query.encode(_ENCODING)
+        with _css_parser_lock:
+            parser = _selector_parser()
+            # The parser allocates fresh memory for the list, which we own from now on.
+            self.selectors_list = lxb_css_selectors_parse(
+                parser, <lxb_char_t *> bytes_query, <size_t> len(bytes_query)
+            )
+            parser.memory = NULL
+
+        if self.selectors_list == NULL:
+            raise SelectolaxError("Can't parse CSS selector.")
+        self.query = query
 
-        if status != LXB_STATUS_OK:
-            PyErr_SetObject(SelectolaxError, "Can't initialize CSS parser.")
-            return -1
+    def __repr__(self):
+        return '<LexborCompiledSelector %r>' % self.query
 
-        self.css_selectors = lxb_css_selectors_create()
-        status = lxb_css_selectors_init(self.css_selectors)
+    def __dealloc__(self):
+        if self.selectors_list != NULL:
+            lxb_css_selector_list_destroy_memory(self.selectors_list)
+
+
+cdef enum:
+    _TAG_FILTER_SIZE = 8
+
+ctypedef struct _TagFilter:
+    # -1 when any element can match, otherwise the number of valid tag_ids.
+    Py_ssize_t count
+    lxb_tag_id_t tag_ids[_TAG_FILTER_SIZE]
+
+
+cdef void _tag_filter_init(_TagFilter *tag_filter, lxb_css_selector_list_t *selectors_list,
+                           lxb_dom_document_t *document) noexcept nogil:
+    """Collect tag ids required by the rightmost compound selector of every comma-separated branch."""
+    cdef lxb_css_selector_t *selector
+    cdef lxb_tag_id_t tag_id
+    cdef bint has_tag
+
+    tag_filter.count = 0
+    while selectors_list != NULL:
+        selector = selectors_list.last
+        has_tag = False
+        while selector != NULL:
+            if selector.type == LXB_CSS_SELECTOR_TYPE_ELEMENT:
+                has_tag = True
+                tag_id = lxb_tag_id_by_name_noi(document.tags, selector.name.data, selector.name.length)
+                # Unknown tags can't be present in the document, the branch never matches.
+                if tag_id != LXB_TAG__UNDEF:
+                    if tag_filter.count == _TAG_FILTER_SIZE:
+                        tag_filter.count = -1
+                        return
+                    tag_filter.tag_ids[tag_filter.count] = tag_id
+                    tag_filter.count += 1
+                break
+            if selector.combinator != LXB_CSS_SELECTOR_COMBINATOR_CLOSE:
+                break
+            selector = selector.prev
+
+        if not has_tag:
+            tag_filter.count = -1
+            return
+        selectors_list = selectors_list.next
+
+
+_SELECTOR_CACHE_SIZE = 256
+_selector_cache = functools.lru_cache(maxsize=_SELECTOR_CACHE_SIZE)(LexborCompiledSelector)
+
+
+def set_selector_cache_size(maxsize):
+    """Resize the process-wide cache of parsed CSS selectors.
+
+    Query strings passed to ``css``, ``css_first`` and ``css_matches`` are parsed
+    once and kept in an LRU cache shared by all parsers.
+    Resizing drops all cached selectors and resets the counters.
+
+    Parameters
+    ----------
+    maxsize : int or None
+        Maximum number of cached selectors. ``0`` disables caching,
+        ``None`` makes the cache unbounded.
+    """
+    global _selector_cache
+    if maxsize is not None and maxsize < 0:
+        raise ValueError("maxsize must be greater than or equal to 0")
+    _selector_cache = functools.lru_cache(maxsize=maxsize)(LexborCompiledSelector)
 
-        if status != LXB_STATUS_OK:
-            PyErr_SetObject(SelectolaxError, "Can't initialize CSS selector.")
-            return -1
 
-        lxb_css_parser_selectors_set(self.parser, self.css_selectors)
+def selector_cache_info():
+    """Return hit/miss statistics of the selector cache.
+
+    Returns
+    -------
+    CacheInfo
+        Named tuple with ``hits``, ``misses``, ``maxsize`` and ``currsize`` fields.
+    """
+    return _selector_cache.cache_info()
+
+
+def clear_selector_cache():
+    """Drop all cached selectors and reset the counters."""
+    _selector_cache.cache_clear()
+
+
+@cython.final
+cdef class LexborCSSSelector:
+
+    def __init__(self):
+        self._create_selectors()
+        self.results = []
+        self.current_node = None
+
+    cdef int _create_selectors(self) except -1:
+        cdef lxb_status_t status
 
         self.selectors = lxb_selectors_create()
         status = lxb_selectors_init(self.selectors)
@@ -38,79 +170,118 @@ cdef class LexborCSSSelector:
             return -1
         return 0
 
-    cpdef list find(self, str query, LexborNode node):
+    cpdef list find(self, object query, LexborNode node):
         return self._find(query, node, 0)
 
-    cpdef list find_first(self, str query, LexborNode node):
+    cpdef list find_first(self, object query, LexborNode node):
         return self._find(query, node, 1)
 
-    cpdef list _find(self, str query, LexborNode node, bint only_first):
-        cdef lxb_css_selector_list_t* selectors
-        cdef lxb_char_t* c_selector
-        cdef lxb_css_selector_list_t * selectors_list
-
+    cdef LexborCompiledSelector _compile(self, object query):
+        if isinstance(query, LexborCompiledSelector):
+            return <LexborCompiledSelector> query
         if not isinstance(query, str):
-            raise TypeError("Query must be a string.")
+            raise TypeError("Query must be a string or a compiled selector.")
+        return <LexborCompiledSelector> _selector_cache(query)
 
-        bytes_query = query.encode(_ENCODING)
-        selectors_list = lxb_css_selectors_parse(self.parser, <lxb_char_t *> bytes_query, <size_t>len(bytes_query))
-
-        if selectors_list == NULL:
-            raise SelectolaxError("Can't parse CSS selector.")
+    cpdef list _find(self, object query, LexborNode node, bint only_first):
+        cdef LexborCompiledSelector compiled = self._compile(query)
 
         self.current_node = node
         self.results = []
         if only_first:
-            status = lxb_selectors_find(self.selectors, node.node, selectors_list,
+            status = lxb_selectors_find(self.selectors, node.node, compiled.selectors_list,
                                         <lxb_selectors_cb_f>css_finder_callback_first, <void*>self)
         else:
-            status = lxb_selectors_find(self.selectors, node.node, selectors_list,
+            status = lxb_selectors_find(self.selectors, node.node, compiled.selectors_list,
                                         <lxb_selectors_cb_f>css_finder_callback, <void*>self)
         results = list(self.results)
         self.results = []
         self.current_node = None
-        lxb_css_selector_list_destroy_memory(selectors_list)
-        self.parser.memory = NULL
         return results
 
-    cpdef int any_matches(self, str query, LexborNode node) except -1:
-        cdef lxb_css_selector_list_t * selectors
-        cdef lxb_char_t * c_selector
-        cdef lxb_css_selector_list_t * selectors_list
+    cpdef dict find_many(self, dict queries, LexborNode node):
+        """Match several selectors during a single walk over the tree."""
+        cdef list names = list(queries)
+        cdef list compiled = [self._compile(queries[name]) for name in names]
+        cdef list buckets = [[] for _ in names]
+        cdef Py_ssize_t i, j, n_queries = len(names)
+        cdef lxb_dom_node_t *root = node.node
+        cdef lxb_dom_node_t *current = root
+        cdef lxb_status_t status
+        cdef _TagFilter *filters
+        cdef bint candidate
+
+        filters = <_TagFilter *> PyMem_Malloc(max(n_queries, 1) * sizeof(_TagFilter))
+        if filters == NULL:
+            raise MemoryError()
+
+        try:
+            for i in range(n_queries):
+                _tag_filter_init(
+                    &filters[i], (<LexborCompiledSelector> compiled[i]).selectors_list, root.owner_document
+                )
+
+            # Same walk as lxb_selectors_find with LXB_SELECTORS_OPT_MATCH_ROOT.
+            if current.type == LXB_DOM_NODE_TYPE_DOCUMENT:
+                current = root.first_child
+
+            self.current_node = node
+            while current != NULL and n_queries > 0:
+                if current.type == LXB_DOM_NODE_TYPE_ELEMENT:
+                    for i in range(n_queries):
+                        # Matching a single node is comparatively expensive in lexbor,
+                        # so skip nodes that can't match the rightmost compound selector.
+                        if filters[i].count >= 0:
+                            candidate = False
+                            for j in range(filters[i].count):
+                                if filters[i].tag_ids[j] == current.local_name:
+                                    candidate = True
+                                    break
+                            if not candidate:
+                                continue
+
+                        self.results = <list> buckets[i]
+                        status = lxb_selectors_match_node(
+                            self.selectors, current, (<LexborCompiledSelector> compiled[i]).selectors_list,
+                            <lxb_selectors_cb_f> css_finder_callback, <void *> self
+                        )
+                        if status != LXB_STATUS_OK:
+                            raise SelectolaxError("Can't match CSS selector.")
+
+                    if current.first_child != NULL:
+                        current = current.first_child
+                        continue
+
+                while current != root and current.next == NULL:
+                    current = current.parent
+                if current == root:
+                    break
+                current = current.next
+        finally:
+            PyMem_Free(filters)
+            self.results = []
+            self.current_node = None
+
+        return {names[i]: buckets[i] for i in range(n_queries)}
+
+    cpdef int any_matches(self, object query, LexborNode node) except -1:
+        cdef LexborCompiledSelector compiled = self._compile(query)
         cdef int result
 
-        if not isinstance(query, str):
-            raise TypeError("Query must be a string.")
-
-        bytes_query = query.encode(_ENCODING)
-        selectors_list = lxb_css_selectors_parse(self.parser, <lxb_char_t *> bytes_query, <size_t> len(bytes_query))
-
-        if selectors_list == NULL:
-            PyErr_SetObject(SelectolaxError, "Can't parse CSS selector.")
-            return -1
-
         self.results = []
-        status = lxb_selectors_find(self.selectors, node.node, selectors_list,
+        status = lxb_selectors_find(self.selectors, node.node, compiled.selectors_list,
                                     <lxb_selectors_cb_f> css_matcher_callback, <void *> self)
         if status != LXB_STATUS_OK:
-            lxb_css_selector_list_destroy_memory(selectors_list)
-            self.parser.memory = NULL
             PyErr_SetObject(SelectolaxError, "Can't parse CSS selector.")
             return -1
 
         result = PyList_GET_SIZE(self.results) > 0
         self.results = []
-        lxb_css_selector_list_destroy_memory(selectors_list)
-        self.parser.memory = NULL
         return result
 
     def __dealloc__(self):
         if self.selectors != NULL:
             lxb_selectors_destroy(self.selectors, True)
-        if self.parser != NULL:
-            lxb_css_parser_destroy(self.parser, True)
-        if self.css_selectors != NULL:
-            lxb_css_selectors_destroy(self.css_selectors, True)
 
 
 cdef class LexborSelector:
@@ -127,9 +298,18 @@ cdef class LexborSelector:
         self.node = node
         self.nodes = self.node.parser.selector.find(query, self.node) if query else [node, ]
 
-    cpdef css(self, str query):
-        """Evaluate CSS selector against current scope."""
-        raise NotImplementedError("This features is not supported by the lexbor backend. Please use Modest backend.")
+    cpdef css(self, object query):
+        """Evaluate CSS selector against current scope.
+
+        Accepts a query string or a selector created by ``compile_selector``.
+        """
+        cdef LexborNode current_node
+        cdef LexborCSSSelector selector = self.node.parser.selector
+        nodes = list()
+        for current_node in self.nodes:
+            nodes.extend(selector.find(query, current_node))
+        self.nodes = nodes
+        return self
 
     @property
     def matches(self) -> list:
@@ -0,0 +1,110 @@
+cdef enum:
+    _STOP_AFTER_SLICE_SIZE = 16384
+
+
+cdef inline lxb_tag_id_t _stop_after_tag_id_from_string(
+    lxb_html_document_t *document,
+    str stop_after,
+) except? 0:
+    cdef bytes stop_after_bytes
+    cdef lxb_tag_id_t tag_id
+
+    if not stop_after:
+        raise ValueError("stop_after cannot be empty")
+
+    stop_after_bytes = stop_after.lower().encode("UTF-8")
+    tag_id = lxb_tag_id_by_name_noi(
+        document.dom_document.tags,
+        <const lxb_char_t *> stop_after_bytes,
+        len(stop_after_bytes),
+    )
+    if tag_id == LXB_TAG__UNDEF:
+        raise ValueError(f"Unknown stop_after tag: {stop_after!r}")
+
+    return tag_id
+
+
+cdef lxb_dom_node_t * _stop_after_find_inserted(_StopAfter *state) noexcept nogil:
+    """Look for the target among the nodes appended since the last call.
+
+    Walks the tree in document order, starting after ``state.cursor``. This
+    finds elements that are inserted and closed while a single token is
+    processed, such as a void element or an implied ``<head>``.
+    """
+    cdef lxb_dom_node_t *node = state.cursor
+    cdef lxb_dom_node_t *next_node
+
+    while True:
+        next_node = node.first_child
+        while next_node == NULL and node != NULL:
+            next_node = node.next
+            if next_node == NULL and node.parent == NULL and node.type != LXB_DOM_NODE_TYPE_DOCUMENT:
+                # The subtree of the cursor was removed from the document,
+                # e.g. the <body> replaced by a <frameset>. Start over.
+                state.cursor = &state.tree.document.dom_document.node
+                return NULL
+            node = node.parent
+        if next_node == NULL:
+            return NULL
+        node = next_node
+        state.cursor = node
+        if node.type == LXB_DOM_NODE_TYPE_ELEMENT and node.local_name == state.tag_id:
+            return node
+
+
+cdef bint _stop_after_closed(_StopAfter *state) noexcept nogil:
+    """Check whether the first inserted target element is no longer open."""
+    cdef lexbor_array_t *open_elements = state.tree.open_elements
+    cdef lxb_dom_node_t *node
+    cdef size_t i
+
+    if state.element == NULL:
+        # Tokens the tree builder ignores don't create elements, so only
+        # elements that made it into the tree are considered.
+        if open_elements.length > 0:
+            node = <lxb_dom_node_t *> open_elements.list[open_elements.length - 1]
+            if node.local_name == state.tag_id:
+                state.element = node
+                state.index = open_elements.length - 1
+                return False
+        state.element = _stop_after_find_inserted(state)
+        if state.element == NULL:
+            return False
+
+    if state.index < open_elements.length and open_elements.list[state.index] == state.element:
+        return False
+    for i in range(open_elements.length):
+        if open_elements.list[i] == state.element:
+            state.index = i
+            return False
+    return True
+
+
+cdef lxb_html_token_t * _stop_after_discard_callback(
+    lxb_html_tokenizer_t *tkz,
+    lxb_html_token_t *token,
+    void *ctx
+) noexcept nogil:
+    return token
+
+
+cdef lxb_html_token_t * _stop_after_callback(
+    lxb_html_tokenizer_t *tkz,
+    lxb_html_token_t *token,
+    void *ctx
+) noexcept nogil:
+    """Pass the token to the tree builder and stop building once the target is closed.
+
+    The tokenizer still consumes the rest of the current chunk, but its tokens
+    are dropped instead of being inserted into the tree.
+    """
+    cdef _StopAfter *state = <_StopAfter *> ctx
+
+    token = state.callback(tkz, token, state.ctx)
+    if token == NULL:
+        return NULL
+
+    if _stop_after_closed(state):
+        state.stopped = True
+        tkz.callback_token_done = _stop_after_discard_callback
+    return token
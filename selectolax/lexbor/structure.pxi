@@ -0,0 +1,325 @@
+from libc.stdint cimport uint64_t
+from libc.string cimport memcmp
+
+
+cdef uint64_t _HASH_SEED = 0xcbf29ce484222325
+cdef uint64_t _HASH_PRIME = 0x100000001b3
+
+
+cdef inline uint64_t _hash_mix(uint64_t h, uint64_t value) noexcept nogil:
+    return h ^ (value + <uint64_t> 0x9e3779b97f4a7c15 + (h << 6) + (h >> 2))
+
+
+cdef inline uint64_t _hash_finish(uint64_t h) noexcept nogil:
+    h ^= h >> 30
+    h *= <uint64_t> 0xbf58476d1ce4e5b9
+    h ^= h >> 27
+    h *= <uint64_t> 0x94d049bb133111eb
+    h ^= h >> 31
+    return h
+
+
+cdef inline uint64_t _hash_bytes(uint64_t h, const lxb_char_t *data, size_t length) noexcept nogil:
+    cdef size_t i
+    for i in range(length):
+        h = (h ^ data[i]) * _HASH_PRIME
+    # Mixing in the length keeps ("ab", "c") and ("a", "bc") apart.
+    return _hash_mix(h, length)
+
+
+cdef inline bint _is_template(lxb_dom_node_t *node) noexcept nogil:
+    return node.local_name == LXB_TAG_TEMPLATE and node.ns == LXB_NS_HTML
+
+
+cdef inline lxb_dom_node_t * _template_content(lxb_dom_node_t *node) noexcept nogil:
+    cdef lxb_dom_document_fragment_t *content = (<lxb_html_template_element_t *> node).content
+    return &content.node if content != NULL else NULL
+
+
+cdef inline bint _lexbor_str_equal(const lexbor_str_t *a, const lexbor_str_t *b) noexcept nogil:
+    return a.length == b.length and (a.length == 0 or memcmp(a.data, b.data, a.length) == 0)
+
+
+cdef inline bint _names_equal(const lxb_char_t *a, size_t a_len, const lxb_char_t *b, size_t b_len) noexcept nogil:
+    return a_len == b_len and (a_len == 0 or memcmp(a, b, a_len) == 0)
+
+
+cdef inline size_t _attr_value_length(lxb_dom_attr_t *attr) noexcept nogil:
+    return attr.value.length if attr.value != NULL else 0
+
+
+cdef bint _attributes_equal(lxb_dom_element_t *a, lxb_dom_element_t *b) noexcept nogil:
+    cdef lxb_dom_attr_t *a_attr = lxb_dom_element_first_attribute_noi(a)
+    cdef lxb_dom_attr_t *b_attr = lxb_dom_element_first_attribute_noi(b)
+    cdef const lxb_char_t *a_name
+    cdef const lxb_char_t *b_name
+    cdef size_t a_len = 0, b_len = 0
+
+    while a_attr != NULL and b_attr != NULL:
+        a_name = lxb_dom_attr_qualified_name(a_attr, &a_len)
+        b_name = lxb_dom_attr_qualified_name(b_attr, &b_len)
+        if not _names_equal(a_name, a_len, b_name, b_len):
+            return False
+        # Attributes without a value are serialized the same way as empty ones.
+        if a_attr.value == NULL or b_attr.value == NULL:
+            if _attr_value_length(a_attr) != 0 or _attr_value_length(b_attr) != 0:
+                return False
+        elif not _lexbor_str_equal(a_attr.value, b_attr.value):
+            return False
+        a_attr = a_attr.next
+        b_attr = b_attr.next
+    return a_attr == NULL and b_attr == NULL
+
+
+cdef bint _nodes_equal(lxb_dom_node_t *a, lxb_dom_node_t *b) noexcept nogil:
+    """Compare two nodes without their children."""
+    cdef const lxb_char_t *a_name
+    cdef const lxb_char_t *b_name
+    cdef size_t a_len = 0, b_len = 0
+    cdef lxb_dom_node_t *a_content
+    cdef lxb_dom_node_t *b_content
+
+    if a.type != b.type:
+        return False
+
+    if a.type == LXB_DOM_NODE_TYPE_ELEMENT:
+        # Tag ids of custom elements are per document, so compare the names.
+        a_name = lxb_dom_element_qualified_name(<lxb_dom_element_t *> a, &a_len)
+        b_name = lxb_dom_element_qualified_name(<lxb_dom_element_t *> b, &b_len)
+        if not _names_equal(a_name, a_len, b_name, b_len):
+            return False
+        if not _attributes_equal(<lxb_dom_element_t *> a, <lxb_dom_element_t *> b):
+            return False
+        if _is_template(a):
+            a_content = _template_content(a)
+            b_content = _template_content(b)
+            if a_content == NULL or b_content == NULL:
+                return a_content == b_content
+            return _subtrees_equal(a_content, b_content)
+    elif a.type == LXB_DOM_NODE_TYPE_PROCESSING_INSTRUCTION:
+        if not _lexbor_str_equal(
+            &(<lxb_dom_processing_instruction_t *> a).target,
+            &(<lxb_dom_processing_instruction_t *> b).target,
+        ):
+            return False
+        return _lexbor_str_equal(&(<lxb_dom_character_data_t *> a).data, &(<lxb_dom_character_data_t *> b).data)
+    elif (a.type == LXB_DOM_NODE_TYPE_TEXT or a.type == LXB_DOM_NODE_TYPE_COMMENT
+            or a.type == LXB_DOM_NODE_TYPE_CDATA_SECTION):
+        return _lexbor_str_equal(&(<lxb_dom_character_data_t *> a).data, &(<lxb_dom_character_data_t *> b).data)
+    elif a.type == LXB_DOM_NODE_TYPE_DOCUMENT_TYPE:
+        a_name = lxb_dom_document_type_name_noi(<lxb_dom_document_type_t *> a, &a_len)
+        b_name = lxb_dom_document_type_name_noi(<lxb_dom_document_type_t *> b, &b_len)
+        return _names_equal(a_name, a_len, b_name, b_len)
+    return True
+
+
+cdef bint _subtrees_equal(lxb_dom_node_t *a_root, lxb_dom_node_t *b_root) noexcept nogil:
+    """Compare two subtrees node by node, walking both in document order."""
+    cdef lxb_dom_node_t *a = a_root
+    cdef lxb_dom_node_t *b = b_root
+
+    if a_root == b_root:
+        return True
+
+    while True:
+        if not _nodes_equal(a, b):
+            return False
+
+        if a.first_child != NULL or b.first_child != NULL:
+            if a.first_child == NULL or b.first_child == NULL:
+                return False
+            a = a.first_child
+            b = b.first_child
+            continue
+
+        while a != a_root:
+            if a.next != NULL or b.next != NULL:
+                if a.next == NULL or b.next == NULL:
+                    return False
+                a = a.next
+                b = b.next
+                break
+            a = a.parent
+            b = b.parent
+        else:
+            return True
+
+
+cdef int _node_hash(lxb_dom_node_t *node, uint64_t *result) noexcept nogil:
+    """Hash a node without its children. Returns -1 when out of memory."""
+    cdef uint64_t h = _hash_mix(_HASH_SEED, node.type)
+    cdef uint64_t content_hash
+    cdef const lxb_char_t *name
+    cdef size_t name_len = 0
+    cdef lxb_dom_attr_t *attr
+    cdef lxb_dom_node_t *content
+
+    if node.type == LXB_DOM_NODE_TYPE_ELEMENT:
+        name = lxb_dom_element_qualified_name(<lxb_dom_element_t *> node, &name_len)
+        h = _hash_bytes(h, name, name_len)
+        attr = lxb_dom_element_first_attribute_noi(<lxb_dom_element_t *> node)
+        while attr != NULL:
+            name = lxb_dom_attr_qualified_name(attr, &name_len)
+            h = _hash_bytes(h, name, name_len)
+            if attr.value == NULL:
+                h = _hash_bytes(h, NULL, 0)
+            else:
+                h = _hash_bytes(h, attr.value.data, attr.value.length)
+            attr = attr.next
+        if _is_template(node):
+            content = _template_content(node)
+            if content != NULL:
+                if _subtree_hash(content, &content_hash) == -1:
+                    return -1
+                h = _hash_mix(h, content_hash)
+    elif node.type == LXB_DOM_NODE_TYPE_PROCESSING_INSTRUCTION:
+        h = _hash_bytes(
+            h,
+            (<lxb_dom_processing_instruction_t *> node).target.data,
+            (<lxb_dom_processing_instruction_t *> node).target.length,
+        )
+        h = _hash_bytes(h, (<lxb_dom_character_data_t *> node).data.data,
+                        (<lxb_dom_character_data_t *> node).data.length)
+    elif (node.type == LXB_DOM_NODE_TYPE_TEXT or node.type == LXB_DOM_NODE_TYPE_COMMENT
+            or node.type == LXB_DOM_NODE_TYPE_CDATA_SECTION):
+        h = _hash_bytes(h, (<lxb_dom_character_data_t *> node).data.data,
+                        (<lxb_dom_character_data_t *> node).data.length)
+    elif node.type == LXB_DOM_NODE_TYPE_DOCUMENT_TYPE:
+        name = lxb_dom_document_type_name_noi(<lxb_dom_document_type_t *> node, &name_len)
+        h = _hash_bytes(h, name, name_len)
+
+    result[0] = h
+    return 0
+
+
+ctypedef struct _HashFrame:
+    uint64_t hash
+    size_t text_len
+    # Index of the node in the ``records`` buffer, or -1 when it is not recorded.
+    Py_ssize_t record
+
+ctypedef struct _SubtreeHashRecord:
+    lxb_dom_node_t *node
+    uint64_t hash
+    size_t text_len
+
+
+cdef inline size_t _utf8_length(const lxb_char_t *data, size_t length) noexcept nogil:
+    """Count the characters of a UTF-8 string, so that lengths match ``len(str)``."""
+    cdef size_t i
+    cdef size_t count = 0
+
+    for i in range(length):
+        if (data[i] & 0xC0) != 0x80:
+            count += 1
+    return count
+
+
+cdef inline uint64_t _content_hash(uint64_t subtree_hash) noexcept nogil:
+    """Turn a subtree hash into the value returned by ``LexborNode.content_hash()``."""
+    return _hash_finish(_hash_mix(_HASH_SEED, subtree_hash))
+
+
+cdef inline void _finish_frame(_HashFrame *frame, _ByteBuffer *records) noexcept nogil:
+    cdef _SubtreeHashRecord *record
+
+    frame.hash = _hash_finish(frame.hash)
+    if frame.record != -1:
+        record = &(<_SubtreeHashRecord *> records.data)[frame.record]
+        record.hash = _content_hash(frame.hash)
+        record.text_len = frame.text_len
+
+
+cdef int _hash_subtrees(
+    lxb_dom_node_t *root,
+    uint64_t *result,
+    _ByteBuffer *records
+) noexcept nogil:
+    """Compute a Merkle-style hash of ``root`` and its descendants.
+
+    Every node hash is derived from the node itself and the hashes of its children,
+    so structurally equal subtrees get equal hashes. When ``records`` is not NULL,
+    a ``_SubtreeHashRecord`` is appended for every element in document order.
+    Returns -1 when out of memory.
+    """
+    cdef _ByteBuffer stack
+    cdef _HashFrame frame
+    cdef _HashFrame *parent
+    cdef lxb_dom_node_t *node = root
+    cdef lexbor_str_t *data
+    cdef size_t depth = 0
+
+    _buffer_init(&stack)
+    while True:
+        if _node_hash(node, &frame.hash) == -1:
+            _buffer_free(&stack)
+            return -1
+        frame.text_len = 0
+        frame.record = -1
+        if node.type == LXB_DOM_NODE_TYPE_TEXT:
+            data = &(<lxb_dom_character_data_t *> node).data
+            if data.data != NULL:
+                frame.text_len = _utf8_length(data.data, data.length)
+        elif records != NULL and node.type == LXB_DOM_NODE_TYPE_ELEMENT:
+            # Reserve the record now to keep document order, it is filled in when the element is finished.
+            if not _buffer_reserve(records, sizeof(_SubtreeHashRecord)):
+                _buffer_free(&stack)
+                return -1
+            frame.record = records.length // sizeof(_SubtreeHashRecord)
+            (<_SubtreeHashRecord *> records.data)[frame.record].node = node
+            records.length += sizeof(_SubtreeHashRecord)
+
+        if node.first_child != NULL:
+            # Keep the partial hash of the parent until all its children are folded in.
+            if not _buffer_append(&stack, <const char *> &frame, sizeof(_HashFrame)):
+                _buffer_free(&stack)
+                return -1
+            depth += 1
+            node = node.first_child
+            continue
+
+        _finish_frame(&frame, records)
+        while depth > 0:
+            parent = &(<_HashFrame *> stack.data)[depth - 1]
+            parent.hash = _hash_mix(parent.hash, frame.hash)
+            parent.text_len += frame.text_len
+            if node.next != NULL:
+                node = node.next
+                break
+            node = node.parent
+            depth -= 1
+            stack.length -= sizeof(_HashFrame)
+            frame = parent[0]
+            _finish_frame(&frame, records)
+        else:
+            _buffer_free(&stack)
+            result[0] = frame.hash
+            return 0
+
+
+cdef inline int _subtree_hash(lxb_dom_node_t *root, uint64_t *result) noexcept nogil:
+    return _hash_subtrees(root, result, NULL)
+
+
+cdef bint _node_runs_equal(lxb_dom_node_t *a, bint a_run, lxb_dom_node_t *b, bint b_run) noexcept nogil:
+    """Compare two nodes, or two runs of siblings starting at them when ``*_run`` is set."""
+    while a != NULL and b != NULL:
+        if not _subtrees_equal(a, b):
+            return False
+        a = a.next if a_run else NULL
+        b = b.next if b_run else NULL
+    return a == NULL and b == NULL
+
+
+cdef int _node_run_hash(lxb_dom_node_t *node, bint run, uint64_t *result) noexcept nogil:
+    """Hash a node, or a run of siblings starting at it, consistently with ``_node_runs_equal``."""
+    cdef uint64_t h = _HASH_SEED
+    cdef uint64_t subtree_hash
+
+    while node != NULL:
+        if _subtree_hash(node, &subtree_hash) == -1:
+            return -1
+        h = _hash_mix(h, subtree_hash)
+        node = node.next if run else NULL
+    result[0] = _hash_finish(h)
+    return 0
@@ -1,6 +1,7 @@
 include "../utils.pxi"
 
 import re
+from concurrent.futures import ThreadPoolExecutor
 
 
 def create_tag(tag: str):
@@ -24,6 +25,68 @@ def parse_fragment(html: str):
     return do_parse_fragment(html, LexborHTMLParser)
 
 
+def compile_selector(query: str):
+    """
+    Parse a CSS selector once and return a reusable ``LexborCompiledSelector``.
+
+    The result can be passed to ``css``, ``css_first`` and ``css_matches``
+    of any ``LexborHTMLParser`` or ``LexborNode`` instead of a query string,
+    which skips selector parsing on every call.
+
+    Examples:
+        >>> links = compile_selector("a[href]")
+        >>> [node.attributes["href"] for node in LexborHTMLParser(html).css(links)]
+    """
+    return LexborCompiledSelector(query)
+
+
+def _parse_batch(documents, kwargs):
+    return [LexborHTMLParser(html, **kwargs) for html in documents]
+
+
+def parse_many(documents, threads=None, **kwargs):
+    """
+    Parse many HTML documents on a thread pool and return a list of ``LexborHTMLParser``.
+
+    Lexbor parses without holding the GIL, so the documents are parsed on
+    ``threads`` threads in parallel. The order of ``documents`` is preserved.
+
+    Args:
+        documents: Iterable of ``str``, ``bytes`` or buffer objects.
+        threads: Number of worker threads. Defaults to ``os.cpu_count()``.
+        **kwargs: Passed to ``LexborHTMLParser``, e.g. ``detect_encoding=True``.
+
+    Returns:
+        A list of parsers, one per document.
+
+    Raises:
+        ValueError: If ``threads`` is less than 1.
+
+    Examples:
+        >>> trees = parse_many(pages, threads=8, stop_after="head")
+        >>> titles = [tree.css_first("title", default=None) for tree in trees]
+    """
+    return _map_batches(_parse_batch, list(documents), threads, kwargs)
+
+
+def _map_batches(function, list documents, threads, *args):
+    """Call ``function(batch, *args)`` for batches of ``documents`` on a thread pool and join the results."""
+    if threads is None:
+        threads = os.cpu_count() or 1
+    if threads < 1:
+        raise ValueError("threads must be at least 1")
+    if threads == 1 or len(documents) < 2:
+        return function(documents, *args)
+
+    # A few batches per thread keep the threads busy without paying
+    # the executor overhead for every single document.
+    batch_size = -(-len(documents) // (threads * 4))
+    batches = [documents[i:i + batch_size] for i in range(0, len(documents), batch_size)]
+    with ThreadPoolExecutor(max_workers=min(threads, len(batches))) as executor:
+        results = executor.map(function, batches, *[[arg] * len(batches) for arg in args])
+        return [item for batch in results for item in batch]
+
+
 def extract_html_comment(text: str) -> str:
     """Extract the inner content of an HTML comment string.
 
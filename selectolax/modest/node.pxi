@@ -817,6 +817,8 @@ cdef class Node:
         cdef int length = self.node.token.element_length
         if self.node.tag_id != MyHTML_TAG__TEXT:
             raise ValueError("Can't obtain raw value for non-text node.")
+        if self.parser.raw_html is None:
+            raise ValueError("Can't obtain raw value for HTML parsed from a buffer.")
         return self.parser.raw_html[begin:begin + length]
 
     def select(self, query=None):
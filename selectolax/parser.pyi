@@ -1,5 +1,7 @@
 from typing import Iterator, Literal, TypeVar, overload
 
+from typing_extensions import Buffer
+
 DefaultT = TypeVar("DefaultT")
 
 class _Attributes:
@@ -545,9 +547,11 @@ class HTMLParser:
     Parameters
     ----------
 
-    html : str (unicode) or bytes
+    html : str (unicode), bytes or buffer
+        Objects that support the buffer protocol, such as `bytearray`, `memoryview` or `mmap`,
+        are parsed in place without copying. `raw_html` is `None` for them.
     detect_encoding : bool, default True
-        If `True` and html type is `bytes` then encoding will be detected automatically.
+        If `True` and html type is `bytes` or a buffer then encoding will be detected automatically.
     use_meta_tags : bool, default True
         Whether to use meta tags in encoding detection process.
     decode_errors : str, default 'ignore'
@@ -556,7 +560,7 @@ class HTMLParser:
 
     def __init__(
         self,
-        html: bytes | str,
+        html: str | Buffer,
         detect_encoding: bool = True,
         use_meta_tags: bool = True,
         decode_errors: Literal["strict", "ignore", "replace"] = "ignore",
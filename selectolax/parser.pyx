@@ -6,6 +6,7 @@ include "modest/selection.pxi"
 include "modest/node.pxi"
 include "modest/util.pxi"
 include "utils.pxi"
+include "input.pxi"
 
 cdef class HTMLParser:
     """The HTML parser using modest backend.
@@ -17,9 +18,11 @@ cdef class HTMLParser:
     Parameters
     ----------
 
-    html : str (unicode) or bytes
+    html : str (unicode), bytes or buffer
+        Objects that support the buffer protocol, such as `bytearray`, `memoryview` or `mmap`,
+        are parsed in place without copying. `raw_html` is `None` for them.
     detect_encoding : bool, default True
-        If `True` and html type is `bytes` then encoding will be detected automatically.
+        If `True` and html type is `bytes` or a buffer then encoding will be detected automatically.
     use_meta_tags : bool, default True
         Whether to use meta tags in encoding detection process.
     decode_errors : str, default 'ignore'
@@ -36,14 +39,17 @@ cdef class HTMLParser:
         self._encoding = MyENCODING_UTF_8
 
         bytes_html, html_len = preprocess_input(html, decode_errors)
-        html_chars = <char*> bytes_html
+        try:
+            html_chars = input_data(bytes_html)
 
-        if detect_encoding and isinstance(html, bytes):
-            self._detect_encoding(html_chars, html_len)
+            if detect_encoding and not isinstance(html, str):
+                self._detect_encoding(html_chars, html_len)
 
-        self._parse_html(html_chars, html_len)
+            self._parse_html(html_chars, html_len)
+        finally:
+            release_input(bytes_html)
 
-        self.raw_html = bytes_html
+        self.raw_html = bytes_html if isinstance(bytes_html, bytes) else None
         self.cached_script_texts = None
         self.cached_script_srcs = None
 
@@ -17,13 +17,26 @@ FRAGMENT = Literal[
 
 
 def preprocess_input(html, decode_errors='ignore'):
+    """Convert the parser input to something that can be passed to the C code.
+
+    ``str`` is encoded to UTF-8 bytes. ``bytes`` is returned as is.
+    Other objects that support the buffer protocol, such as ``bytearray``,
+    ``memoryview`` or ``mmap``, are wrapped in a ``memoryview`` without copying.
+    Use ``input_data`` from ``input.pxi`` to get a pointer to the contents.
+    """
     if isinstance(html, (str, unicode)):
         bytes_html = html.encode('UTF-8', errors=decode_errors)
     elif isinstance(html, bytes):
         bytes_html = html
     else:
-        raise TypeError("Expected a string, but %s found" % type(html).__name__)
-    html_len = len(bytes_html)
+        try:
+            bytes_html = memoryview(html)
+        except TypeError:
+            raise TypeError("Expected a string, but %s found" % type(html).__name__) from None
+        if not bytes_html.c_contiguous:
+            bytes_html.release()
+            raise ValueError("Expected a contiguous buffer")
+    html_len = len(bytes_html) if isinstance(bytes_html, bytes) else bytes_html.nbytes
     if html_len > MAX_HTML_INPUT_SIZE:
         raise ValueError("The specified HTML input is too large to be processed (%d bytes)" % html_len)
     return bytes_html, html_len
@@ -1,11 +1,24 @@
 """Tests for functionality that is only supported by lexbor backend."""
 
+import array
+import io
+import os
 from inspect import cleandoc
 
 import pytest
 
 
-from selectolax.lexbor import LexborHTMLParser, SelectolaxError, parse_fragment
+from selectolax.lexbor import (
+    LexborHTMLParser,
+    SelectolaxError,
+    clear_selector_cache,
+    compile_selector,
+    extract_many,
+    parse_fragment,
+    parse_many,
+    selector_cache_info,
+    set_selector_cache_size,
+)
 
 
 def clean_doc(text: str) -> str:
@@ -29,6 +42,551 @@ def test_sets_inner_html():
     assert actual == expected
 
 
+def test_serialization_keeps_undef_marker_in_content():
+    html = '<script>var s = "<-undef>";</script><!--<-undef>--><p>&lt;-undef&gt;</p>'
+    parser = LexborHTMLParser(html)
+    assert parser.html == (
+        '<html><head><script>var s = "<-undef>";</script><!--<-undef>--></head>'
+        "<body><p>&lt;-undef&gt;</p></body></html>"
+    )
+    assert (
+        parser.head.inner_html == '<script>var s = "<-undef>";</script><!--<-undef>-->'
+    )
+    assert (
+        parser.css_first("script").html_bytes == b'<script>var s = "<-undef>";</script>'
+    )
+
+    fragment = LexborHTMLParser("<p>a</p><!--<-undef>-->", is_fragment=True)
+    assert fragment.html == "<p>a</p><!--<-undef>-->"
+
+
+def test_structural_equality_and_content_hash():
+    html = (
+        "<div id='a' hidden><p>one <b>two</b></p><x-card v=''>t</x-card>"
+        "<template><i>t</i></template><!--c--></div>"
+    )
+    first = LexborHTMLParser(html).css_first("div")
+    second = LexborHTMLParser("<section>" + html + "</section>").css_first("div")
+    assert first == second
+    assert first.content_hash() == second.content_hash()
+    assert first == first.html
+    assert first == LexborHTMLParser(html.replace("hidden", "hidden=''")).css_first(
+        "div"
+    )
+
+    different = [
+        html.replace("id='a'", "id='b'"),
+        html.replace("two", "tw0"),
+        html.replace("x-card", "x-cart"),
+        html.replace("<i>t</i>", "<i>T</i>"),
+        html.replace("<!--c-->", "<!--d-->"),
+        html.replace("<!--c-->", ""),
+    ]
+    for other_html in different:
+        other = LexborHTMLParser(other_html).css_first("div")
+        assert first != other
+        assert first.content_hash() != other.content_hash()
+        assert first.html != other.html
+
+    tree = LexborHTMLParser("<ul><li>a</li><li>b</li><li>a</li></ul>")
+    items = tree.css("li")
+    assert items[0] == items[2]
+    assert items[0] != items[1]
+    assert items[0].content_hash() == items[2].content_hash()
+    assert items[0] != "li"
+    assert items[0] != object()
+
+
+def test_structural_equality_of_fragments():
+    first = LexborHTMLParser("<p>a</p><p>b</p>", is_fragment=True).root
+    second = LexborHTMLParser("<p>a</p><p>b</p>", is_fragment=True).root
+    single = LexborHTMLParser("<div><p>a</p><p>b</p></div>").css_first("p")
+    assert first == second
+    assert first.content_hash() == second.content_hash()
+    assert first != single
+
+
+def test_subtree_hashes():
+    nav = '<nav class="menu"><a href="/">Hóme</a><a href="/about">About</a></nav>'
+    parser = LexborHTMLParser(
+        f"<div>{nav}<p>First page</p></div><div>{nav}<p>Second</p></div>"
+    )
+    records = parser.subtree_hashes()
+
+    assert [node.tag for node, _, _ in records] == [
+        node.tag for node in parser.root.traverse()
+    ]
+    for node, node_hash, text_len in records:
+        assert node_hash == node.content_hash()
+        assert text_len == len(node.text())
+
+    navs = [node_hash for node, node_hash, _ in records if node.tag == "nav"]
+    divs = [node_hash for node, node_hash, _ in records if node.tag == "div"]
+    assert navs[0] == navs[1]
+    assert divs[0] != divs[1]
+    assert navs[0] == LexborHTMLParser(nav).css_first("nav").content_hash()
+
+    large = parser.subtree_hashes(min_size=15)
+    assert [node.tag for node, _, _ in large] == ["html", "body", "div", "div"]
+    assert [node.tag for node, _, _ in parser.css_first("nav").subtree_hashes()] == [
+        "nav",
+        "a",
+        "a",
+    ]
+
+    fragment = LexborHTMLParser("<p>a</p><p>b</p>", is_fragment=True)
+    assert [node.text() for node, _, _ in fragment.subtree_hashes()] == ["a", "b"]
+
+
+@pytest.mark.parametrize(
+    "include_text, skip_empty", [(False, False), (True, False), (True, True)]
+)
+def test_traverse_tags_matches_traverse(include_text, skip_empty):
+    html = "<div id='a'><p>Hi <b>there</b></p> <!-- c --><ul><li>1</li><li></li></ul></div><span>x</span>"
+    root = LexborHTMLParser(html).css_first("div")
+
+    def depth(node):
+        result = 0
+        while node.mem_id != root.mem_id:
+            node = node.parent
+            result += 1
+        return result
+
+    expected = [
+        (node.tag_id, depth(node)) for node in root.traverse(include_text, skip_empty)
+    ]
+    assert list(root.traverse_tags(include_text, skip_empty)) == expected
+
+
+def test_traverse_tags_on_leaf_and_document():
+    parser = LexborHTMLParser("<p></p>")
+    assert list(parser.css_first("p").traverse_tags()) == [
+        (parser.css_first("p").tag_id, 0)
+    ]
+    assert len(list(parser.root.traverse_tags())) == len(list(parser.root.traverse()))
+
+
+def test_cache_nodes_returns_same_wrappers():
+    html = "<div id='a'><p class='x'>1</p><p class='x'>2</p></div>"
+    parser = LexborHTMLParser(html, cache_nodes=True)
+    assert parser.cache_nodes
+
+    div = parser.css_first("#a")
+    first, second = parser.css("p.x")
+    assert first.parent is div
+    assert div.first_child is first
+    assert first.next is second
+    assert parser.css_first("p") is first
+    assert parser.body.first_child is div
+
+    first.decompose()
+    assert div.first_child is second
+    assert first.parent is None
+
+    div.inner_html = "<span>new</span>"
+    assert div.first_child.tag == "span"
+    assert div.first_child is div.first_child
+
+    parser.cache_nodes = False
+    assert not parser.cache_nodes
+    assert parser.css_first("span") is not parser.css_first("span")
+    assert LexborHTMLParser(html).css_first("p") is not LexborHTMLParser(
+        html
+    ).css_first("p")
+
+
+def test_cache_nodes_keeps_fragment_roots_apart():
+    parser = LexborHTMLParser("<p>a</p><p>b</p>", is_fragment=True, cache_nodes=True)
+    root = parser.root
+    first = parser.css_first("p")
+    assert root is not first
+    assert root.html == "<p>a</p><p>b</p>"
+    assert first.html == "<p>a</p>"
+
+
+INDEX_HTML = """
+<div id="Main" class="box  wide\tBox">
+    <p class="note">one</p>
+    <svg><a class="note"></a></svg>
+    <DIV id="second"><a href="/">two</a></DIV>
+</div>
+"""
+INDEX_QUERIES = [
+    "div",
+    "DIV",
+    "a",
+    "p",
+    "*",
+    "#main",
+    "#MAIN",
+    ".box",
+    ".wide",
+    ".note",
+]
+
+
+def assert_index_matches(indexed, plain, queries):
+    for query in queries:
+        expected = [node.html for node in plain.css(query)]
+        assert [node.html for node in indexed.css(query)] == expected
+        assert [node.html for node in indexed.tags(query)] == [
+            node.html for node in plain.tags(query)
+        ]
+        first = plain.css_first(query)
+        assert indexed.css_first(query, default="none") == (
+            "none" if first is None else first
+        )
+
+
+def test_use_index_matches_selectors():
+    indexed = LexborHTMLParser(INDEX_HTML, use_index=True)
+    plain = LexborHTMLParser(INDEX_HTML)
+    assert indexed.use_index
+    assert not plain.use_index
+    assert_index_matches(indexed, plain, INDEX_QUERIES + ["#nope", ".nope", "nope"])
+    assert indexed.css("div > p") == plain.css("div > p")
+    with pytest.raises(ValueError):
+        indexed.css_first(".note", strict=True)
+
+
+def test_use_index_is_invalidated_on_mutation():
+    indexed = LexborHTMLParser(INDEX_HTML, use_index=True)
+    plain = LexborHTMLParser(INDEX_HTML)
+    queries = INDEX_QUERIES + ["#new", ".fresh", "span", "i"]
+    assert_index_matches(indexed, plain, queries)
+
+    for parser in (indexed, plain):
+        parser.css_first("p").decompose()
+        parser.css_first("#second").attrs["id"] = "new"
+        parser.css_first("svg a").attrs["class"] = "fresh"
+        del parser.css_first("div").attrs["class"]
+    assert_index_matches(indexed, plain, queries)
+
+    for parser in (indexed, plain):
+        parser.css_first("#new").inner_html = ""
+    assert_index_matches(indexed, plain, queries)
+
+    for parser in (indexed, plain):
+        parser.body.inner_html = "<span class='fresh'>1</span>"
+        parser.body.insert_child(LexborHTMLParser("<i id='new'></i>").css_first("i"))
+    assert_index_matches(indexed, plain, queries)
+
+    indexed.use_index = False
+    assert not indexed.use_index
+    assert_index_matches(indexed, plain, queries)
+
+
+@pytest.mark.parametrize("use_index", [False, True])
+def test_get_element_by_id(use_index):
+    html = '<p id="Price">1</p><div><p id="price">2</p><p id="price">3</p></div><i id="a b"></i>'
+    parser = LexborHTMLParser(html, use_index=use_index)
+    assert parser.get_element_by_id("price").text() == "2"
+    assert parser.get_element_by_id("Price").text() == "1"
+    assert parser.get_element_by_id("a b").tag == "i"
+    assert parser.get_element_by_id("PRICE") is None
+    assert parser.get_element_by_id("", default="none") == "none"
+    assert parser.use_index is use_index
+
+    parser.get_element_by_id("price").decompose()
+    assert parser.get_element_by_id("price").text() == "3"
+    parser.get_element_by_id("Price").attrs["id"] = "new"
+    assert parser.get_element_by_id("Price") is None
+    assert parser.get_element_by_id("new").text() == "1"
+    assert parser.use_index is use_index
+
+    fragment = LexborHTMLParser(html, is_fragment=True)
+    assert fragment.get_element_by_id("price").text() == "2"
+    assert fragment.get_element_by_id("missing", default=0) == 0
+    assert not fragment.use_index
+
+
+def test_scripts_contain_any():
+    html = """
+    <head><style>.ad { color: red }</style></head>
+    <body>
+        <script>fbq('init', '123');</script>
+        <script type="application/ld+json">{"@type": "Prödüct"}</script>
+        <noscript><img src="/pixel?id=42"></noscript>
+        <div><script>window.dataLayer = [];</script></div>
+    </body>
+    """
+    parser = LexborHTMLParser(html)
+    assert parser.scripts_contain_any(("gtag(", "dataLayer"))
+    assert parser.scripts_contain_any(("Prödüct",))
+    assert parser.scripts_contain_any(("zzz", "init', '1"))
+    assert not parser.scripts_contain_any(("gtag(", "color: red"))
+    assert not parser.scripts_contain_any(())
+    assert parser.raw_text_contains_any(("color: red",))
+    assert not parser.raw_text_contains_any(("color: red",), tags="script")
+    assert not parser.raw_text_contains_any(("fbq",), tags=("style", "unknown-tag"))
+    assert parser.css_first("div").scripts_contain_any(("dataLayer",))
+    assert not parser.css_first("div").scripts_contain_any(("fbq",))
+
+    signatures = tuple("tracker-%d" % i for i in range(2000))
+    assert not parser.scripts_contain_any(signatures)
+    assert parser.scripts_contain_any(signatures + ("fbq",))
+    # Patterns that share prefixes and suffixes, found through the failure links.
+    assert LexborHTMLParser("<script>xabcabd</script>").scripts_contain_any(
+        ("abcabe", "bcabd")
+    )
+    assert not LexborHTMLParser("<script>xabcab</script>").scripts_contain_any(
+        ("abcabe", "bcabd")
+    )
+    with pytest.raises(TypeError):
+        parser.scripts_contain_any((b"fbq",))
+
+
+def test_script_caches_are_invalidated_on_mutation():
+    parser = LexborHTMLParser(
+        "<script src='/a.js'>var first;</script><div id='slot'></div>"
+    )
+    assert parser.scripts_contain("first")
+    assert parser.script_srcs_contain(("a.js",))
+    assert not parser.scripts_contain_any(("second",))
+
+    parser.css_first("#slot").inner_html = "<script>var second;</script>"
+    assert parser.scripts_contain_any(("second",))
+    parser.css_first("script").decompose()
+    assert not parser.scripts_contain("first")
+    assert not parser.script_srcs_contain(("a.js",))
+
+    parser.css_first("script").attrs["src"] = "/b.js"
+    assert parser.script_srcs_contain(("b.js",))
+
+
+def test_extract_columns():
+    html = """
+    <ul>
+        <li><a href="/a" rel="next">Fïrst</a></li>
+        <li><a href="/b">Second <b>bold</b></a></li>
+        <li><a rel>Third</a></li>
+    </ul>
+    """
+    parser = LexborHTMLParser(html)
+    columns = parser.extract_columns("a", attrs=["href", "REL"], text=True)
+    assert list(columns) == ["href", "REL", "text"]
+
+    def values(column):
+        data, offsets, validity = column
+        offsets = array.array("i", offsets)
+        return [
+            data[offsets[i] : offsets[i + 1]].decode()
+            if validity is None or validity[i // 8] & (1 << (i % 8))
+            else None
+            for i in range(len(offsets) - 1)
+        ]
+
+    nodes = parser.css("a")
+    assert values(columns["href"]) == [node.attributes.get("href") for node in nodes]
+    assert values(columns["REL"]) == ["next", None, ""]
+    assert values(columns["text"]) == [node.text() for node in nodes]
+    assert columns["text"][2] is None
+    assert parser.css_first("ul").extract_columns("a", ["href"]) == {
+        "href": columns["href"]
+    }
+
+    empty = parser.extract_columns("table", ["href"], text=True)
+    assert empty == {
+        "href": (b"", bytes(array.array("i", [0])), None),
+        "text": (b"", bytes(array.array("i", [0])), None),
+    }
+
+
+def test_extract_columns_invalid_arguments():
+    parser = LexborHTMLParser("<a href='/'>x</a>")
+    with pytest.raises(TypeError):
+        parser.extract_columns("a", "href")
+    with pytest.raises(TypeError):
+        parser.extract_columns("a", [1])
+    with pytest.raises(ValueError):
+        parser.extract_columns("a", ["text"], text=True)
+
+
+def test_css_attr_and_css_attrs():
+    html = """
+    <a href="/a" rel="next">A</a>
+    <a href="/b" data-x="">B</a>
+    <a data-x>C</a>
+    <a href="/ü" rel="nofollow" DATA-X="1">D</a>
+    """
+    parser = LexborHTMLParser(html)
+    nodes = parser.css("a")
+    for name in ["href", "rel", "data-x", "missing"]:
+        assert parser.css_attr("a", name) == [node.attrs.get(name) for node in nodes]
+    assert parser.css_attr("a[href]", "href") == ["/a", "/b", "/ü"]
+    assert parser.css_attrs("a", ["href", "rel"]) == [
+        ("/a", "next"),
+        ("/b", None),
+        (None, None),
+        ("/ü", "nofollow"),
+    ]
+    assert parser.css_attrs("a", []) == []
+    assert parser.css_first("a").css_attr("a", "rel") == ["next"]
+    assert parser.css_attr("table", "href") == []
+    with pytest.raises(TypeError):
+        parser.css_attrs("a", "href")
+
+
+SANITIZE_HTML = """
+<html><head><style>p {}</style><script>a()</script></head>
+<body>
+  <div class="x"><b>Bold <i>and <u>under</u></i></b> text<script>b()</script></div>
+  <iframe src="/"></iframe><noscript><p>No</p></noscript>
+  <custom-tag>Custom <b></b></custom-tag>
+  <svg><a href="#">Link</a></svg>
+</body></html>
+"""
+
+
+@pytest.mark.parametrize("recursive", [False, True])
+def test_strip_tags_single_pass_matches_per_tag_removal(recursive):
+    tags = ["script", "style", "iframe", "noscript", "u", "custom-tag", "a", "unknown"]
+    expected = LexborHTMLParser(SANITIZE_HTML)
+    for tag in tags:
+        for node in expected.css(tag):
+            node.decompose(recursive=recursive)
+
+    parser = LexborHTMLParser(SANITIZE_HTML)
+    parser.strip_tags(tags, recursive=recursive)
+    assert parser.html == expected.html
+
+    node_parser = LexborHTMLParser(SANITIZE_HTML)
+    node_parser.head.strip_tags(tags, recursive=recursive)
+    node_parser.body.strip_tags(tags, recursive=recursive)
+    assert node_parser.html == expected.html
+
+    node_parser.body.strip_tags(["BODY"])
+    assert "<body" not in node_parser.html
+
+
+@pytest.mark.parametrize("delete_empty", [False, True])
+def test_unwrap_tags_single_pass_matches_per_tag_unwrap(delete_empty):
+    tags = ["b", "i", "u", "custom-tag", "noscript", "a"]
+    expected = LexborHTMLParser(SANITIZE_HTML)
+    for tag in tags:
+        for node in expected.css(tag):
+            node.unwrap(delete_empty)
+
+    parser = LexborHTMLParser(SANITIZE_HTML)
+    parser.unwrap_tags(tags, delete_empty=delete_empty)
+    assert parser.html == expected.html
+
+
+def test_strip_and_unwrap_tags_edge_cases():
+    parser = LexborHTMLParser("<div class='x'><p>a</p></div><div><p>b</p></div>")
+    parser.body.strip_tags(["div.x"])
+    assert parser.body.html == "<body><div><p>b</p></div></body>"
+    parser.body.unwrap_tags(["div > p"])
+    assert parser.body.html == "<body><div>b</div></body>"
+
+    with pytest.raises(SelectolaxError):
+        parser.root.strip_tags(["HTML"])
+    assert parser.body.html == "<body><div>b</div></body>"
+
+    parser.body.strip_tags(["*"])
+    assert parser.html == "<html><head></head></html>"
+
+    fragment = LexborHTMLParser(
+        "<div><script>x</script><i>Hi</i></div>", is_fragment=True
+    )
+    fragment.strip_tags(["script"])
+    fragment.unwrap_tags(["i"])
+    assert fragment.html == "<div>Hi</div>"
+
+
+def test_strip_tags_removes_first_fragment_node():
+    fragment = LexborHTMLParser("<b>x</b><p>y</p><b>z</b>", is_fragment=True)
+    fragment.strip_tags(["b"])
+    assert fragment.html == "<p>y</p>"
+    assert [node.text() for node in fragment.css("p")] == ["y"]
+
+    fragment.strip_tags(["p"])
+    assert fragment.root is None
+    assert fragment.html == ""
+
+
+def test_write_html(tmp_path):
+    html = "<div id='main'>" + "<p class='x'>Héllo <b>wörld</b></p>" * 5000 + "</div>"
+    parser = LexborHTMLParser(html)
+    expected = parser.html
+
+    chunks = []
+
+    class Sink:
+        def write(self, chunk):
+            chunks.append(chunk)
+
+    parser.write_html(Sink())
+    assert len(chunks) > 1
+    assert all(isinstance(chunk, bytes) for chunk in chunks)
+    assert b"".join(chunks).decode() == expected
+
+    text = io.StringIO()
+    parser.write_html(text)
+    assert text.getvalue() == expected
+
+    path = tmp_path / "page.html"
+    with open(path, "wb") as f:
+        parser.css_first("p").write_html(f)
+    assert path.read_text(encoding="utf-8") == parser.css_first("p").html
+
+    fragment = LexborHTMLParser("<p>one</p> <p>two</p>", is_fragment=True)
+    buffer = io.BytesIO()
+    fragment.write_html(buffer)
+    assert buffer.getvalue() == fragment.html.encode()
+
+
+def test_write_html_limits_write_size():
+    parser = LexborHTMLParser("<p>a</p><p>" + "x" * 5_000_000 + "</p><p>b</p>")
+    chunks = []
+
+    class Sink:
+        def write(self, chunk):
+            chunks.append(chunk)
+
+    parser.write_html(Sink())
+    assert max(len(chunk) for chunk in chunks) <= 64 * 1024
+    assert b"".join(chunks).decode() == parser.html
+
+    text = io.StringIO()
+    parser.write_html(text)
+    assert text.getvalue() == parser.html
+
+
+def test_write_html_propagates_write_errors():
+    class Broken:
+        def write(self, chunk):
+            raise OSError("disk full")
+
+    parser = LexborHTMLParser("<p>" + "x" * 100_000 + "</p>")
+    with pytest.raises(OSError, match="disk full"):
+        parser.write_html(Broken())
+    with pytest.raises(AttributeError):
+        parser.write_html(object())
+
+
+@pytest.mark.parametrize(
+    "html, is_fragment",
+    [
+        ("<div id='main'>Héllo <b>wörld</b><!--c--></div>", False),
+        ("<p>one</p> <p>two</p>", True),
+        ("", False),
+    ],
+)
+def test_bytes_variants_match_str(html, is_fragment):
+    parser = LexborHTMLParser(html, is_fragment=is_fragment)
+    assert parser.html_bytes == parser.html.encode()
+    assert parser.inner_html_bytes == parser.inner_html.encode()
+    assert parser.text_bytes() == parser.text().encode()
+    for node in parser.root.traverse(include_text=True):
+        assert node.html_bytes == node.html.encode()
+        assert node.text_bytes(separator="·", strip=True) == (
+            node.text(separator="·", strip=True).encode()
+        )
+        if node.is_element_node:
+            assert node.inner_html_bytes == node.inner_html.encode()
+
+
 def test_html_pretty_document():
     parser = LexborHTMLParser("<div><span>Hello</span><!-- note --></div>")
     assert parser.html_pretty() == clean_doc(
@@ -184,6 +742,17 @@ def test_text_honors_skip_empty_flag():
     assert title.text(deep=False, skip_empty=True) == ""
 
 
+def test_text_separator_strip_and_skip_empty_when_deep():
+    html = "<div>\xa0 a <p>\n b\u3000</p> <i> </i>c\u2028</div>"
+    div = LexborHTMLParser(html).css_first("div")
+    assert div.text() == "\xa0 a \n b\u3000  c\u2028"
+    assert div.text(separator="|") == "\xa0 a |\n b\u3000| | |c\u2028"
+    assert div.text(separator="|", strip=True) == "a|b|||c"
+    assert div.text(separator="|", skip_empty=True) == "\xa0 a |\n b\u3000|c\u2028"
+    assert div.text(separator="–", strip=True, skip_empty=True) == "a–b–c"
+    assert div.text(deep=False, separator="|", strip=True) == "a||c"
+
+
 def test_attrs_reject_non_element_nodes():
     parser = LexborHTMLParser("<div>hello<!--comment--></div>")
     div = parser.css_first("div")
@@ -645,6 +1214,27 @@ def test_merge_text_nodes_edge_cases():
     assert "JohnDoe" in text_after_merge
 
 
+def test_merge_text_nodes_merges_long_runs_in_one_pass():
+    html = (
+        "<div><p>"
+        + "".join(f"<b>{i}</b>" for i in range(2000))
+        + "<i>x</i>é</p><p>a<b>b</b></p></div>"
+    )
+    parser = LexborHTMLParser(html)
+    parser.unwrap_tags(["b"])
+    expected = parser.html
+    parser.merge_text_nodes()
+    assert parser.html == expected
+
+    first, second = parser.css("p")
+    assert [node.text_content for node in first.iter(include_text=True)] == [
+        "".join(str(i) for i in range(2000)),
+        None,
+        "é",
+    ]
+    assert [node.text_content for node in second.iter(include_text=True)] == ["ab"]
+
+
 def test_unwrap_tags_with_nested_elements():
     html = "<div><p><span><em>Text</em></span></p></div>"
     parser = LexborHTMLParser(html)
@@ -953,3 +1543,456 @@ def test_strip_tags_then_text_many_iterations():
         parser.strip_tags(["style", "script"])
         text = parser.root.text(separator=" ", strip=True)
         assert f"Content {i}" in text
+
+
+def test_compiled_selector_matches_string_query():
+    html = "<div><a href='/a'>A</a><a>B</a><p class='x'>C</p></div>"
+    parser = LexborHTMLParser(html)
+    selector = compile_selector("a[href]")
+    assert selector.query == "a[href]"
+    assert [n.html for n in parser.css(selector)] == [
+        n.html for n in parser.css("a[href]")
+    ]
+    assert parser.css_first(selector).text() == "A"
+    assert parser.css_matches(compile_selector("p.x"))
+    assert not parser.css_matches(compile_selector("span"))
+    assert parser.root.any_css_matches((compile_selector("span"), "p"))
+
+
+def test_compiled_selector_reused_across_documents():
+    selector = compile_selector("li")
+    for i in range(20):
+        parser = LexborHTMLParser("<ul>" + "<li>x</li>" * i + "</ul>")
+        assert len(parser.css(selector)) == i
+        assert parser.select().css(selector).matches == parser.css(selector)
+
+
+def test_compiled_selector_invalid_query():
+    with pytest.raises(SelectolaxError):
+        compile_selector("div[")
+
+
+def test_compiled_selector_cannot_be_reinitialized():
+    selector = compile_selector("a")
+    selector.__init__("p")
+    parser = LexborHTMLParser("<a>1</a><p>2</p>")
+    assert selector.query == "a"
+    assert [node.tag for node in parser.css(selector)] == ["a"]
+
+
+def test_compile_selector_from_many_threads():
+    from concurrent.futures import ThreadPoolExecutor
+
+    parser = LexborHTMLParser("".join(f"<p class='c{i}'>{i}</p>" for i in range(200)))
+
+    def compile_and_match(i):
+        selector = compile_selector(f"p.c{i}, span.c{i}")
+        return selector.query, [node.text() for node in parser.css(selector)]
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(compile_and_match, range(200)))
+    assert results == [(f"p.c{i}, span.c{i}", [str(i)]) for i in range(200)]
+
+
+def test_selector_cache_counts_hits_and_misses():
+    clear_selector_cache()
+    parser = LexborHTMLParser("<div><p>1</p><p>2</p></div>")
+    for _ in range(5):
+        assert len(parser.css("div > p")) == 2
+    info = selector_cache_info()
+    assert info.misses == 1
+    assert info.hits == 4
+    assert info.currsize == 1
+
+    parser.css(compile_selector("div > p"))
+    assert selector_cache_info().hits == 4
+
+
+def test_selector_cache_size_is_configurable():
+    try:
+        set_selector_cache_size(2)
+        parser = LexborHTMLParser("<div><p>1</p><span>2</span></div>")
+        for query in ("div", "p", "span", "div"):
+            parser.css(query)
+        info = selector_cache_info()
+        assert info.maxsize == 2
+        assert info.currsize == 2
+        assert info.misses == 4
+
+        set_selector_cache_size(0)
+        assert parser.css_first("span").text() == "2"
+        assert selector_cache_info().currsize == 0
+
+        with pytest.raises(ValueError):
+            set_selector_cache_size(-1)
+    finally:
+        set_selector_cache_size(256)
+
+
+def test_css_many_matches_individual_queries():
+    html = """
+    <html><head><title>Page</title><meta name="description" content="d"></head>
+    <body>
+        <div id="main"><a href="/1">1</a><p><a href="/2">2</a><a>3</a></p></div>
+        <ul><li class="x">a</li><li>b</li><li class="x"><span>c</span></li></ul>
+        <my-tag><svg><rect></rect></svg></my-tag>
+    </body></html>
+    """
+    parser = LexborHTMLParser(html)
+    queries = {
+        "title": "title",
+        "links": "a[href]",
+        "items": "ul > li.x",
+        "has_span": "li:has(span)",
+        "html": "html",
+        "missing": "table",
+        "unknown": "not-a-tag",
+        "custom": "body my-tag",
+        "svg": "svg rect",
+        "branches": "title, li.x, #main > a",
+        "any": "*",
+        "class_only": ".x",
+        "compiled": compile_selector("#main p a"),
+    }
+    result = parser.css_many(queries)
+    assert list(result) == list(queries)
+    for name, query in queries.items():
+        assert [n.mem_id for n in result[name]] == [n.mem_id for n in parser.css(query)]
+
+
+def test_css_many_on_node_and_fragment():
+    parser = LexborHTMLParser("<div><p>1</p><span>2</span></div><p>3</p>")
+    div = parser.css_first("div")
+    result = div.css_many({"p": "p", "div": "div", "span": "span"})
+    assert [n.text() for n in result["p"]] == ["1"]
+    assert result["div"] == [div]
+    assert parser.css_many({}) == {}
+
+    fragment = LexborHTMLParser("<p>1</p><p>2</p>", is_fragment=True)
+    assert len(fragment.css_many({"p": "p"})["p"]) == len(fragment.css("p"))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 64])
+def test_incremental_parsing_matches_one_shot(chunk_size):
+    html = (
+        "<!DOCTYPE html><html><head><title>Заголовок</title></head>"
+        '<body><div id="a" class="x y"><p>Hello <b>world</b></p>'
+        "<script>var s = '</div>';</script><!-- comment --></div></body></html>"
+    ).encode("utf-8")
+    chunks = [html[i : i + chunk_size] for i in range(0, len(html), chunk_size)]
+    parser = LexborHTMLParser.from_iter(chunks)
+    expected = LexborHTMLParser(html)
+    assert parser.html == expected.html
+    assert parser.css_first("title").text() == "Заголовок"
+    assert parser.raw_html is None
+
+
+def test_incremental_feed_and_close():
+    parser = LexborHTMLParser.incremental()
+    parser.feed("<div><p>Hel")
+    parser.feed(b"lo</p>")
+    parser.close()
+    assert parser.css_first("p").text() == "Hello"
+    assert parser.body.html == "<body><div><p>Hello</p></div></body>"
+
+    parser.close()
+    with pytest.raises(SelectolaxError):
+        parser.feed("<p>")
+    with pytest.raises(SelectolaxError):
+        LexborHTMLParser("<p>").feed("<p>")
+    with pytest.raises(TypeError):
+        LexborHTMLParser.from_iter([None])
+
+
+@pytest.mark.parametrize(
+    "mutate",
+    [
+        lambda parser, node: node.decompose(),
+        lambda parser, node: node.remove(),
+        lambda parser, node: node.unwrap(),
+        lambda parser, node: node.unwrap_tags(["p"]),
+        lambda parser, node: node.strip_tags(["p"]),
+        lambda parser, node: node.merge_text_nodes(),
+        lambda parser, node: node.replace_with("x"),
+        lambda parser, node: node.insert_before("x"),
+        lambda parser, node: node.insert_after("x"),
+        lambda parser, node: node.insert_child("x"),
+        lambda parser, node: setattr(node, "inner_html", "<b>x</b>"),
+        lambda parser, node: parser.strip_tags(["div"]),
+        lambda parser, node: parser.unwrap_tags(["div"]),
+        lambda parser, node: parser.merge_text_nodes(),
+        lambda parser, node: setattr(parser, "inner_html", "<b>x</b>"),
+    ],
+)
+def test_incremental_tree_is_read_only_until_closed(mutate):
+    parser = LexborHTMLParser.incremental()
+    parser.feed("<div><div id=outer><p>Hello</p><p>")
+    node = parser.css_first("#outer")
+    assert parser.css_first("p").text() == "Hello"
+    with pytest.raises(SelectolaxError):
+        mutate(parser, node)
+
+    parser.feed("world</p></div></div>")
+    parser.close()
+    assert parser.body.html == (
+        '<body><div><div id="outer"><p>Hello</p><p>world</p></div></div></body>'
+    )
+    mutate(parser, parser.css_first("#outer"))
+
+
+def test_incremental_empty_input():
+    parser = LexborHTMLParser.from_iter([])
+    assert parser.html == "<html><head></head><body></body></html>"
+
+
+@pytest.mark.parametrize(
+    "html, expected",
+    [
+        (
+            "<html><head><title>T</title></head><body><p>x</p></body></html>",
+            "<html><head><title>T</title></head></html>",
+        ),
+        (
+            "<title>T</title><link rel=canonical href=/c><p>body</p><div>more</div>",
+            '<html><head><title>T</title><link rel="canonical" href="/c"></head>'
+            "<body><p></p></body></html>",
+        ),
+        (
+            "<head><script>var s = '</head>';</script></head><body>b</body>",
+            "<html><head><script>var s = '</head>';</script></head></html>",
+        ),
+        ("<body><p>x</p>", "<html><head></head><body></body></html>"),
+    ],
+)
+def test_stop_after_head(html, expected):
+    parser = LexborHTMLParser(html, stop_after="head")
+    assert parser.stopped
+    assert parser.html == expected
+    assert parser.raw_html == html.encode()
+
+
+def test_stop_after_other_tags():
+    parser = LexborHTMLParser("<div><p>1</p><p>2</p></div>", stop_after="P")
+    assert [node.text() for node in parser.css("p")] == ["1"]
+
+    parser = LexborHTMLParser("<div><br><p>2</p></div>", stop_after="br")
+    assert parser.body.html == "<body><div><br></div></body>"
+
+    parser = LexborHTMLParser("<div>x</div>", stop_after="table")
+    assert not parser.stopped
+    assert parser.body.html == "<body><div>x</div></body>"
+
+
+def test_stop_after_ignored_tag():
+    html = (
+        "<body><tr><td>x</td></tr><div id=later>y</div>"
+        "<table><tr><td>real</td></tr></table><p>never</p>"
+    )
+    parser = LexborHTMLParser(html, stop_after="tr")
+    assert parser.stopped
+    assert parser.css_first("#later").text() == "y"
+    assert [node.text() for node in parser.css("tr")] == ["real"]
+    assert parser.css("p") == []
+
+    parser = LexborHTMLParser("<p>a</p><col><p>b</p>", stop_after="col")
+    assert not parser.stopped
+    assert len(parser.css("p")) == 2
+
+
+def test_stop_after_large_document():
+    body = "<div><p>hello</p></div>" * 10000
+    html = f"<html><head><title>T</title></head><body>{body}</body></html>"
+    parser = LexborHTMLParser(html, stop_after="head")
+    assert parser.css_first("title").text() == "T"
+    assert parser.css("p") == []
+
+    parser.inner_html = "<p>new</p>"
+    assert parser.css_first("p").text() == "new"
+
+
+def test_stop_after_from_iter_skips_remaining_chunks():
+    chunks = iter(["<head><title>a</title></he", "ad><body>x", "<p>never</p>"])
+    parser = LexborHTMLParser.from_iter(chunks, stop_after="head")
+    assert parser.stopped
+    assert parser.head.html == "<head><title>a</title></head>"
+    assert list(chunks) == ["<p>never</p>"]
+
+
+def test_stop_after_invalid():
+    with pytest.raises(ValueError):
+        LexborHTMLParser("<p>", stop_after="not-a-tag")
+    with pytest.raises(ValueError):
+        LexborHTMLParser("<p>", is_fragment=True, stop_after="p")
+
+
+def test_encoding_detection():
+    html = "<head><meta charset='windows-1251'><title>Привет</title></head><p>мир</p>"
+    parser = LexborHTMLParser(html.encode("cp1251"), detect_encoding=True)
+    assert parser.input_encoding == "windows-1251"
+    assert parser.css_first("title").text() == "Привет"
+    assert parser.css_first("p").text() == "мир"
+    assert parser.raw_html == html.encode("cp1251")
+
+    parser = LexborHTMLParser(
+        html.encode("cp1251"), detect_encoding=True, use_meta_tags=False
+    )
+    assert parser.input_encoding == "UTF-8"
+
+    parser = LexborHTMLParser(html.encode("cp1251"))
+    assert parser.input_encoding == "UTF-8"
+    assert parser.css_first("p").text() != "мир"
+
+    parser = LexborHTMLParser(html, detect_encoding=True)
+    assert parser.input_encoding == "UTF-8"
+    assert parser.css_first("p").text() == "мир"
+
+
+def test_encoding_detection_multibyte_expansion():
+    # Each byte becomes the three byte "€", more than the initial buffer can hold.
+    html = b'<meta charset="windows-1252">' + b"\x80" * 48 + b"aa"
+    parser = LexborHTMLParser(html, detect_encoding=True)
+    assert parser.input_encoding == "windows-1252"
+    assert parser.body.text() == "€" * 48 + "aa"
+
+    html = b'<meta charset="windows-1252"><p>' + b"\x80" * 100_000 + b"</p>"
+    parser = LexborHTMLParser(html, detect_encoding=True)
+    assert parser.css_first("p").text() == "€" * 100_000
+
+    # Multibyte sequences that span the decoder's input slices.
+    text = "日本語a" * 5_000
+    html = b'<meta charset="Shift_JIS"><p>' + text.encode("shift_jis") + b"</p>"
+    parser = LexborHTMLParser(html, detect_encoding=True)
+    assert parser.css_first("p").text() == text
+
+
+def test_encoding_detection_bom_and_invalid_input():
+    parser = LexborHTMLParser("﻿<p>héllo</p>".encode("utf-16-le"), detect_encoding=True)
+    assert parser.input_encoding == "UTF-16LE"
+    assert parser.body.html == "<body><p>héllo</p></body>"
+
+    parser = LexborHTMLParser("﻿<p>héllo</p>".encode("utf-8"), detect_encoding=True)
+    assert parser.input_encoding == "UTF-8"
+    assert parser.body.html == "<body><p>héllo</p></body>"
+
+    html = b'<meta http-equiv="Content-Type" content="text/html; charset=Shift_JIS">'
+    html += "<p>日本語".encode("shift_jis") + b"\x82"
+    parser = LexborHTMLParser(html, detect_encoding=True, stop_after="p")
+    assert parser.input_encoding == "Shift_JIS"
+    assert parser.css_first("p").text() == "日本語�"
+    assert parser.clone().input_encoding == "Shift_JIS"
+
+
+def test_from_file_and_fd(tmp_path):
+    html = "<html><head><title>Заголовок</title></head><body><p>x</p></body></html>"
+    path = tmp_path / "page.html"
+    path.write_bytes(html.encode("utf-8"))
+
+    parser = LexborHTMLParser.from_file(path)
+    assert parser.html == LexborHTMLParser(html).html
+    assert parser.raw_html is None
+
+    parser = LexborHTMLParser.from_file(str(path), stop_after="head")
+    assert parser.stopped
+    assert parser.css_first("title").text() == "Заголовок"
+
+    with open(path, "rb") as f:
+        parser = LexborHTMLParser.from_fd(f.fileno(), is_fragment=True)
+        assert f.read() == html.encode("utf-8")
+    assert parser.css_first("p").text() == "x"
+
+    path.write_bytes("<meta charset=windows-1251><p>мир</p>".encode("cp1251"))
+    parser = LexborHTMLParser.from_file(path, detect_encoding=True)
+    assert parser.input_encoding == "windows-1251"
+    assert parser.css_first("p").text() == "мир"
+
+
+def test_from_fd_empty_file_and_pipe(tmp_path):
+    path = tmp_path / "empty.html"
+    path.write_bytes(b"")
+    assert LexborHTMLParser.from_file(path).body.html == "<body></body>"
+
+    read_fd, write_fd = os.pipe()
+    os.write(write_fd, b"<p>piped</p>")
+    os.close(write_fd)
+    try:
+        assert LexborHTMLParser.from_fd(read_fd).css_first("p").text() == "piped"
+    finally:
+        os.close(read_fd)
+
+
+def test_from_fd_starts_at_current_offset(tmp_path):
+    path = tmp_path / "page.html"
+    path.write_bytes(b"<p>skip</p><p>kept</p>")
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.lseek(fd, 11, os.SEEK_SET)
+        parser = LexborHTMLParser.from_fd(fd)
+        assert [node.text() for node in parser.css("p")] == ["kept"]
+
+        os.lseek(fd, 0, os.SEEK_END)
+        assert LexborHTMLParser.from_fd(fd).body.html == "<body></body>"
+    finally:
+        os.close(fd)
+
+
+@pytest.mark.parametrize("threads", [None, 1, 3])
+def test_parse_many(threads):
+    documents = [f"<p id='p{i}'>{i}</p>" for i in range(50)]
+    documents[7] = bytearray(documents[7].encode())
+    trees = parse_many(documents, threads=threads)
+    assert [tree.css_first("p").text() for tree in trees] == [str(i) for i in range(50)]
+    assert parse_many([], threads=threads) == []
+
+
+def test_parse_many_options():
+    documents = [b"<head><title>a</title></head><p>x</p>"] * 5
+    trees = parse_many(iter(documents), threads=2, stop_after="head")
+    assert all(tree.stopped and tree.css("p") == [] for tree in trees)
+
+    with pytest.raises(ValueError):
+        parse_many(documents, threads=0)
+    with pytest.raises(TypeError):
+        parse_many(["<p>", None], threads=2)
+
+
+@pytest.mark.parametrize("threads", [None, 1, 3])
+def test_extract_many(threads):
+    documents = [
+        f"<title>Page {i}</title><a href='/{i}'>one <b>{i}</b></a><a>no href</a><a href>x</a>"
+        for i in range(20)
+    ]
+    documents[3] = memoryview(documents[3].encode())
+    spec = {
+        "title": ("title", "text"),
+        "links": (compile_selector("a"), "text"),
+        "hrefs": ("a", "HREF"),
+        "missing": ("table", "text"),
+    }
+    results = extract_many(documents, spec, threads=threads)
+    assert len(results) == 20
+    for i, result in enumerate(results):
+        html = documents[i] if isinstance(documents[i], str) else bytes(documents[i])
+        tree = LexborHTMLParser(html)
+        assert result == {
+            "title": [tree.css_first("title").text()],
+            "links": [node.text() for node in tree.css("a")],
+            "hrefs": [f"/{i}", ""],
+            "missing": [],
+        }
+    assert extract_many([], spec, threads=threads) == []
+
+
+def test_extract_many_invalid_input():
+    with pytest.raises(TypeError):
+        extract_many(["<p>"], {"p": "p"})
+    with pytest.raises(TypeError):
+        extract_many(["<p>"], {"p": ("p", None)})
+    with pytest.raises(TypeError):
+        extract_many(["<p>"], {"p": "ab"})
+    with pytest.raises(TypeError):
+        extract_many(["<p>"], {"p": {"p", "text"}})
+    assert extract_many(["<p>x</p>"], {"p": ["p", "text"]}) == [{"p": ["x"]}]
+    with pytest.raises(TypeError):
+        extract_many(["<p>", None], {"p": ("p", "text")}, threads=2)
+    with pytest.raises(ValueError):
+        extract_many(["<p>"], {"p": ("p", "text")}, threads=0)
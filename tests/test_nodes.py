@@ -594,20 +594,29 @@ def test_script_contain(parser):
     assert html_parser.scripts_contain("super_value")
 
 
-@pytest.mark.parametrize(*_PARSERS_PARAMETRIZER)
-def test_hash_nodes(parser):
-    tree = parser("""<div><p><strong>J</strong>ohn</p><p>Doe</p></div>""")
+def test_hash_nodes():
+    tree = HTMLParser("""<div><p><strong>J</strong>ohn</p><p>Doe</p></div>""")
     node = tree.css_first("div")
     assert node.mem_id == hash(node)
 
 
+def test_hash_nodes_lexbor():
+    html = """<div><p><strong>J</strong>ohn</p><p>Doe</p></div>"""
+    node = LexborHTMLParser(html).css_first("div")
+    other = LexborHTMLParser(html).css_first("div")
+    assert node == other
+    assert node.mem_id != other.mem_id
+    assert hash(node) == hash(other)
+    assert len({node, other}) == 1
+
+
 @pytest.mark.parametrize(*_PARSERS_PARAMETRIZER)
 def test_srcs_contain(parser):
     html_parser = parser("""<script src="http://google.com/analytics.js"></script>""")
     assert html_parser.script_srcs_contain(("analytics.js",))
 
 
-@pytest.mark.parametrize("parser", (HTMLParser,))
+@pytest.mark.parametrize("parser", (HTMLParser, LexborHTMLParser))
 def test_css_chaining(parser):
     html = """
     <span class="red"></span>
@@ -623,7 +632,7 @@ def test_css_chaining(parser):
     assert len(tree.select("div").css("span").css(".red").matches) == 2
 
 
-@pytest.mark.parametrize("parser", (HTMLParser,))
+@pytest.mark.parametrize("parser", (HTMLParser, LexborHTMLParser))
 def test_css_chaining_two(parser):
     html = """
     <script  integrity="sha512-DHpNaMnQ8GaECHElNcJkpGhIThksyXA==" type="application/javascript" class="weird_script">
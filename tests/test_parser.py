@@ -1,3 +1,4 @@
+import mmap
 import threading
 from difflib import SequenceMatcher
 
@@ -324,3 +325,43 @@ def test_css_matches_returns_bool(parser):
     res = parser("<div>test</div>").css_matches("div")
     assert isinstance(res, bool)
     assert res is True
+
+
+@pytest.mark.parametrize(*_PARSERS_PARAMETRIZER)
+def test_buffer_input(parser, tmp_path):
+    html = "<div><p id='a'>Привет</p></div>".encode("utf-8")
+    expected = parser(html).html
+
+    data = bytearray(html)
+    tree = parser(data)
+    assert tree.html == expected
+    assert tree.raw_html is None
+    # The buffer is released after parsing, so it can be resized.
+    data.extend(b"<p>")
+
+    receive_buffer = memoryview(b"garbage" + html + b"garbage")
+    assert parser(receive_buffer[7 : 7 + len(html)]).html == expected
+
+    path = tmp_path / "page.html"
+    path.write_bytes(html)
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        assert parser(m).html == expected
+
+    with pytest.raises(ValueError, match="contiguous"):
+        parser(memoryview(html)[::2])
+
+
+def test_buffer_input_detects_encoding():
+    html = bytearray("<div>Привет мир!</div>".encode("cp1251"))
+    assert HTMLParser(html, detect_encoding=True).input_encoding == "WINDOWS-1251"
+
+    html = bytearray('<meta charset="windows-1251"><p>мир</p>'.encode("cp1251"))
+    tree = LexborHTMLParser(memoryview(html), detect_encoding=True)
+    assert tree.input_encoding == "windows-1251"
+    assert tree.css_first("p").text() == "мир"
+
+
+def test_raw_value_of_buffer_input():
+    node = HTMLParser(bytearray(b"<div>&#x3C;test&#x3E;</div>")).css_first("div")
+    with pytest.raises(ValueError):
+        _ = node.child.raw_value